@@ -4,7 +4,7 @@ Django settings for edufund_project project.
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -133,6 +133,25 @@ PAYPAL_MODE = config('PAYPAL_MODE', default='sandbox')  # 'sandbox' or 'live'
 PAYPAL_CLIENT_ID = config('PAYPAL_CLIENT_ID', default='your_paypal_client_id')
 PAYPAL_CLIENT_SECRET = config('PAYPAL_CLIENT_SECRET', default='your_paypal_client_secret')
 
+# Payment gateway HTTP clients (pool sizes per provider, request timeouts in seconds)
+PAYMENT_HTTP_POOL_CONNECTIONS = config('PAYMENT_HTTP_POOL_CONNECTIONS', default=4, cast=int)
+PAYMENT_HTTP_POOL_MAXSIZE = config('PAYMENT_HTTP_POOL_MAXSIZE', default=20, cast=int)
+PAYMENT_HTTP_TIMEOUT = config('PAYMENT_HTTP_TIMEOUT', default=30, cast=int)
+PAYPAL_TOKEN_REFRESH_MARGIN = config('PAYPAL_TOKEN_REFRESH_MARGIN', default=60, cast=int)
+STRIPE_TIMEOUT = config('STRIPE_TIMEOUT', default=10, cast=int)
+PAYPAL_TIMEOUT = config('PAYPAL_TIMEOUT', default=15, cast=int)
+
+# Serve payment and webhook views as async views (run under ASGI); provider calls then
+# run on a thread pool of at most PAYMENT_ASYNC_MAX_CONCURRENCY in-flight calls
+ASYNC_PAYMENT_VIEWS = config('ASYNC_PAYMENT_VIEWS', default=False, cast=bool)
+PAYMENT_ASYNC_MAX_CONCURRENCY = config('PAYMENT_ASYNC_MAX_CONCURRENCY', default=64, cast=int)
+
+# Payment gateway circuit breaker: open after N consecutive outages, retry after RESET seconds
+PAYMENT_CIRCUIT_FAILURE_THRESHOLD = config('PAYMENT_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+PAYMENT_CIRCUIT_RESET_TIMEOUT = config('PAYMENT_CIRCUIT_RESET_TIMEOUT', default=30, cast=int)
+# Bearer token for scraping /metrics/gateways/; admins can always read it
+GATEWAY_METRICS_TOKEN = config('GATEWAY_METRICS_TOKEN', default='')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -176,6 +195,62 @@ LOGGING = {
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
 
+# Platform statistics snapshot (seconds)
+PLATFORM_STATS_MAX_AGE = config('PLATFORM_STATS_MAX_AGE', default=300, cast=int)
+PLATFORM_STATS_MIN_AGE = config('PLATFORM_STATS_MIN_AGE', default=5, cast=int)
+PLATFORM_STATS_LOCK_TIMEOUT = config('PLATFORM_STATS_LOCK_TIMEOUT', default=30, cast=int)
+# Outdated snapshots stay cached this long, to be served while one worker refreshes
+PLATFORM_STATS_RETENTION = config('PLATFORM_STATS_RETENTION', default=24 * 3600, cast=int)
+
+# Campaign browse page: campaigns per page, and how long category counts are cached (seconds)
+CAMPAIGN_BROWSE_PAGE_SIZE = config('CAMPAIGN_BROWSE_PAGE_SIZE', default=12, cast=int)
+CAMPAIGN_FACETS_MAX_AGE = config('CAMPAIGN_FACETS_MAX_AGE', default=300, cast=int)
+# Donations per page of the admin donations list
+ADMIN_DONATIONS_PAGE_SIZE = config('ADMIN_DONATIONS_PAGE_SIZE', default=50, cast=int)
+# Donor dashboard: donations per history page, and how long a donor's statistics are cached (seconds)
+DONOR_HISTORY_PAGE_SIZE = config('DONOR_HISTORY_PAGE_SIZE', default=10, cast=int)
+DONOR_SUMMARY_MAX_AGE = config('DONOR_SUMMARY_MAX_AGE', default=300, cast=int)
+# How long a student's dashboard statistics are cached (seconds)
+STUDENT_SUMMARY_MAX_AGE = config('STUDENT_SUMMARY_MAX_AGE', default=300, cast=int)
+
+# Campaign search queries are cancelled after this many seconds
+CAMPAIGN_SEARCH_TIMEOUT = config('CAMPAIGN_SEARCH_TIMEOUT', default=0.2, cast=float)
+
+# Donation rollups: overlap each incremental build with the previous one (seconds)
+DONATION_ROLLUP_LAG_SECONDS = config('DONATION_ROLLUP_LAG_SECONDS', default=300, cast=int)
+
+# Recurring donation processing
+RECURRING_BATCH_SIZE = config('RECURRING_BATCH_SIZE', default=100, cast=int)
+RECURRING_MAX_CONCURRENCY = config('RECURRING_MAX_CONCURRENCY', default=8, cast=int)
+# Charges still processing without a payment id after this many seconds are retried
+RECURRING_PROCESSING_TIMEOUT = config('RECURRING_PROCESSING_TIMEOUT', default=900, cast=int)
+
+# Email outbox worker (retry delay doubles after each failed attempt, in seconds)
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)
+EMAIL_OUTBOX_SENDING_TIMEOUT = config('EMAIL_OUTBOX_SENDING_TIMEOUT', default=600, cast=int)
+
+# Webhook inbox worker
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=100, cast=int)
+WEBHOOK_MAX_CONCURRENCY = config('WEBHOOK_MAX_CONCURRENCY', default=4, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)
+WEBHOOK_PROCESSING_TIMEOUT = config('WEBHOOK_PROCESSING_TIMEOUT', default=600, cast=int)
+
+# Seconds between checks for changed screening patterns. SUSPICIOUS_MESSAGE_PATTERNS and
+# SUSPICIOUS_EMAIL_DOMAINS can be set here to replace the built-in lists.
+SCREENING_RELOAD_INTERVAL = config('SCREENING_RELOAD_INTERVAL', default=30, cast=int)
+
+# Donation attempt rate limits (attempts per sliding window of DONATION_RATE_LIMIT_WINDOW seconds)
+DONATION_RATE_LIMIT_WINDOW = config('DONATION_RATE_LIMIT_WINDOW', default=3600, cast=int)
+DONATION_RATE_LIMIT_PER_USER = config('DONATION_RATE_LIMIT_PER_USER', default=5, cast=int)
+DONATION_RATE_LIMIT_PER_IP = config('DONATION_RATE_LIMIT_PER_IP', default=10, cast=int)
+
+# Fraud scoring: donations scoring at least FRAUD_REVIEW_THRESHOLD are held for review.
+# FRAUD_FLAGGED_NETWORKS is a comma-separated list of CIDR ranges (e.g. VPN or hosting providers).
+FRAUD_REVIEW_THRESHOLD = config('FRAUD_REVIEW_THRESHOLD', default=50, cast=int)
+FRAUD_FLAGGED_NETWORKS = config('FRAUD_FLAGGED_NETWORKS', default='', cast=Csv())
+
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
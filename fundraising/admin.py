@@ -1,12 +1,15 @@
 from django.contrib import admin
-from .models import Campaign, Donation
+from .models import Campaign, Donation, RecurringSchedule, EmailOutbox, WebhookEvent, ScreeningPattern
 
 @admin.register(Campaign)
 class CampaignAdmin(admin.ModelAdmin):
-    list_display = ['title', 'student', 'goal', 'current_amount', 'approved', 'created_at']
+    list_display = ['title', 'student', 'goal', 'current_amount', 'donation_count', 'approved', 'created_at']
     list_filter = ['approved', 'created_at']
     search_fields = ['title', 'student__username', 'student__full_name']
-    readonly_fields = ['current_amount', 'created_at', 'updated_at']
+    readonly_fields = [
+        'current_amount', 'donation_count', 'unique_donor_count', 'donations_total',
+        'created_at', 'updated_at',
+    ]
     
     fieldsets = (
         ('Campaign Info', {
@@ -15,6 +18,9 @@ class CampaignAdmin(admin.ModelAdmin):
         ('Management', {
             'fields': ('student', 'approved')
         }),
+        ('Donation Statistics', {
+            'fields': ('donation_count', 'unique_donor_count', 'donations_total')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -23,7 +29,36 @@ class CampaignAdmin(admin.ModelAdmin):
 
 @admin.register(Donation)
 class DonationAdmin(admin.ModelAdmin):
-    list_display = ['campaign', 'donor', 'amount', 'status', 'payment_method', 'created_at']
+    list_display = ['campaign', 'donor', 'amount', 'status', 'payment_method', 'fraud_score', 'created_at']
     list_filter = ['status', 'payment_method', 'anonymous', 'created_at']
     search_fields = ['campaign__title', 'donor__username']
+    readonly_fields = ['fraud_score', 'fraud_flags', 'created_at', 'updated_at']
+
+@admin.register(RecurringSchedule)
+class RecurringScheduleAdmin(admin.ModelAdmin):
+    list_display = ['template', 'frequency', 'next_charge_at', 'last_charged_at', 'active']
+    list_filter = ['frequency', 'active']
+    search_fields = ['template__campaign__title', 'template__donor__username']
+    raw_id_fields = ['template']
+    readonly_fields = ['last_charged_at', 'created_at', 'updated_at']
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['donation', 'event', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['event', 'status']
+    raw_id_fields = ['donation']
+    readonly_fields = ['last_error', 'created_at', 'updated_at', 'sent_at']
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'event_type', 'event_id', 'donation_ref', 'status', 'attempts', 'received_at']
+    list_filter = ['provider', 'status', 'event_type']
+    search_fields = ['event_id', 'donation_ref']
+    readonly_fields = ['payload', 'last_error', 'received_at', 'updated_at', 'processed_at']
+
+@admin.register(ScreeningPattern)
+class ScreeningPatternAdmin(admin.ModelAdmin):
+    list_display = ['pattern', 'kind', 'description', 'active', 'updated_at']
+    list_filter = ['kind', 'active']
+    search_fields = ['pattern', 'description']
     readonly_fields = ['created_at', 'updated_at']
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class FundraisingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fundraising'
+    
+    def ready(self):
+        # Connect cache invalidation receivers
+        from . import signals  # noqa: F401
@@ -1,11 +1,50 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
 from django.contrib.auth.decorators import user_passes_test
-from django.http import HttpResponseForbidden
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponse, HttpResponseForbidden
 from functools import wraps
+import asyncio
 import logging
+from .ratelimit import SlidingWindowRateLimiter
 from .security import DonationValidator
 
 logger = logging.getLogger(__name__)
 
+async def aget_request_user(request):
+    """
+    Load request.user for an async view. The lazy user set by the
+    authentication middleware queries the database on first access, which
+    is not allowed on the event loop.
+    """
+    user = getattr(request, '_cached_user', None)
+    if user is None:
+        user = await sync_to_async(get_user)(request)
+        # Shared with the middleware's lazy user so it is loaded only once
+        request._cached_user = user
+    request.user = user
+    return user
+
+def async_user_passes_test(test_func):
+    """
+    user_passes_test for async views.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            user = await aget_request_user(request)
+            if test_func(user):
+                return await view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wrapper
+    return decorator
+
+def async_login_required(function):
+    """
+    login_required for async views.
+    """
+    return async_user_passes_test(lambda user: user.is_authenticated)(function)
+
 def role_required(role):
     """
     Decorator for views that checks that the user has a specific role,
@@ -13,7 +52,12 @@ def role_required(role):
     """
     def check_role(user):
         return user.is_authenticated and user.role == role
-    return user_passes_test(check_role)
+    
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            return async_user_passes_test(check_role)(view_func)
+        return user_passes_test(check_role)(view_func)
+    return decorator
 
 def student_required(function=None):
     """
@@ -46,28 +90,45 @@ def secure_payment_view(view_func):
     """
     Decorator that adds security validation to payment-related views
     """
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
+    def validate(request):
         # Only apply security validation to POST requests
-        if request.method == 'POST':
-            # Validate the donation request
-            form_data = {
-                'amount': request.POST.get('amount'),
-                'payment_method': request.POST.get('payment_method'),
-                'message': request.POST.get('message', ''),
-                'donor_email': request.POST.get('donor_email', ''),
-            }
-            
-            validation_result = DonationValidator.validate_donation_request(request, form_data)
-            
-            # If validation fails, return forbidden response
-            if not validation_result['valid']:
-                logger.warning(f"Payment security validation failed: {validation_result['errors']}")
-                return HttpResponseForbidden("Request blocked for security reasons")
-            
-            # Attach validation result to request for use in view
-            request.security_validation = validation_result
+        if request.method != 'POST':
+            return None
+        
+        # Validate the donation request
+        form_data = {
+            'amount': request.POST.get('amount'),
+            'payment_method': request.POST.get('payment_method'),
+            'message': request.POST.get('message', ''),
+            'donor_email': request.POST.get('donor_email', ''),
+        }
         
+        validation_result = DonationValidator.validate_donation_request(request, form_data)
+        
+        # If validation fails, return forbidden response
+        if not validation_result['valid']:
+            logger.warning(f"Payment security validation failed: {validation_result['errors']}")
+            return HttpResponseForbidden("Request blocked for security reasons")
+        
+        # Attach validation result to request for use in view
+        request.security_validation = validation_result
+        return None
+    
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            # The validator keeps its rate-limit counters in the cache
+            response = await sync_to_async(validate)(request)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+    
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = validate(request)
+        if response is not None:
+            return response
         return view_func(request, *args, **kwargs)
     
     return wrapper
@@ -76,18 +137,38 @@ def log_payment_activity(activity_type):
     """
     Decorator that logs payment-related activities for monitoring
     """
+    def client_description(request):
+        # Get client IP
+        ip_address = request.META.get('HTTP_X_FORWARDED_FOR')
+        if ip_address:
+            ip_address = ip_address.split(',')[0]
+        else:
+            ip_address = request.META.get('REMOTE_ADDR', 'unknown')
+        
+        user_id = request.user.id if request.user.is_authenticated else 'anonymous'
+        return user_id, ip_address
+    
     def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                await aget_request_user(request)
+                user_id, ip_address = client_description(request)
+                logger.info(f"Payment activity: {activity_type} from user {user_id} at IP {ip_address}")
+                
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                    logger.info(f"Payment activity completed: {activity_type} from user {user_id}")
+                    return response
+                except Exception as e:
+                    logger.error(f"Payment activity failed: {activity_type} from user {user_id} - Error: {str(e)}")
+                    raise
+            return async_wrapper
+        
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Get client IP
-            ip_address = request.META.get('HTTP_X_FORWARDED_FOR')
-            if ip_address:
-                ip_address = ip_address.split(',')[0]
-            else:
-                ip_address = request.META.get('REMOTE_ADDR', 'unknown')
-            
             # Log the activity
-            user_id = request.user.id if request.user.is_authenticated else 'anonymous'
+            user_id, ip_address = client_description(request)
             logger.info(f"Payment activity: {activity_type} from user {user_id} at IP {ip_address}")
             
             try:
@@ -97,7 +178,7 @@ def log_payment_activity(activity_type):
                 logger.info(f"Payment activity completed: {activity_type} from user {user_id}")
                 
                 return response
-                
+            
             except Exception as e:
                 # Log any errors
                 logger.error(f"Payment activity failed: {activity_type} from user {user_id} - Error: {str(e)}")
@@ -108,36 +189,49 @@ def log_payment_activity(activity_type):
 
 def rate_limit_payment(max_attempts=5, window_minutes=60):
     """
-    Decorator that implements rate limiting for payment attempts
+    Decorator that implements rate limiting for payment attempts.
+    
+    Each user and each client IP may make max_attempts attempts per sliding
+    window of window_minutes; the counters are shared by every view using
+    the same window.
     """
+    limiter = SlidingWindowRateLimiter(f'payment_attempts_{window_minutes}m', window=window_minutes * 60)
+    
+    def client_limits(request):
+        ip_address = request.META.get('HTTP_X_FORWARDED_FOR')
+        if ip_address:
+            ip_address = ip_address.split(',')[0].strip()
+        else:
+            ip_address = request.META.get('REMOTE_ADDR', 'unknown')
+        
+        limits = {f'ip:{ip_address}': max_attempts}
+        if request.user.is_authenticated:
+            limits[f'user:{request.user.id}'] = max_attempts
+        return limits
+    
+    def check_rate_limit(request):
+        reservation = limiter.acquire(client_limits(request))
+        if not reservation:
+            logger.warning(f"Rate limit exceeded for {', '.join(reservation.exceeded)}")
+            return HttpResponse("Too many payment attempts. Please try again later.", status=429)
+        return None
+    
     def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                await aget_request_user(request)
+                response = await sync_to_async(check_rate_limit)(request)
+                if response is not None:
+                    return response
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+        
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            from django.core.cache import cache
-            from django.http import HttpResponseTooManyRequests
-            
-            # Get client identifier
-            if request.user.is_authenticated:
-                client_id = f"user_{request.user.id}"
-            else:
-                ip_address = request.META.get('HTTP_X_FORWARDED_FOR')
-                if ip_address:
-                    ip_address = ip_address.split(',')[0]
-                else:
-                    ip_address = request.META.get('REMOTE_ADDR', 'unknown')
-                client_id = f"ip_{ip_address}"
-            
-            # Check rate limit
-            cache_key = f"payment_rate_limit_{client_id}"
-            attempts = cache.get(cache_key, 0)
-            
-            if attempts >= max_attempts:
-                logger.warning(f"Rate limit exceeded for {client_id}")
-                return HttpResponseTooManyRequests("Too many payment attempts. Please try again later.")
-            
-            # Increment counter
-            cache.set(cache_key, attempts + 1, window_minutes * 60)
-            
+            response = check_rate_limit(request)
+            if response is not None:
+                return response
             return view_func(request, *args, **kwargs)
         
         return wrapper
@@ -147,8 +241,7 @@ def require_https_in_production(view_func):
     """
     Decorator that requires HTTPS for payment views in production
     """
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
+    def insecure_redirect(request):
         from django.conf import settings
         from django.http import HttpResponsePermanentRedirect
         
@@ -158,7 +251,22 @@ def require_https_in_production(view_func):
             return HttpResponsePermanentRedirect(
                 'https://' + request.get_host() + request.get_full_path()
             )
-        
+        return None
+    
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            response = insecure_redirect(request)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+    
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = insecure_redirect(request)
+        if response is not None:
+            return response
         return view_func(request, *args, **kwargs)
     
     return wrapper
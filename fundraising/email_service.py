@@ -1,8 +1,10 @@
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail, EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
 from django.utils import timezone
+from datetime import timedelta
+from .models import DonationReceipt, EmailOutbox
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,83 @@ logger = logging.getLogger(__name__)
 class DonationReceiptEmailService:
     """Focused email service for sending donation receipts to donors"""
     
+    @staticmethod
+    def build_donation_receipt(donation):
+        """Build the donation receipt email, or None if there is no recipient"""
+        # Get recipient email
+        recipient_email = donation.donor.email if donation.donor else donation.donor_email
+        if not recipient_email:
+            logger.warning(f"No email address found for donation {donation.id}")
+            return None
+        
+        # Generate receipt data
+        receipt_data = {
+            'donation': donation,
+            'campaign': donation.campaign,
+            'donor_name': donation.get_display_name(),
+            'receipt_number': f"EDU-{timezone.now().year}-{str(donation.id)[:8].upper()}",
+            'site_name': 'EduFund',
+            'current_date': timezone.now(),
+            'total_amount': donation.amount + (donation.processing_fee or 0),
+        }
+        
+        # Create email subject
+        subject = f"Donation Receipt - Thank you for supporting {donation.campaign.title}"
+        
+        # Render email templates
+        html_content = render_to_string('emails/donation_receipt.html', receipt_data)
+        text_content = strip_tags(html_content)
+        
+        # Create email message
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient_email]
+        )
+        email.attach_alternative(html_content, "text/html")
+        
+        return email
+    
+    @staticmethod
+    def build_student_notification(donation):
+        """Build the new donation notification for the campaign's student"""
+        student = donation.campaign.student
+        if not student.email:
+            logger.warning(f"No email address found for student of campaign {donation.campaign_id}")
+            return None
+        
+        notification_data = {
+            'donation': donation,
+            'campaign': donation.campaign,
+            'student': student,
+            'donor_name': donation.get_display_name(),
+            'site_name': 'EduFund',
+            'progress_percentage': donation.campaign.progress_percentage(),
+        }
+        
+        subject = f"New donation received for {donation.campaign.title}!"
+        
+        html_content = render_to_string('emails/student_notification.html', notification_data)
+        text_content = strip_tags(html_content)
+        
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[student.email]
+        )
+        email.attach_alternative(html_content, "text/html")
+        
+        return email
+    
+    @staticmethod
+    def mark_receipt_sent(donation):
+        """Update donation receipt tracking after the receipt went out"""
+        DonationReceipt.objects.filter(donation=donation).update(
+            email_sent=True, email_sent_at=timezone.now()
+        )
+    
     @staticmethod
     def send_donation_receipt(donation):
         """Send donation receipt email to donor"""
@@ -19,49 +98,15 @@ class DonationReceiptEmailService:
                 logger.warning("Email not configured. Cannot send donation receipt.")
                 return False
             
-            # Get recipient email
-            recipient_email = donation.donor.email if donation.donor else donation.donor_email
-            if not recipient_email:
-                logger.warning(f"No email address found for donation {donation.id}")
+            email = DonationReceiptEmailService.build_donation_receipt(donation)
+            if email is None:
                 return False
             
-            # Generate receipt data
-            receipt_data = {
-                'donation': donation,
-                'campaign': donation.campaign,
-                'donor_name': donation.get_display_name(),
-                'receipt_number': f"EDU-{timezone.now().year}-{str(donation.id)[:8].upper()}",
-                'site_name': 'EduFund',
-                'current_date': timezone.now(),
-                'total_amount': donation.amount + (donation.processing_fee or 0),
-            }
-            
-            # Create email subject
-            subject = f"Donation Receipt - Thank you for supporting {donation.campaign.title}"
-            
-            # Render email templates
-            html_content = render_to_string('emails/donation_receipt.html', receipt_data)
-            text_content = strip_tags(html_content)
-            
-            # Create email message
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[recipient_email]
-            )
-            email.attach_alternative(html_content, "text/html")
-            
             # Send email
             email.send()
+            DonationReceiptEmailService.mark_receipt_sent(donation)
             
-            # Update donation receipt tracking
-            if hasattr(donation, 'receipt'):
-                donation.receipt.email_sent = True
-                donation.receipt.email_sent_at = timezone.now()
-                donation.receipt.save()
-            
-            logger.info(f"Donation receipt sent successfully to {recipient_email} for donation {donation.id}")
+            logger.info(f"Donation receipt sent successfully to {email.to[0]} for donation {donation.id}")
             return True
             
         except Exception as e:
@@ -76,33 +121,13 @@ class DonationReceiptEmailService:
                 logger.warning("Email not configured. Cannot send student notification.")
                 return False
             
-            student = donation.campaign.student
-            
-            notification_data = {
-                'donation': donation,
-                'campaign': donation.campaign,
-                'student': student,
-                'donor_name': donation.get_display_name(),
-                'site_name': 'EduFund',
-                'progress_percentage': donation.campaign.progress_percentage(),
-            }
-            
-            subject = f"New donation received for {donation.campaign.title}!"
-            
-            html_content = render_to_string('emails/student_notification.html', notification_data)
-            text_content = strip_tags(html_content)
-            
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[student.email]
-            )
-            email.attach_alternative(html_content, "text/html")
+            email = DonationReceiptEmailService.build_student_notification(donation)
+            if email is None:
+                return False
             
             email.send()
             
-            logger.info(f"Student notification sent successfully to {student.email} for donation {donation.id}")
+            logger.info(f"Student notification sent successfully to {email.to[0]} for donation {donation.id}")
             return True
             
         except Exception as e:
@@ -128,3 +153,152 @@ class DonationReceiptEmailService:
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
+
+
+class EmailOutboxService:
+    """Queues donation emails and delivers them from a background worker
+    
+    Requests and webhooks only insert outbox rows; the worker renders and
+    sends them in batches over one SMTP connection, retrying failures with
+    exponential backoff.
+    """
+    
+    BUILDERS = {
+        'donation_receipt': DonationReceiptEmailService.build_donation_receipt,
+        'student_notification': DonationReceiptEmailService.build_student_notification,
+    }
+    
+    @staticmethod
+    def enqueue(donation, event):
+        """Queue an email for a donation; each event is queued at most once"""
+        outbox_email, created = EmailOutbox.objects.get_or_create(donation=donation, event=event)
+        return outbox_email if created else None
+    
+    @staticmethod
+    def enqueue_donation_emails(donation):
+        """Queue the receipt and student notification for a completed donation"""
+        for event in ('donation_receipt', 'student_notification'):
+            EmailOutboxService.enqueue(donation, event)
+    
+    @staticmethod
+    def enqueue_bulk(donations):
+        """Queue receipts and student notifications for many donations in one insert"""
+        EmailOutbox.objects.bulk_create(
+            [
+                EmailOutbox(donation=donation, event=event)
+                for donation in donations
+                for event in ('donation_receipt', 'student_notification')
+            ],
+            ignore_conflicts=True,
+        )
+    
+    @staticmethod
+    def send_pending(batch_size=None):
+        """Deliver one batch of due outbox emails and return per-status counts"""
+        from django.db import transaction
+        
+        batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_SENDING_TIMEOUT', 600))
+        counts = {'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+        
+        with transaction.atomic():
+            # Rows left in sending by a crashed worker count as a failed attempt, so
+            # an email that keeps crashing workers backs off and is given up on
+            stale = EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+                status='sending', updated_at__lt=stale_before,
+            ).only('pk', 'attempts')[:batch_size]
+            for outbox_email in stale:
+                logger.warning(f"Email outbox row {outbox_email.pk} was left sending by a stopped worker")
+                counts[EmailOutboxService._schedule_retry(outbox_email, 'Worker stopped while sending')] += 1
+            
+            # Claim the batch
+            claimed = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+                    status='pending', next_attempt_at__lte=now,
+                ).order_by('next_attempt_at')[:batch_size].values_list('pk', flat=True)
+            )
+            EmailOutbox.objects.filter(pk__in=claimed).update(status='sending', updated_at=now)
+        
+        counts['claimed'] = len(claimed)
+        if not claimed:
+            return counts
+        
+        outbox_emails = EmailOutbox.objects.filter(pk__in=claimed).select_related(
+            'donation__donor', 'donation__campaign__student'
+        )
+        
+        connection = get_connection()
+        try:
+            connection.open()
+            for outbox_email in outbox_emails:
+                try:
+                    message = EmailOutboxService.BUILDERS[outbox_email.event](outbox_email.donation)
+                    if message is not None:
+                        # One message per call so a bad recipient fails only its own row
+                        connection.send_messages([message])
+                except Exception as e:
+                    logger.error(f"Failed to send {outbox_email.event} for donation {outbox_email.donation_id}: {str(e)}")
+                    counts[EmailOutboxService._schedule_retry(outbox_email, e)] += 1
+                    continue
+                
+                EmailOutbox.objects.filter(pk=outbox_email.pk).update(
+                    status='sent', sent_at=timezone.now(), last_error='', updated_at=timezone.now()
+                )
+                if message is not None and outbox_email.event == 'donation_receipt':
+                    DonationReceiptEmailService.mark_receipt_sent(outbox_email.donation)
+                counts['sent'] += 1
+        except Exception as e:
+            # Connection failures: put every unsent row of the batch back
+            logger.error(f"Email outbox connection failed: {str(e)}")
+            for outbox_email in EmailOutbox.objects.filter(pk__in=claimed, status='sending'):
+                counts[EmailOutboxService._schedule_retry(outbox_email, e)] += 1
+        finally:
+            connection.close()
+        
+        return counts
+    
+    @staticmethod
+    def _schedule_retry(outbox_email, error):
+        """Back off a failed email, or give up after the maximum attempts"""
+        max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        base_delay = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+        attempts = outbox_email.attempts + 1
+        now = timezone.now()
+        
+        if attempts >= max_attempts:
+            status = 'failed'
+            next_attempt_at = now
+        else:
+            status = 'pending'
+            next_attempt_at = now + timedelta(seconds=base_delay * 2 ** (attempts - 1))
+        
+        EmailOutbox.objects.filter(pk=outbox_email.pk).update(
+            status=status,
+            attempts=attempts,
+            next_attempt_at=next_attempt_at,
+            last_error=str(error)[:1000],
+            updated_at=now,
+        )
+        
+        return 'failed' if status == 'failed' else 'retried'
+    
+    @staticmethod
+    def get_metrics():
+        """Return queue depth and lag of the outbox"""
+        from django.db.models import Count, Min, Q
+        
+        now = timezone.now()
+        stats = EmailOutbox.objects.aggregate(
+            pending=Count('id', filter=Q(status='pending')),
+            due=Count('id', filter=Q(status='pending', next_attempt_at__lte=now)),
+            sending=Count('id', filter=Q(status='sending')),
+            failed=Count('id', filter=Q(status='failed')),
+            oldest_pending=Min('created_at', filter=Q(status__in=['pending', 'sending'])),
+        )
+        
+        oldest_pending = stats.pop('oldest_pending')
+        stats['depth'] = stats['pending'] + stats['sending']
+        stats['lag_seconds'] = (now - oldest_pending).total_seconds() if oldest_pending else 0
+        
+        return stats
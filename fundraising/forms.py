@@ -180,6 +180,72 @@ class DonationForm(forms.ModelForm):
         fixed_fee = 0.30
         return round(percentage_fee + fixed_fee, 2)
 
+class CampaignBrowseForm(forms.Form):
+    """Filters for browsing approved campaigns"""
+    
+    CATEGORY_CHOICES = [('', 'All Categories')] + list(Campaign._meta.get_field('category').choices)
+    
+    ACTIVE_CHOICES = [
+        ('', 'Active & Closed'),
+        ('active', 'Active'),
+        ('closed', 'Closed'),
+    ]
+    
+    q = forms.CharField(
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'w-full border border-gray-300 rounded-md p-2 focus:outline-none focus:ring-2 focus:ring-blue-500',
+            'placeholder': 'Search campaigns, categories or students...'
+        })
+    )
+    
+    category = forms.ChoiceField(
+        choices=CATEGORY_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'border border-gray-300 rounded-md p-2 focus:outline-none focus:ring-2 focus:ring-blue-500'
+        })
+    )
+    
+    active = forms.ChoiceField(
+        choices=ACTIVE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'border border-gray-300 rounded-md p-2 focus:outline-none focus:ring-2 focus:ring-blue-500'
+        })
+    )
+    
+    featured = forms.BooleanField(
+        required=False,
+        label='Featured only',
+        widget=forms.CheckboxInput(attrs={
+            'class': 'rounded border-gray-300 text-blue-600 focus:ring-blue-500'
+        })
+    )
+    
+    # Opaque position of the last campaign on the previous page when browsing
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput())
+    
+    # Page of search results
+    page = forms.IntegerField(required=False, min_value=1, widget=forms.HiddenInput())
+    
+    def get_filters(self):
+        """Keyword arguments for CampaignBrowseService from the fields that are valid"""
+        self.is_valid()
+        data = self.cleaned_data
+        active = data.get('active')
+        return {
+            'category': data.get('category', ''),
+            'active': {'active': True, 'closed': False}.get(active),
+            'featured': data.get('featured', False),
+        }
+    
+    def get_search(self):
+        """(query, page) of a search, with an empty query when browsing"""
+        self.is_valid()
+        return self.cleaned_data.get('q', '').strip(), self.cleaned_data.get('page') or 1
+
 class DonationSearchForm(forms.Form):
     """Form for searching and filtering donations"""
     
@@ -190,21 +256,9 @@ class DonationSearchForm(forms.Form):
         ('amount', 'Lowest Amount'),
     ]
     
-    STATUS_CHOICES = [
-        ('', 'All Statuses'),
-        ('completed', 'Completed'),
-        ('pending', 'Pending'),
-        ('failed', 'Failed'),
-    ]
+    STATUS_CHOICES = [('', 'All Statuses')] + list(Donation.STATUS_CHOICES)
     
-    PAYMENT_METHOD_CHOICES = [
-        ('', 'All Payment Methods'),
-        ('paypal', 'PayPal'),
-        ('stripe', 'Credit/Debit Card'),
-        ('mobile_money', 'Mobile Money'),
-        ('bank_transfer', 'Bank Transfer'),
-        ('crypto', 'Cryptocurrency'),
-    ]
+    PAYMENT_METHOD_CHOICES = [('', 'All Payment Methods')] + list(Donation.PAYMENT_METHOD_CHOICES)
     
     search = forms.CharField(
         max_length=100,
@@ -259,6 +313,25 @@ class DonationSearchForm(forms.Form):
             'class': 'border border-gray-300 rounded-md p-2 focus:outline-none focus:ring-2 focus:ring-blue-500'
         })
     )
+    
+    # Opaque position of the last donation on the previous page
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput())
+    
+    def get_filters(self):
+        """Keyword arguments for DonationSearchService from the fields that are valid"""
+        self.is_valid()
+        data = self.cleaned_data
+        return {
+            'search': data.get('search', '').strip(),
+            'status': data.get('status', ''),
+            'payment_method': data.get('payment_method', ''),
+            'min_amount': data.get('min_amount'),
+            'max_amount': data.get('max_amount'),
+        }
+    
+    def get_sort(self):
+        self.is_valid()
+        return self.cleaned_data.get('sort_by') or '-created_at'
 
 class BulkDonationForm(forms.Form):
     """Form for making donations to multiple campaigns at once"""
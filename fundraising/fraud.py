@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from collections import deque
+import ipaddress
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Velocity feature windows, in seconds
+VELOCITY_WINDOWS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+# A counter holds the amount in cents above the low COUNT_BITS bits and the donation count below
+COUNT_BITS = 20
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+def velocity_entities(user_id=None, ip_address=None, email=''):
+    """Identifiers velocity features are kept for, by kind"""
+    entities = {}
+    if user_id:
+        entities['user'] = str(user_id)
+    if ip_address:
+        entities['ip'] = str(ip_address)
+    if email and '@' in email:
+        entities['email_domain'] = email.rpartition('@')[2].strip().lower()
+    return entities
+
+def donation_email(donation):
+    """The email a donation was made with: the one given, else the donor's"""
+    if donation.donor_email or not donation.donor_id:
+        return donation.donor_email
+    return donation.donor.email
+
+def donation_entities(donation):
+    """velocity_entities for a stored donation"""
+    return velocity_entities(donation.donor_id, donation.ip_address, donation_email(donation))
+
+def empty_features(entities, windows=VELOCITY_WINDOWS):
+    return {
+        kind: {label: {'count': 0, 'amount': 0.0} for label in windows}
+        for kind in entities
+    }
+
+_flagged_networks = (None, [])
+
+def in_flagged_network(ip_address):
+    """Whether an IP address falls in one of the FRAUD_FLAGGED_NETWORKS ranges"""
+    global _flagged_networks
+    
+    if not ip_address:
+        return False
+    
+    configured = tuple(getattr(settings, 'FRAUD_FLAGGED_NETWORKS', ()))
+    if not configured:
+        return False
+    
+    if _flagged_networks[0] != configured:
+        networks = []
+        for network in configured:
+            try:
+                networks.append(ipaddress.ip_network(network.strip(), strict=False))
+            except ValueError:
+                logger.error(f"Ignoring invalid flagged network {network!r}")
+        _flagged_networks = (configured, networks)
+    
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    return any(address in network for network in _flagged_networks[1])
+
+class VelocityFeatureStore:
+    """Rolling donation counts and amounts per donor, IP address and email domain
+    
+    Every entity has one counter per fixed bucket of each window, kept in the
+    cache like the donation rate limiter's. A donation adds to the current
+    buckets with atomic incr calls, and the total over the last window is
+    estimated as the current bucket plus the share of the previous bucket
+    still inside the window. Each counter packs the donation count and the
+    amount in cents into one integer, so recording a donation is one incr
+    per entity and window and reading every feature for a request is a
+    single get_many, however many donations came before.
+    
+    Features are best effort: if the cache is unavailable nothing is
+    recorded and all features read as zero.
+    """
+    
+    def __init__(self, name, windows=VELOCITY_WINDOWS, cache=None):
+        self.name = name
+        self.windows = dict(windows)
+        self.cache = cache or default_cache
+    
+    def record(self, entities, amount, now=None):
+        """Add one donation of amount to every entity's windows"""
+        now = time.time() if now is None else now
+        value = (int(round(amount * 100)) << COUNT_BITS) + 1
+        
+        try:
+            for kind, identifier in entities.items():
+                for label, window in self.windows.items():
+                    self._incr(self._key(kind, identifier, label, int(now // window)), value, window)
+        except Exception as e:
+            logger.warning(f"Velocity store {self.name}: could not record donation: {e}")
+    
+    def features(self, entities, now=None):
+        """{kind: {window: {'count': ..., 'amount': ...}}} over the last window of each size"""
+        now = time.time() if now is None else now
+        features = empty_features(entities, self.windows)
+        
+        buckets = []
+        for kind, identifier in entities.items():
+            for label, window in self.windows.items():
+                index, offset = divmod(now, window)
+                index = int(index)
+                buckets.append((
+                    kind, label, 1 - offset / window,
+                    self._key(kind, identifier, label, index),
+                    self._key(kind, identifier, label, index - 1),
+                ))
+        
+        try:
+            values = self.cache.get_many([key for bucket in buckets for key in bucket[3:]])
+        except Exception as e:
+            logger.warning(f"Velocity store {self.name}: could not read features: {e}")
+            return features
+        
+        for kind, label, weight, current, previous in buckets:
+            current, previous = values.get(current, 0), values.get(previous, 0)
+            features[kind][label] = {
+                'count': (current & COUNT_MASK) + (previous & COUNT_MASK) * weight,
+                'amount': ((current >> COUNT_BITS) + (previous >> COUNT_BITS) * weight) / 100,
+            }
+        return features
+    
+    def _key(self, kind, identifier, label, index):
+        return f'velocity:{self.name}:{kind}:{identifier}:{label}:{index}'
+    
+    def _incr(self, key, value, window):
+        try:
+            return self.cache.incr(key, value)
+        except ValueError:
+            # Buckets outlive their window so the next one can weigh them in
+            if self.cache.add(key, value, window * 2):
+                return value
+            return self.cache.incr(key, value)
+
+class VelocityReplay:
+    """Exact velocity features rebuilt from stored donations, oldest first
+    
+    Used to backfill scores: features() gives what the store would have
+    held just before a donation, record() then adds it. Each window keeps
+    the donations still inside it with running totals, so every call is
+    amortised O(1).
+    """
+    
+    def __init__(self, windows=VELOCITY_WINDOWS):
+        self.windows = dict(windows)
+        self._entities = {}
+    
+    def features(self, entities, now):
+        features = empty_features(entities, self.windows)
+        for kind, identifier in entities.items():
+            state = self._entities.get((kind, identifier))
+            if state is None:
+                continue
+            for label, window in self.windows.items():
+                events, totals = state[label]
+                self._evict(events, totals, now - window)
+                features[kind][label] = {'count': totals[0], 'amount': totals[1] / 100}
+        return features
+    
+    def record(self, entities, amount, now):
+        cents = int(round(amount * 100))
+        for kind, identifier in entities.items():
+            state = self._entities.setdefault(
+                (kind, identifier), {label: (deque(), [0, 0]) for label in self.windows}
+            )
+            for events, totals in state.values():
+                events.append((now, cents))
+                totals[0] += 1
+                totals[1] += cents
+    
+    def prune(self, now):
+        """Forget entities with no donation inside the longest window"""
+        horizon = now - max(self.windows.values())
+        for key, state in list(self._entities.items()):
+            if all(not events or events[-1][0] <= horizon for events, _ in state.values()):
+                del self._entities[key]
+    
+    @staticmethod
+    def _evict(events, totals, horizon):
+        while events and events[0][0] <= horizon:
+            _, cents = events.popleft()
+            totals[0] -= 1
+            totals[1] -= cents
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fundraising.services import DonationRollupService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        'Incrementally build the daily donation rollup table. Run with --full after '
+        'bulk Donation updates that do not set updated_at'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Discard all rollups and rebuild them from scratch',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Starting donation rollup build at {timezone.now()}')
+        )
+        
+        try:
+            days = DonationRollupService.build(full=options['full'])
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error building donation rollups: {str(e)}')
+            )
+            logger.error(f'Donation rollup build failed: {str(e)}')
+            return
+        
+        if days:
+            self.stdout.write(f'Rebuilt {len(days)} days ({days[0]} to {days[-1]})')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Donation rollups up to date ({len(days)} days rebuilt)')
+        )
@@ -1,9 +1,105 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from fundraising.services import DonationAnalyticsService
-from fundraising.models import Campaign
+from fundraising.models import Campaign, Donation
+from datetime import datetime, time, timedelta
+import csv
 import json
 
+# Columns streamed by --export, in output order
+EXPORT_COLUMNS = (
+    'id', 'created_at', 'completed_at', 'campaign_id', 'donor_id', 'status',
+    'payment_method', 'amount', 'processing_fee', 'net_amount', 'anonymous',
+    'is_recurring', 'payment_id',
+)
+
+class CsvExportWriter:
+    """Incremental CSV writer"""
+    
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+    
+    def write_rows(self, rows):
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+    
+    def close(self):
+        self.file.close()
+
+class JsonLinesExportWriter:
+    """Incremental JSON Lines writer"""
+    
+    def __init__(self, path):
+        self.file = open(path, 'w')
+    
+    def write_rows(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=self._default) + '\n' for row in rows
+        )
+    
+    def close(self):
+        self.file.close()
+    
+    @staticmethod
+    def _default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+class ParquetExportWriter:
+    """Incremental Parquet writer, one row group per chunk"""
+    
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('Parquet export requires pyarrow to be installed')
+        
+        money = pa.decimal128(10, 2)
+        timestamp = pa.timestamp('us', tz='UTC')
+        self.pa = pa
+        self.schema = pa.schema([
+            ('id', pa.string()),
+            ('created_at', timestamp),
+            ('completed_at', timestamp),
+            ('campaign_id', pa.int64()),
+            ('donor_id', pa.int64()),
+            ('status', pa.string()),
+            ('payment_method', pa.string()),
+            ('amount', money),
+            ('processing_fee', money),
+            ('net_amount', money),
+            ('anonymous', pa.bool_()),
+            ('is_recurring', pa.bool_()),
+            ('payment_id', pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+    
+    def write_rows(self, rows):
+        columns = list(zip(*rows))
+        columns[0] = [str(value) for value in columns[0]]
+        self.writer.write_batch(
+            self.pa.RecordBatch.from_arrays(
+                [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema,
+            )
+        )
+    
+    def close(self):
+        self.writer.close()
+
+EXPORT_WRITERS = {
+    'csv': CsvExportWriter,
+    'jsonl': JsonLinesExportWriter,
+    'parquet': ParquetExportWriter,
+}
+
 class Command(BaseCommand):
     help = 'Generate analytics report for campaigns and donations'
     
@@ -23,8 +119,41 @@ class Command(BaseCommand):
             '--output-file',
             help='Save report to file',
         )
+        parser.add_argument(
+            '--export',
+            action='store_true',
+            help='Stream individual donations to --output-file instead of a summary report',
+        )
+        parser.add_argument(
+            '--export-format',
+            choices=sorted(EXPORT_WRITERS),
+            default='csv',
+            help='Export file format',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows fetched and written per chunk when exporting',
+        )
+        parser.add_argument(
+            '--status',
+            help='Export only donations with this status',
+        )
+        parser.add_argument(
+            '--date-from',
+            help='Export donations created on or after this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--date-to',
+            help='Export donations created on or before this date (YYYY-MM-DD)',
+        )
     
     def handle(self, *args, **options):
+        if options['export']:
+            self._export_donations(options)
+            return
+        
         if options['campaign_id']:
             # Generate campaign-specific report
             try:
@@ -60,6 +189,80 @@ class Command(BaseCommand):
         else:
             self.stdout.write(report)
     
+    def _export_donations(self, options):
+        """Stream donations to the output file in chunks without building models"""
+        if not options['output_file']:
+            raise CommandError('--export requires --output-file')
+        
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+        
+        donations = Donation.objects.all()
+        
+        if options['campaign_id']:
+            donations = donations.filter(campaign_id=options['campaign_id'])
+        
+        if options['status']:
+            donations = donations.filter(status=options['status'])
+        
+        if options['date_from']:
+            donations = donations.filter(created_at__gte=self._parse_day(options['date_from']))
+        
+        if options['date_to']:
+            next_day = self._parse_day(options['date_to']) + timedelta(days=1)
+            donations = donations.filter(created_at__lt=next_day)
+        
+        rows = donations.order_by('created_at', 'id').values_list(*EXPORT_COLUMNS).iterator(
+            chunk_size=chunk_size
+        )
+        
+        writer = EXPORT_WRITERS[options['export_format']](options['output_file'])
+        started = timezone.now()
+        exported = 0
+        chunk = []
+        
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    writer.write_rows(chunk)
+                    exported += len(chunk)
+                    chunk = []
+                    self._report_progress(exported, started)
+            
+            if chunk:
+                writer.write_rows(chunk)
+                exported += len(chunk)
+        finally:
+            writer.close()
+        
+        elapsed = (timezone.now() - started).total_seconds()
+        throughput = exported / elapsed if elapsed > 0 else exported
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Exported {exported:,} donations to {options["output_file"]} '
+                f'in {elapsed:.1f}s ({throughput:,.0f} rows/s)'
+            )
+        )
+    
+    def _report_progress(self, exported, started):
+        """Write a progress and throughput line to stderr"""
+        elapsed = (timezone.now() - started).total_seconds()
+        throughput = exported / elapsed if elapsed > 0 else exported
+        self.stderr.write(f'Exported {exported:,} rows ({throughput:,.0f} rows/s)')
+    
+    def _parse_day(self, value):
+        """Parse a YYYY-MM-DD option into an aware start-of-day datetime"""
+        try:
+            day = parse_date(value)
+        except ValueError:
+            # Well formed but impossible, like 2024-02-30
+            day = None
+        if not day:
+            raise CommandError(f'Invalid date: {value}')
+        return timezone.make_aware(datetime.combine(day, time.min))
+    
     def _format_campaign_report(self, campaign, analytics):
         """Format campaign analytics as text report"""
         return f"""
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from fundraising.services import PayPalIPNBatchService
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Apply a replayed PayPal IPN dump (one urlencoded message per line) in bulk'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='IPN dump file, or - to read from standard input',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of messages applied per bulk update',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without updating donations',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Starting PayPal IPN ingestion at {timezone.now()}'
+            )
+        )
+        
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING('DRY RUN MODE - No donations will be updated')
+            )
+        
+        try:
+            if options['path'] == '-':
+                counts = PayPalIPNBatchService.ingest(
+                    sys.stdin, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                )
+            else:
+                with open(options['path'], encoding='utf-8') as dump:
+                    counts = PayPalIPNBatchService.ingest(
+                        dump, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                    )
+        except OSError as e:
+            raise CommandError(f"Cannot read IPN dump: {e}")
+        
+        self.stdout.write(
+            f"{counts['messages']} messages: {counts['duplicates']} already received, "
+            f"{counts['skipped']} without a donation or known status"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{counts['donations']} donations: {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['missing']} not found; "
+                f"{counts['campaigns']} campaigns reconciled"
+            )
+        )
+        logger.info(f"PayPal IPN ingestion finished: {counts}")
@@ -14,6 +14,33 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be processed without actually processing',
         )
+        parser.add_argument(
+            '--backfill-schedules',
+            action='store_true',
+            help='Create billing schedules for recurring donations that have none',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of due donations claimed per batch',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Maximum number of concurrent gateway calls',
+        )
+        parser.add_argument(
+            '--cycles',
+            type=int,
+            default=3,
+            help='Number of monthly billing cycles to forecast in dry-run mode',
+        )
+        parser.add_argument(
+            '--charge-latency',
+            type=float,
+            default=1.0,
+            help='Assumed seconds per gateway call when estimating run time',
+        )
     
     def handle(self, *args, **options):
         self.stdout.write(
@@ -22,24 +49,80 @@ class Command(BaseCommand):
             )
         )
         
+        if options['backfill_schedules']:
+            created = RecurringDonationService.backfill_schedules()
+            self.stdout.write(f'Created {created} recurring schedules')
+        
         if options['dry_run']:
             self.stdout.write(
                 self.style.WARNING('DRY RUN MODE - No actual processing will occur')
             )
-            # TODO: Implement dry run logic
+            self._print_plan(RecurringDonationService.plan_recurring_run(
+                cycles=options['cycles'],
+                max_workers=options['concurrency'],
+                charge_latency=options['charge_latency'],
+            ))
             return
         
         try:
-            processed_count = RecurringDonationService.process_recurring_donations()
+            results = RecurringDonationService.process_due_recurring_donations(
+                batch_size=options['batch_size'],
+                max_workers=options['concurrency'],
+                on_batch=self._report_batch,
+            )
+            
+            processed_count = sum(1 for result in results if result['success'])
+            failed_count = len(results) - processed_count
             
             self.stdout.write(
                 self.style.SUCCESS(
                     f'Successfully processed {processed_count} recurring donations'
                 )
             )
+            if failed_count:
+                self.stdout.write(
+                    self.style.WARNING(f'{failed_count} recurring donations failed')
+                )
             
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error processing recurring donations: {str(e)}')
             )
             logger.error(f'Recurring donation processing failed: {str(e)}')
+    
+    def _report_batch(self, stats):
+        """Print throughput for a processed batch"""
+        self.stdout.write(
+            f"Batch {stats['batch']}: {stats['size']} charges "
+            f"({stats['succeeded']} succeeded, {stats['failed']} failed) "
+            f"in {stats['elapsed']:.2f}s ({stats['throughput']:.1f} charges/s)"
+        )
+    
+    def _print_plan(self, plan):
+        """Print the due-now breakdown and the billing cycle forecast"""
+        self.stdout.write('\nCHARGES DUE NOW:')
+        self.stdout.write(f"{'Method':<16}{'Charges':>10}{'Gross':>16}{'Fees':>14}")
+        for entry in plan['due_now']:
+            self.stdout.write(
+                f"{entry['payment_method']:<16}{entry['count']:>10,}"
+                f"{entry['gross']:>16,.2f}{entry['fees']:>14,.2f}"
+            )
+        self.stdout.write(
+            f"{'Total':<16}{plan['due_count']:>10,}"
+            f"{plan['due_gross']:>16,.2f}{plan['due_fees']:>14,.2f}"
+        )
+        self.stdout.write(
+            f"Estimated run time: {plan['estimated_duration']:.1f}s "
+            f"at concurrency {plan['concurrency']}"
+        )
+        
+        self.stdout.write('\nFORECAST:')
+        self.stdout.write(
+            f"{'Cycle':<7}{'From':<12}{'To':<12}{'Charges':>10}{'Gross':>16}{'Fees':>14}{'Run time':>12}"
+        )
+        for cycle in plan['forecast']:
+            self.stdout.write(
+                f"{cycle['cycle']:<7}{cycle['start']:%Y-%m-%d}  {cycle['end']:%Y-%m-%d}  "
+                f"{cycle['count']:>10,}{cycle['gross']:>16,.2f}{cycle['fees']:>14,.2f}"
+                f"{cycle['duration']:>11.1f}s"
+            )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from fundraising.services import WebhookInboxService
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Apply payment webhook events recorded in the webhook inbox'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of events claimed per batch',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Maximum number of donations processed concurrently',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            help='Keep running and poll the inbox every INTERVAL seconds',
+        )
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        
+        while True:
+            try:
+                counts = WebhookInboxService.process_pending(
+                    batch_size=options['batch_size'],
+                    max_workers=options['concurrency'],
+                )
+                style = self.style.WARNING if counts['failed'] or counts['retried'] else self.style.SUCCESS
+                self.stdout.write(
+                    style(
+                        f"Webhook events: {counts['processed']} processed, {counts['ignored']} ignored, "
+                        f"{counts['retried']} retrying, {counts['failed']} failed"
+                    )
+                )
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing webhook events: {str(e)}')
+                )
+                logger.error(f'Webhook inbox run failed: {str(e)}')
+            
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from fundraising.search import get_campaign_search_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the campaign full-text search index from the campaigns table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database whose index to rebuild',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Campaigns indexed per database round-trip',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Starting campaign search index rebuild at {timezone.now()}'
+            )
+        )
+        
+        index = get_campaign_search_index(options['database'])
+        if index is None:
+            self.stdout.write(
+                self.style.WARNING('This database has no full-text search support; search falls back to substring matching')
+            )
+            return
+        
+        indexed = index.rebuild(batch_size=options['batch_size'])
+        logger.info(f'Rebuilt campaign search index with {indexed} campaigns')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Search index rebuilt: {indexed} campaigns indexed')
+        )
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fundraising.services import CampaignLedgerService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recalculate campaign totals and donation counters from completed donations and repair drift'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--campaign-id',
+            type=int,
+            action='append',
+            help='Reconcile only this campaign (can be given multiple times)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Campaigns checked per aggregate query',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without correcting it',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Starting campaign total reconciliation at {timezone.now()}'
+            )
+        )
+        
+        drifted = CampaignLedgerService.reconcile(
+            campaign_ids=options['campaign_id'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+        )
+        
+        for entry in drifted:
+            changes = ', '.join(
+                f"{field} {entry['recorded'][field]} -> {entry['expected'][field]}"
+                for field in entry['expected']
+                if entry['recorded'][field] != entry['expected'][field]
+            )
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Campaign {entry['campaign_id']} ({entry['title']}): {changes}"
+                )
+            )
+        
+        if drifted:
+            logger.warning(f'Campaign total drift found in {len(drifted)} campaigns')
+        
+        action = 'found' if options['dry_run'] else 'repaired'
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciliation complete: {len(drifted)} campaigns {action}')
+        )
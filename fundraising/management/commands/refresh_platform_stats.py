@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fundraising.services import PlatformStatsService
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recompute the cached platform statistics snapshot'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            help='Keep running and refresh every INTERVAL seconds',
+        )
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        
+        while True:
+            try:
+                stats = PlatformStatsService.refresh()
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Platform statistics refreshed at {timezone.now()}: "
+                        f"{stats['total_campaigns']} campaigns, "
+                        f"{stats['total_donors']} donors, "
+                        f"${stats['total_raised']:,.2f} raised"
+                    )
+                )
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error refreshing platform statistics: {str(e)}')
+                )
+                logger.error(f'Platform statistics refresh failed: {str(e)}')
+            
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from fundraising.models import Donation
+from fundraising.security import content_screener
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Screen stored donation messages against the current suspicious-content patterns'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pattern-id',
+            type=int,
+            action='append',
+            help='Screen only with this stored pattern, e.g. one just added (can be given multiple times)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only screen donations created on or after this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Donations fetched per database round-trip',
+        )
+        parser.add_argument(
+            '--flag',
+            action='store_true',
+            help='Add a note to the admin notes of matching donations',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Starting donation message screening at {timezone.now()}'
+            )
+        )
+        
+        donations = Donation.objects.all()
+        if options['since']:
+            donations = donations.filter(created_at__date__gte=self._parse_since(options['since']))
+        
+        matches = 0
+        flagged = []
+        for donation, patterns in content_screener.rescreen_donations(
+            donations, pattern_ids=options['pattern_id'], batch_size=options['batch_size']
+        ):
+            matches += 1
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Donation {donation.id}: {', '.join(patterns)} - {donation.message[:80]!r}"
+                )
+            )
+            
+            note = f"Flagged by content screening: {', '.join(patterns)}"
+            if options['flag'] and note not in donation.admin_notes:
+                donation.admin_notes = f"{donation.admin_notes}\n{note}".strip()
+                flagged.append(donation)
+            
+            if len(flagged) >= options['batch_size']:
+                Donation.objects.bulk_update(flagged, ['admin_notes'])
+                flagged = []
+        
+        if flagged:
+            Donation.objects.bulk_update(flagged, ['admin_notes'])
+        
+        if matches:
+            logger.warning(f'Content screening matched {matches} stored donation messages')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Screening complete: {matches} donations matched')
+        )
+    
+    def _parse_since(self, value):
+        """Parse the YYYY-MM-DD --since option"""
+        try:
+            day = parse_date(value)
+        except ValueError:
+            # Well formed but impossible, like 2024-02-30
+            day = None
+        if not day:
+            raise CommandError(f'Invalid --since date: {value}')
+        return day
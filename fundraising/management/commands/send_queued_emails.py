@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from fundraising.email_service import EmailOutboxService
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Deliver queued donation emails from the email outbox'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of emails sent per SMTP connection',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            help='Keep running and poll the outbox every INTERVAL seconds',
+        )
+        parser.add_argument(
+            '--metrics',
+            action='store_true',
+            help='Only print outbox queue depth and lag',
+        )
+    
+    def handle(self, *args, **options):
+        if options['metrics']:
+            self._report_metrics()
+            return
+        
+        interval = options['interval']
+        
+        while True:
+            try:
+                # Drain everything that is due before sleeping
+                while True:
+                    counts = EmailOutboxService.send_pending(batch_size=options['batch_size'])
+                    if not counts['claimed']:
+                        break
+                    self.stdout.write(
+                        f"Batch of {counts['claimed']}: {counts['sent']} sent, "
+                        f"{counts['retried']} retrying, {counts['failed']} failed"
+                    )
+                
+                self._report_metrics()
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error sending queued emails: {str(e)}')
+                )
+                logger.error(f'Email outbox run failed: {str(e)}')
+            
+            if not interval:
+                break
+            time.sleep(interval)
+    
+    def _report_metrics(self):
+        metrics = EmailOutboxService.get_metrics()
+        style = self.style.WARNING if metrics['failed'] else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"Outbox depth {metrics['depth']} ({metrics['due']} due, "
+                f"{metrics['sending']} sending), lag {metrics['lag_seconds']:.0f}s, "
+                f"{metrics['failed']} failed"
+            )
+        )
+        logger.info(f"Email outbox metrics: {metrics}")
@@ -1,9 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
 from decimal import Decimal
+import re
 import uuid
 
+# Sent after commit whenever a donation is created, deleted, changes status or moves to
+# another campaign or donor
+donation_status_changed = Signal()
+
 class Campaign(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -35,11 +43,18 @@ class Campaign(models.Model):
     share_count = models.PositiveIntegerField(default=0)
     view_count = models.PositiveIntegerField(default=0)
     
+    # Denormalized completed-donation statistics, maintained by Donation.save() and the
+    # donation delete receivers in signals.py
+    donation_count = models.PositiveIntegerField(default=0)
+    unique_donor_count = models.PositiveIntegerField(default=0)
+    donations_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['approved', 'is_active']),
-            models.Index(fields=['category']),
+            # Keyset pagination of the browse page; created_at alone serves the unfiltered listing
+            models.Index(fields=['category', '-created_at', '-id'], name='campaign_category_browse_idx'),
             models.Index(fields=['created_at']),
         ]
     
@@ -58,14 +73,11 @@ class Campaign(models.Model):
         return self.current_amount >= self.goal
     
     def donor_count(self):
-        return self.donations.filter(status='completed').values('donor').distinct().count()
+        return self.unique_donor_count
     
     def average_donation(self):
-        completed_donations = self.donations.filter(status='completed')
-        if completed_donations.exists():
-            total = completed_donations.aggregate(models.Sum('amount'))['amount__sum']
-            count = completed_donations.count()
-            return total / count if count > 0 else 0
+        if self.donation_count > 0:
+            return self.donations_total / self.donation_count
         return 0
 
 class Donation(models.Model):
@@ -120,15 +132,17 @@ class Donation(models.Model):
     anonymous = models.BooleanField(default=False)
     message = models.TextField(max_length=500, blank=True, help_text="Optional message to the student")
     
+    FREQUENCY_CHOICES = (
+        ('monthly', 'Monthly'),
+        ('quarterly', 'Quarterly'),
+        ('yearly', 'Yearly'),
+    )
+    
     # Recurring donations
     is_recurring = models.BooleanField(default=False)
     recurring_frequency = models.CharField(
         max_length=20,
-        choices=[
-            ('monthly', 'Monthly'),
-            ('quarterly', 'Quarterly'),
-            ('yearly', 'Yearly'),
-        ],
+        choices=FREQUENCY_CHOICES,
         blank=True,
         null=True
     )
@@ -139,6 +153,11 @@ class Donation(models.Model):
         blank=True,
         related_name='recurring_donations'
     )
+    scheduled_for = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Billing date this recurring charge was generated for"
+    )
     
     # Donor information for anonymous donations
     donor_name = models.CharField(max_length=100, blank=True, help_text="Name for anonymous donations")
@@ -148,6 +167,10 @@ class Donation(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
+    # Fraud screening
+    fraud_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    fraud_flags = models.JSONField(default=list, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -162,13 +185,29 @@ class Donation(models.Model):
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['campaign', 'status']),
             models.Index(fields=['donor', 'status']),
+            # Keyset pagination of a donor's donation history
+            models.Index(fields=['donor', '-created_at', '-id'], name='donation_donor_history_idx'),
             models.Index(fields=['payment_method']),
+            models.Index(fields=['amount']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+        ]
+        constraints = [
+            # One charge per schedule date, even if runners race
+            models.UniqueConstraint(
+                fields=['parent_donation', 'scheduled_for'],
+                name='unique_recurring_charge',
+            ),
         ]
     
     def __str__(self):
         donor_name = "Anonymous" if self.anonymous else (self.donor.full_name if self.donor else "Guest")
         return f"${self.amount} from {donor_name} to {self.campaign.title}"
     
+    # Fields whose changes move the campaign ledger
+    LEDGER_FIELDS = ('status', 'amount', 'processing_fee', 'net_amount', 'campaign', 'donor')
+    LEDGER_VALUES = ('status', 'amount', 'net_amount', 'campaign_id', 'donor_id')
+    
     def save(self, *args, **kwargs):
         # Calculate net amount (amount minus processing fee)
         if self.processing_fee:
@@ -176,14 +215,116 @@ class Donation(models.Model):
         else:
             self.net_amount = self.amount
         
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        tracks_ledger = update_fields is None or any(
+            field in update_fields for field in self.LEDGER_FIELDS
+        )
         
-        # Update campaign amount if donation is completed
-        if self.status == 'completed' and self.pk:
-            self.update_campaign_amount()
+        with transaction.atomic():
+            # Lock the stored row so concurrent status changes are applied in order
+            previous = None
+            if tracks_ledger and not self._state.adding:
+                previous = Donation.objects.select_for_update().filter(pk=self.pk).values(
+                    *self.LEDGER_VALUES
+                ).first()
+            
+            super().save(*args, **kwargs)
+            
+            # Apply the status transition to the campaign ledger
+            if tracks_ledger:
+                self._apply_ledger_transition(previous)
+                if previous is None or (previous['status'], previous['campaign_id'], previous['donor_id']) != (
+                    self.status, self.campaign_id, self.donor_id
+                ):
+                    self._notify_status_change(previous, self.status)
+    
+    def _notify_status_change(self, previous, status):
+        """Send donation_status_changed once the transaction commits"""
+        campaign_ids = {self.campaign_id}
+        if previous:
+            campaign_ids.add(previous['campaign_id'])
+        
+        transaction.on_commit(lambda: donation_status_changed.send(
+            sender=Donation,
+            donation=self,
+            previous_status=previous['status'] if previous else None,
+            status=status,
+            campaign_ids=campaign_ids,
+            previous_donor_id=previous['donor_id'] if previous else None,
+        ))
+    
+    def _apply_ledger_transition(self, previous, current=True):
+        """Apply the signed deltas of a status transition to the campaign ledger"""
+        deltas = {}
+        
+        def record(campaign_id, donor_id, sign, amount, net_amount):
+            entry = deltas.setdefault(campaign_id, {'count': 0, 'amount': 0, 'net': 0, 'donors': {}})
+            entry['count'] += sign
+            entry['amount'] += sign * (amount or 0)
+            entry['net'] += sign * (net_amount or 0)
+            entry['donors'][donor_id] = entry['donors'].get(donor_id, 0) + sign
+        
+        if previous and previous['status'] == 'completed':
+            record(previous['campaign_id'], previous['donor_id'], -1,
+                   previous['amount'], previous['net_amount'])
+        
+        if current and self.status == 'completed':
+            record(self.campaign_id, self.donor_id, 1, self.amount, self.net_amount)
+        
+        for campaign_id, entry in deltas.items():
+            self._apply_campaign_delta(campaign_id, entry, recount_donors=not current)
+    
+    def _apply_campaign_delta(self, campaign_id, entry, recount_donors=False):
+        """Atomically shift a campaign's denormalized statistics"""
+        changed_donors = [donor_id for donor_id, sign in entry['donors'].items() if sign]
+        if not (entry['count'] or entry['amount'] or entry['net'] or changed_donors):
+            return
+        
+        donor_delta = 0
+        if changed_donors:
+            # Serialise unique donor bookkeeping on the campaign row
+            stored = Campaign.objects.select_for_update().filter(pk=campaign_id).values(
+                'unique_donor_count'
+            ).first()
+            if recount_donors:
+                # A bulk or cascade delete removes all its rows before the first reversal, so
+                # count the remaining donors instead of decrementing once per deleted row
+                remaining = Donation.objects.filter(campaign_id=campaign_id, status='completed').aggregate(
+                    donors=models.Count('donor', distinct=True),
+                    guests=models.Count('id', filter=models.Q(donor__isnull=True)),
+                )
+                if stored:
+                    donor_delta = (
+                        remaining['donors'] + (1 if remaining['guests'] else 0) - stored['unique_donor_count']
+                    )
+            else:
+                for donor_id in changed_donors:
+                    has_other_donations = Donation.objects.filter(
+                        campaign_id=campaign_id, donor_id=donor_id, status='completed'
+                    ).exclude(pk=self.pk).exists()
+                    if not has_other_donations:
+                        donor_delta += entry['donors'][donor_id]
+        
+        Campaign.objects.filter(pk=campaign_id).update(
+            current_amount=models.F('current_amount') + entry['net'],
+            donation_count=models.F('donation_count') + entry['count'],
+            donations_total=models.F('donations_total') + entry['amount'],
+            unique_donor_count=models.F('unique_donor_count') + donor_delta,
+        )
+        
+        # Keep an already loaded campaign in step with the database
+        if campaign_id == self.campaign_id and Donation.campaign.is_cached(self):
+            self.campaign.current_amount += entry['net']
+            self.campaign.donation_count += entry['count']
+            self.campaign.donations_total += entry['amount']
+            self.campaign.unique_donor_count += donor_delta
     
     def update_campaign_amount(self):
-        """Update the campaign's current amount based on completed donations"""
+        """Recalculate the campaign's current amount from all completed donations.
+        
+        save() keeps the total up to date incrementally, so this full aggregate
+        is only needed to repair drift (see the reconcile_campaign_totals command).
+        """
         total = self.campaign.donations.filter(status='completed').aggregate(
             models.Sum('net_amount')
         )['net_amount__sum'] or 0
@@ -220,6 +361,64 @@ class Donation(models.Model):
             'status': self.get_status_display(),
         }
 
+class RecurringSchedule(models.Model):
+    """Billing schedule of a recurring donation"""
+    template = models.OneToOneField(Donation, on_delete=models.CASCADE, related_name='recurring_schedule')
+    frequency = models.CharField(max_length=20, choices=Donation.FREQUENCY_CHOICES, default='monthly')
+    next_charge_at = models.DateTimeField()
+    active = models.BooleanField(default=True)
+    last_charged_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['next_charge_at']
+        indexes = [
+            models.Index(fields=['next_charge_at', 'active']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_frequency_display()} schedule for {self.template_id}, next {self.next_charge_at}"
+
+class DonationDailyRollup(models.Model):
+    """Materialized daily donation totals per campaign, payment method and status"""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Donation.PAYMENT_METHOD_CHOICES)
+    status = models.CharField(max_length=20, choices=Donation.STATUS_CHOICES)
+    
+    donation_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fee_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['campaign', 'date', 'payment_method', 'status'],
+                name='unique_donation_daily_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.campaign_id} {self.payment_method}/{self.status}: {self.donation_count}"
+
+class RollupWatermark(models.Model):
+    """Tracks how far an incremental rollup builder has processed"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
 class DonationReceipt(models.Model):
     """Model to track donation receipts"""
     donation = models.OneToOneField(Donation, on_delete=models.CASCADE, related_name='receipt')
@@ -231,6 +430,118 @@ class DonationReceipt(models.Model):
     def __str__(self):
         return f"Receipt {self.receipt_number} for {self.donation}"
 
+class EmailOutbox(models.Model):
+    """Donation email waiting to be delivered by the outbox worker"""
+    EVENT_CHOICES = (
+        ('donation_receipt', 'Donation Receipt'),
+        ('student_notification', 'Student Notification'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='outbox_emails')
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['donation', 'event'], name='unique_outbox_email'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_event_display()} for {self.donation_id} ({self.status})"
+
+class WebhookEvent(models.Model):
+    """Verified payment provider notification waiting to be applied"""
+    PROVIDER_CHOICES = (
+        ('stripe', 'Stripe'),
+        ('paypal', 'PayPal'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+    
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    # Donation id as sent by the provider; not validated until processing
+    donation_ref = models.CharField(max_length=64, blank=True)
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+            models.Index(fields=['donation_ref', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id} ({self.status})"
+
+class ScreeningPattern(models.Model):
+    """Suspicious-content pattern added at runtime, on top of the built-in lists"""
+    KIND_CHOICES = (
+        ('message', 'Donation message (regular expression)'),
+        ('email_domain', 'Donor email domain'),
+    )
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='message')
+    pattern = models.CharField(max_length=255)
+    description = models.CharField(max_length=255, blank=True)
+    active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['kind', 'pattern']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'pattern'], name='unique_screening_pattern'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.pattern}"
+    
+    def clean(self):
+        if self.kind == 'message':
+            try:
+                re.compile(f'(?:{self.pattern})')
+            except re.error as e:
+                raise ValidationError({'pattern': f"Invalid regular expression: {e}"})
+
 class DonationComment(models.Model):
     """Model for comments/updates on donations"""
     donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='comments')
@@ -0,0 +1,56 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+import base64
+import binascii
+import json
+
+def _fields(model, order_field):
+    return model._meta.get_field(order_field.lstrip('-')), model._meta.pk
+
+def encode_cursor(obj, order_field):
+    """Opaque cursor for the position just after obj in an order_field listing"""
+    field, pk = _fields(type(obj), order_field)
+    position = json.dumps([field.value_to_string(obj), pk.value_to_string(obj)])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+def decode_cursor(model, order_field, cursor):
+    """(value, pk) from a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+
+    field, pk = _fields(model, order_field)
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        value, key = position
+        value, key = field.to_python(value), pk.to_python(key)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+        return None
+
+    if value is None or key is None:
+        return None
+    return value, key
+
+def keyset_page(queryset, order_field, cursor=None, page_size=20):
+    """One page of queryset ordered by order_field then primary key, and the next page's cursor
+
+    Pages are sought from the last row of the previous page instead of an
+    offset, so any page costs one index range scan of page_size + 1 rows
+    however far in it is. order_field must not be nullable; the next cursor
+    is None on the last page.
+    """
+    name = order_field.lstrip('-')
+    descending = order_field.startswith('-')
+    lookup = 'lt' if descending else 'gt'
+
+    position = decode_cursor(queryset.model, order_field, cursor)
+    if position:
+        value, key = position
+        # The bound on the order field alone lets the index range scan start at the cursor
+        queryset = queryset.filter(**{f'{name}__{lookup}e': value}).filter(
+            Q(**{f'{name}__{lookup}': value}) | Q(**{f'pk__{lookup}': key})
+        )
+
+    rows = list(queryset.order_by(order_field, '-pk' if descending else 'pk')[:page_size + 1])
+    if len(rows) > page_size:
+        return rows[:page_size], encode_cursor(rows[page_size - 1], order_field)
+    return rows, None
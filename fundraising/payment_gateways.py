@@ -1,9 +1,18 @@
 import stripe
 import paypalrestsdk
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.urls import reverse
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import bisect
+import datetime
+import functools
 import logging
+import threading
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -11,17 +20,233 @@ logger = logging.getLogger(__name__)
 # Initialize Stripe
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
 
-# Initialize PayPal
-paypalrestsdk.configure({
-    "mode": getattr(settings, 'PAYPAL_MODE', 'sandbox'),  # sandbox or live
-    "client_id": getattr(settings, 'PAYPAL_CLIENT_ID', ''),
-    "client_secret": getattr(settings, 'PAYPAL_CLIENT_SECRET', '')
-})
+# Long-lived HTTP clients, created lazily so each worker process builds its own
+_clients = {}
+_clients_lock = threading.RLock()
+
+def get_http_session(name):
+    """Return the keep-alive session used for one payment provider"""
+    session = _clients.get(('session', name))
+    if session is None:
+        with _clients_lock:
+            session = _clients.get(('session', name))
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=getattr(settings, 'PAYMENT_HTTP_POOL_CONNECTIONS', 4),
+                    pool_maxsize=getattr(settings, 'PAYMENT_HTTP_POOL_MAXSIZE', 20),
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _clients[('session', name)] = session
+    return session
+
+def get_provider_timeout(name):
+    """Timeout budget in seconds for one request to a payment provider"""
+    return getattr(settings, f'{name.upper()}_TIMEOUT', getattr(settings, 'PAYMENT_HTTP_TIMEOUT', 30))
+
+def configure_stripe():
+    """Point the stripe library at the pooled Stripe session"""
+    if ('stripe', 'client') not in _clients:
+        with _clients_lock:
+            if ('stripe', 'client') not in _clients:
+                stripe.default_http_client = stripe.http_client.RequestsClient(
+                    timeout=get_provider_timeout('stripe'),
+                    session=get_http_session('stripe'),
+                )
+                _clients[('stripe', 'client')] = stripe.default_http_client
+
+class PooledPayPalApi(paypalrestsdk.Api):
+    """PayPal API client on a pooled keep-alive session
+    
+    The OAuth token is cached per worker process and refreshed shortly
+    before it expires; a lock makes concurrent threads share one refresh.
+    """
+    
+    def __init__(self, options=None, session=None, timeout=30, token_refresh_margin=60, **kwargs):
+        super().__init__(options, **kwargs)
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.token_refresh_margin = token_refresh_margin
+        self._token_lock = threading.Lock()
+    
+    def get_token_hash(self, authorization_code=None, refresh_token=None, headers=None):
+        if authorization_code is not None or refresh_token is not None:
+            return super().get_token_hash(authorization_code, refresh_token, headers)
+        
+        with self._token_lock:
+            return super().get_token_hash(headers=headers)
+    
+    def validate_token_hash(self):
+        """Drop the cached token once it is within the refresh margin of expiring"""
+        if self.token_request_at and self.token_hash and self.token_hash.get('expires_in') is not None:
+            age = (datetime.datetime.now() - self.token_request_at).total_seconds()
+            if age > self.token_hash['expires_in'] - self.token_refresh_margin:
+                self.token_hash = None
+    
+    def http_call(self, url, method, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.request(method, url, proxies=self.proxies, **kwargs)
+        logger.debug(f"PayPal {method} {url}: {response.status_code} in {response.elapsed.total_seconds():.3f}s")
+        return self.handle_response(response, response.content.decode('utf-8'))
+
+def get_paypal_api():
+    """Return this worker's PayPal API client"""
+    api = _clients.get(('paypal', 'api'))
+    if api is None:
+        with _clients_lock:
+            api = _clients.get(('paypal', 'api'))
+            if api is None:
+                api = PooledPayPalApi(
+                    mode=getattr(settings, 'PAYPAL_MODE', 'sandbox'),  # sandbox or live
+                    client_id=getattr(settings, 'PAYPAL_CLIENT_ID', ''),
+                    client_secret=getattr(settings, 'PAYPAL_CLIENT_SECRET', ''),
+                    session=get_http_session('paypal'),
+                    timeout=get_provider_timeout('paypal'),
+                    token_refresh_margin=getattr(settings, 'PAYPAL_TOKEN_REFRESH_MARGIN', 60),
+                )
+                _clients[('paypal', 'api')] = api
+    return api
 
 class PaymentGatewayError(Exception):
     """Custom exception for payment gateway errors"""
     pass
 
+# Errors that mean the provider is down or overloaded, as opposed to a declined payment
+PROVIDER_OUTAGE_ERRORS = (
+    requests.RequestException,
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+    paypalrestsdk.exceptions.ConnectionError,
+    paypalrestsdk.exceptions.ServerError,
+)
+
+def is_provider_outage(error):
+    return isinstance(error, PROVIDER_OUTAGE_ERRORS)
+
+class CircuitBreaker:
+    """Fails fast after consecutive provider outages
+    
+    Closed: calls go through. After failure_threshold consecutive outages
+    the breaker opens and calls are refused until reset_timeout has passed;
+    then a single trial call is let through (half open) and its outcome
+    closes or re-opens the breaker.
+    """
+    
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self):
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_flight:
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets, in seconds"""
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+    
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds, error=False):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            if error:
+                self.errors += 1
+    
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.BUCKETS, counts):
+            if seen + count >= rank and count:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+    
+    def snapshot(self):
+        with self._lock:
+            return {'buckets': list(self.counts), 'count': self.count, 'sum': self.sum, 'errors': self.errors}
+
+class GuardedGateway:
+    """Wraps a gateway class with its provider's circuit breaker and latency histograms"""
+    
+    # Gateway method -> operation name used in metrics
+    OPERATIONS = {
+        'create_payment_intent': 'create',
+        'create_payment': 'create',
+        'confirm_payment': 'confirm',
+        'execute_payment': 'confirm',
+        'create_refund': 'refund',
+    }
+    
+    def __init__(self, provider, gateway):
+        self.provider = provider
+        self.gateway = gateway
+    
+    def __getattr__(self, name):
+        method = getattr(self.gateway, name)
+        operation = self.OPERATIONS.get(name)
+        if operation is None:
+            return method
+        
+        def guarded(*args, **kwargs):
+            return PaymentGatewayFactory.call(self.provider, operation, method, *args, **kwargs)
+        return guarded
+
 class StripePaymentGateway:
     """Stripe payment processing"""
     
@@ -32,6 +257,7 @@ class StripePaymentGateway:
             # Convert amount to cents for Stripe
             amount_cents = int(amount * 100)
             
+            configure_stripe()
             intent = stripe.PaymentIntent.create(
                 amount=amount_cents,
                 currency=currency,
@@ -52,13 +278,15 @@ class StripePaymentGateway:
             logger.error(f"Stripe error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
     
     @staticmethod
     def confirm_payment(payment_intent_id):
         """Confirm a Stripe payment"""
         try:
+            configure_stripe()
             intent = stripe.PaymentIntent.retrieve(payment_intent_id)
             
             return {
@@ -72,7 +300,8 @@ class StripePaymentGateway:
             logger.error(f"Stripe confirmation error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
     
     @staticmethod
@@ -83,6 +312,7 @@ class StripePaymentGateway:
             if amount:
                 refund_data['amount'] = int(amount * 100)  # Convert to cents
             
+            configure_stripe()
             refund = stripe.Refund.create(**refund_data)
             
             return {
@@ -96,7 +326,8 @@ class StripePaymentGateway:
             logger.error(f"Stripe refund error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
 
 class PayPalPaymentGateway:
@@ -131,7 +362,7 @@ class PayPalPaymentGateway:
                     },
                     "description": description
                 }]
-            })
+            }, api=get_paypal_api())
             
             if payment.create():
                 # Get approval URL
@@ -158,14 +389,15 @@ class PayPalPaymentGateway:
             logger.error(f"PayPal error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
     
     @staticmethod
     def execute_payment(payment_id, payer_id):
         """Execute a PayPal payment after approval"""
         try:
-            payment = paypalrestsdk.Payment.find(payment_id)
+            payment = paypalrestsdk.Payment.find(payment_id, api=get_paypal_api())
             
             if payment.execute({"payer_id": payer_id}):
                 return {
@@ -185,14 +417,15 @@ class PayPalPaymentGateway:
             logger.error(f"PayPal execution error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
     
     @staticmethod
     def create_refund(sale_id, amount=None):
         """Create a refund for a PayPal payment"""
         try:
-            sale = paypalrestsdk.Sale.find(sale_id)
+            sale = paypalrestsdk.Sale.find(sale_id, api=get_paypal_api())
             
             refund_data = {}
             if amount:
@@ -223,24 +456,35 @@ class PayPalPaymentGateway:
             logger.error(f"PayPal refund error: {str(e)}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'unavailable': is_provider_outage(e)
             }
 
 class PaymentGatewayFactory:
-    """Factory class to get the appropriate payment gateway"""
+    """Factory class to get the appropriate payment gateway
+    
+    Gateways are returned wrapped in a GuardedGateway, so every provider call
+    goes through that provider's circuit breaker and is timed into the
+    per-operation latency histograms.
+    """
     
     GATEWAYS = {
         'stripe': StripePaymentGateway,
         'paypal': PayPalPaymentGateway,
     }
     
+    _breakers = {}
+    _histograms = {}
+    _executor = None
+    _registry_lock = threading.Lock()
+    
     @classmethod
     def get_gateway(cls, payment_method):
         """Get payment gateway based on payment method"""
         if payment_method in ['stripe', 'credit_card', 'debit_card', 'visa', 'mastercard', 'amex', 'discover']:
-            return cls.GATEWAYS.get('stripe')
+            return GuardedGateway('stripe', cls.GATEWAYS.get('stripe'))
         elif payment_method == 'paypal':
-            return cls.GATEWAYS.get('paypal')
+            return GuardedGateway('paypal', cls.GATEWAYS.get('paypal'))
         else:
             raise PaymentGatewayError(f"Unsupported payment method: {payment_method}")
     
@@ -258,3 +502,163 @@ class PaymentGatewayFactory:
             return gateway.create_payment(amount, **kwargs)
         else:
             raise PaymentGatewayError(f"Unsupported payment processing for: {payment_method}")
+    
+    @classmethod
+    def get_executor(cls):
+        """Thread pool the async API runs the blocking provider SDK calls on"""
+        if cls._executor is None:
+            with cls._registry_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'PAYMENT_ASYNC_MAX_CONCURRENCY', 64),
+                        thread_name_prefix='payment-gateway',
+                    )
+        return cls._executor
+    
+    @classmethod
+    async def acall(cls, payment_method, name, *args, **kwargs):
+        """Await a guarded gateway method without blocking the event loop
+        
+        The Stripe and PayPal SDKs only do blocking I/O, so the call runs on
+        the gateway thread pool; the circuit breaker and latency histograms
+        apply exactly as they do to synchronous calls.
+        """
+        method = getattr(cls.get_gateway(payment_method), name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.get_executor(), functools.partial(method, *args, **kwargs))
+    
+    @classmethod
+    async def acreate_payment_intent(cls, amount, currency='usd', metadata=None):
+        return await cls.acall('stripe', 'create_payment_intent', amount, currency=currency, metadata=metadata)
+    
+    @classmethod
+    async def acreate_payment(cls, amount, currency='USD', return_url=None, cancel_url=None, description=""):
+        return await cls.acall(
+            'paypal', 'create_payment', amount, currency=currency,
+            return_url=return_url, cancel_url=cancel_url, description=description,
+        )
+    
+    @classmethod
+    async def aexecute_payment(cls, payment_id, payer_id):
+        return await cls.acall('paypal', 'execute_payment', payment_id, payer_id)
+    
+    @classmethod
+    async def acreate_refund(cls, payment_method, payment_id, amount=None):
+        return await cls.acall(payment_method, 'create_refund', payment_id, amount=amount)
+    
+    @classmethod
+    def get_breaker(cls, provider):
+        breaker = cls._breakers.get(provider)
+        if breaker is None:
+            with cls._registry_lock:
+                breaker = cls._breakers.setdefault(provider, CircuitBreaker(
+                    provider,
+                    failure_threshold=getattr(settings, 'PAYMENT_CIRCUIT_FAILURE_THRESHOLD', 5),
+                    reset_timeout=getattr(settings, 'PAYMENT_CIRCUIT_RESET_TIMEOUT', 30),
+                ))
+        return breaker
+    
+    @classmethod
+    def get_histogram(cls, provider, operation):
+        histogram = cls._histograms.get((provider, operation))
+        if histogram is None:
+            with cls._registry_lock:
+                histogram = cls._histograms.setdefault((provider, operation), LatencyHistogram())
+        return histogram
+    
+    @classmethod
+    def call(cls, provider, operation, method, *args, **kwargs):
+        """Run one gateway call behind the provider's circuit breaker"""
+        breaker = cls.get_breaker(provider)
+        if not breaker.allow():
+            logger.warning(f"{provider} circuit open; refusing {operation} call")
+            return {
+                'success': False,
+                'error': f"{provider.title()} is temporarily unavailable. Please try again shortly.",
+                'unavailable': True,
+            }
+        
+        started = time.monotonic()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            cls.get_histogram(provider, operation).observe(time.monotonic() - started, error=True)
+            if is_provider_outage(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        
+        outage = not result.get('success') and result.get('unavailable')
+        cls.get_histogram(provider, operation).observe(time.monotonic() - started, error=not result.get('success'))
+        if outage:
+            breaker.record_failure()
+        else:
+            # Declined or invalid payments still mean the provider answered
+            breaker.record_success()
+        
+        return result
+    
+    @classmethod
+    def get_metrics(cls):
+        """Per-operation latency quantiles and circuit states"""
+        operations = []
+        for (provider, operation), histogram in sorted(cls._histograms.items()):
+            snapshot = histogram.snapshot()
+            operations.append({
+                'provider': provider,
+                'operation': operation,
+                'count': snapshot['count'],
+                'errors': snapshot['errors'],
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            })
+        
+        circuits = {provider: cls.get_breaker(provider).state for provider in cls.GATEWAYS}
+        return {'operations': operations, 'circuits': circuits}
+    
+    @classmethod
+    def render_prometheus(cls):
+        """Latency histograms and circuit states in the Prometheus text format"""
+        lines = [
+            '# HELP payment_gateway_latency_seconds Latency of payment gateway calls.',
+            '# TYPE payment_gateway_latency_seconds histogram',
+        ]
+        quantile_lines = [
+            '# HELP payment_gateway_latency_quantile_seconds Estimated latency quantiles of payment gateway calls.',
+            '# TYPE payment_gateway_latency_quantile_seconds gauge',
+        ]
+        error_lines = [
+            '# HELP payment_gateway_errors_total Payment gateway calls that did not succeed.',
+            '# TYPE payment_gateway_errors_total counter',
+        ]
+        
+        for (provider, operation), histogram in sorted(cls._histograms.items()):
+            labels = f'provider="{provider}",operation="{operation}"'
+            snapshot = histogram.snapshot()
+            
+            cumulative = 0
+            for bound, count in zip(LatencyHistogram.BUCKETS, snapshot['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'payment_gateway_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'payment_gateway_latency_seconds_sum{{{labels}}} {snapshot["sum"]:.6f}')
+            lines.append(f'payment_gateway_latency_seconds_count{{{labels}}} {snapshot["count"]}')
+            
+            for quantile in (0.5, 0.95, 0.99):
+                quantile_lines.append(
+                    f'payment_gateway_latency_quantile_seconds{{{labels},quantile="{quantile}"}} '
+                    f'{histogram.quantile(quantile):.6f}'
+                )
+            error_lines.append(f'payment_gateway_errors_total{{{labels}}} {snapshot["errors"]}')
+        
+        circuit_lines = [
+            '# HELP payment_gateway_circuit_open Whether the provider circuit breaker is refusing calls.',
+            '# TYPE payment_gateway_circuit_open gauge',
+        ]
+        for provider in sorted(cls.GATEWAYS):
+            is_open = 1 if cls.get_breaker(provider).state == 'open' else 0
+            circuit_lines.append(f'payment_gateway_circuit_open{{provider="{provider}"}} {is_open}')
+        
+        return '\n'.join(lines + quantile_lines + error_lines + circuit_lines) + '\n'
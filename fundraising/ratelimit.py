@@ -0,0 +1,148 @@
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.locmem import LocMemCache
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class RateLimitReservation:
+    """Slots taken by SlidingWindowRateLimiter.acquire
+    
+    allowed is False when any identifier was over its limit; exceeded lists
+    those identifiers. An allowed reservation can be handed back with
+    release() if the request it was taken for is rejected for another reason.
+    """
+    
+    def __init__(self, allowed, exceeded=(), keys=(), store=None):
+        self.allowed = allowed
+        self.exceeded = list(exceeded)
+        self.keys = list(keys)
+        self.store = store
+    
+    def __bool__(self):
+        return self.allowed
+    
+    def __repr__(self):
+        return f"RateLimitReservation(allowed={self.allowed}, exceeded={self.exceeded!r})"
+
+class SlidingWindowRateLimiter:
+    """Sliding-window counters kept in the cache
+    
+    Each identifier (e.g. 'user:42' or 'ip:10.0.0.1') has one counter per
+    fixed window. The rate over the last `window` seconds is estimated as the
+    current window's count plus the previous window's count weighted by how
+    much of it still overlaps the sliding window.
+    
+    Counters are only changed with the cache's atomic add/incr/decr and keep
+    the expiry set when they were created, so concurrent requests cannot
+    overwrite each other and the window really slides. If the cache backend
+    is unavailable, an in-process cache is used instead; limits are then
+    enforced per worker process.
+    """
+    
+    def __init__(self, name, window, cache=None):
+        self.name = name
+        self.window = window
+        self.cache = cache or default_cache
+        self.fallback = LocMemCache(f'ratelimit-{name}', {'OPTIONS': {'MAX_ENTRIES': 100000}})
+    
+    def check(self, limits):
+        """Identifiers already at their limit, without counting a hit
+        
+        limits maps identifier -> allowed hits per window. All counters are
+        read in one get_many round-trip.
+        """
+        return self._run(self._check, limits)
+    
+    def acquire(self, limits):
+        """Count a hit for every identifier unless one of them is over its limit
+        
+        Counters are incremented first and the estimate taken afterwards, so
+        concurrent callers never admit more than the limit; a denied call
+        takes its increments back.
+        """
+        return self._run(self._acquire, limits)
+    
+    def hit(self, identifiers):
+        """Count a hit for each identifier unconditionally"""
+        return self._run(self._hit, identifiers)
+    
+    def release(self, reservation):
+        """Give back the slots of an allowed reservation"""
+        if not reservation.allowed:
+            return
+        
+        for key in reservation.keys:
+            try:
+                reservation.store.decr(key)
+            except ValueError:
+                # The window expired in the meantime
+                pass
+            except Exception as e:
+                logger.warning(f"Rate limiter {self.name}: could not release {key}: {e}")
+    
+    def _run(self, operation, argument):
+        try:
+            return operation(self.cache, argument)
+        except Exception as e:
+            logger.warning(f"Rate limiter {self.name}: cache unavailable, using in-process counters: {e}")
+            return operation(self.fallback, argument)
+    
+    def _windows(self, now=None):
+        """Current window index and the weight of the previous window"""
+        now = time.time() if now is None else now
+        index, offset = divmod(now, self.window)
+        return int(index), 1 - offset / self.window
+    
+    def _key(self, identifier, index):
+        return f'ratelimit:{self.name}:{identifier}:{index}'
+    
+    def _estimates(self, store, identifiers, index, weight, current=None):
+        """Sliding-window hit estimates, reading the counters in one round-trip"""
+        keys = [self._key(identifier, index - 1) for identifier in identifiers]
+        if current is None:
+            keys += [self._key(identifier, index) for identifier in identifiers]
+        counts = store.get_many(keys)
+        
+        estimates = {}
+        for identifier in identifiers:
+            previous = counts.get(self._key(identifier, index - 1), 0)
+            if current is None:
+                count = counts.get(self._key(identifier, index), 0)
+            else:
+                count = current[identifier]
+            estimates[identifier] = previous * weight + count
+        return estimates
+    
+    def _check(self, store, limits):
+        index, weight = self._windows()
+        estimates = self._estimates(store, list(limits), index, weight)
+        return [identifier for identifier, limit in limits.items() if estimates[identifier] >= limit]
+    
+    def _acquire(self, store, limits):
+        index, weight = self._windows()
+        counts = {identifier: self._incr(store, self._key(identifier, index)) for identifier in limits}
+        estimates = self._estimates(store, list(limits), index, weight, current=counts)
+        
+        keys = [self._key(identifier, index) for identifier in limits]
+        exceeded = [identifier for identifier, limit in limits.items() if estimates[identifier] > limit]
+        reservation = RateLimitReservation(True, keys=keys, store=store)
+        
+        if exceeded:
+            self.release(reservation)
+            return RateLimitReservation(False, exceeded=exceeded)
+        return reservation
+    
+    def _hit(self, store, identifiers):
+        index, _ = self._windows()
+        for identifier in identifiers:
+            self._incr(store, self._key(identifier, index))
+    
+    def _incr(self, store, key):
+        try:
+            return store.incr(key)
+        except ValueError:
+            # Counters outlive their window so the next one can weigh them in
+            if store.add(key, 1, self.window * 2):
+                return 1
+            return store.incr(key)
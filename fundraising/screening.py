@@ -0,0 +1,233 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from .models import ScreeningPattern
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Leading characters of a pattern that only match themselves
+LITERAL_PREFIX = re.compile(r"[\w @'-]*")
+
+def literal_prefix(source):
+    """The literal text a regular expression starts with"""
+    if '|' in source:
+        # A top-level alternation has no common prefix; not worth parsing for
+        return ''
+    
+    prefix = LITERAL_PREFIX.match(source).group()
+    # A quantifier applies to the last character only
+    if source[len(prefix):len(prefix) + 1] in ('*', '?', '+', '{'):
+        prefix = prefix[:-1]
+    return prefix
+
+def trie_source(entries):
+    """One alternation for (literal prefix, rest of pattern) entries, factored like a trie
+    
+    Patterns sharing leading characters share one branch, so at each text
+    position the regex engine tries a handful of first characters instead
+    of every pattern.
+    """
+    branches = {}
+    rests = []
+    for prefix, rest in entries:
+        if prefix:
+            branches.setdefault(prefix[0], []).append((prefix[1:], rest))
+        else:
+            rests.append(f'(?:{rest})' if rest else '')
+    
+    parts = [re.escape(char) + trie_source(children) for char, children in branches.items()] + rests
+    if len(parts) == 1:
+        return parts[0]
+    return '(?:' + '|'.join(parts) + ')'
+
+class PatternSet:
+    """Many patterns compiled into one alternation, scanned in a single pass
+    
+    Text is lowercased before matching, as the patterns are written in lower
+    case. Literal patterns (e.g. email domains) are escaped; the others are
+    regular expressions. The alternation is factored on the patterns'
+    literal prefixes and has no capturing groups, so the regex engine can
+    skip ahead on first characters; which pattern matched is only worked
+    out for the (rare) hits. Patterns with groups of their own are searched
+    separately, since their group numbers and backreferences would change
+    inside the alternation.
+    """
+    
+    def __init__(self, patterns, literal=False):
+        self.patterns = tuple(dict.fromkeys(pattern.lower() if literal else pattern for pattern in patterns))
+        sources = [re.escape(pattern) if literal else pattern for pattern in self.patterns]
+        self.compiled = [re.compile(source) for source in sources]
+        
+        entries = []
+        self.grouped = []
+        self.combined = []
+        for pattern, source, compiled in zip(self.patterns, sources, self.compiled):
+            if compiled.groups:
+                self.grouped.append((pattern, compiled))
+                continue
+            self.combined.append((pattern, compiled))
+            prefix = literal_prefix(source)
+            entries.append((prefix, source[len(prefix):]))
+        self.regex = re.compile(trie_source(entries)) if entries else None
+    
+    def __len__(self):
+        return len(self.patterns)
+    
+    def search(self, text):
+        """The first pattern found in text, or None"""
+        if not self.patterns or not text:
+            return None
+        
+        text = text.lower()
+        regexes = [compiled for _, compiled in self.grouped]
+        if self.regex is not None:
+            regexes.append(self.regex)
+        starts = [match.start() for match in (regex.search(text) for regex in regexes) if match]
+        if not starts:
+            return None
+        return self._matched_pattern(text, min(starts), zip(self.patterns, self.compiled))
+    
+    def findall(self, text):
+        """Every pattern found in text, in pattern order"""
+        if not self.patterns or not text:
+            return []
+        
+        text = text.lower()
+        candidates = list(self.grouped)
+        # The alternation only reports non-overlapping matches, so once it hits,
+        # each pattern is searched on its own to find overlapping ones too
+        if self.regex is not None and self.regex.search(text):
+            candidates += self.combined
+        found = {pattern for pattern, compiled in candidates if compiled.search(text)}
+        return [pattern for pattern in self.patterns if pattern in found]
+    
+    def _matched_pattern(self, text, position, candidates):
+        # Alternation tries the patterns in order, so the first one matching here is the one
+        for pattern, compiled in candidates:
+            if compiled.match(text, position):
+                return pattern
+        return None
+
+class ContentScreener:
+    """Suspicious-content screening for donation messages and donor emails
+    
+    Patterns come from settings (SUSPICIOUS_MESSAGE_PATTERNS and
+    SUSPICIOUS_EMAIL_DOMAINS, defaulting to the built-in lists) plus active
+    ScreeningPattern rows. They are compiled once and recompiled when the
+    shared version in the cache changes, which every process checks at most
+    once per SCREENING_RELOAD_INTERVAL seconds.
+    """
+    
+    VERSION_KEY = 'content_screening:version'
+    
+    def __init__(self, message_patterns, email_domains):
+        self.default_message_patterns = list(message_patterns)
+        self.default_email_domains = list(email_domains)
+        self._lock = threading.Lock()
+        self._pattern_sets = None
+        self._version = None
+        self._checked_at = 0
+    
+    def screen_message(self, message):
+        """The suspicious pattern a message matches, or None"""
+        return self.get_pattern_sets()['message'].search(message)
+    
+    def screen_email(self, email):
+        """The suspicious domain an email address contains, or None"""
+        return self.get_pattern_sets()['email_domain'].search(email)
+    
+    def get_pattern_sets(self):
+        """Compiled pattern sets by kind, reloaded when the patterns changed"""
+        interval = getattr(settings, 'SCREENING_RELOAD_INTERVAL', 30)
+        now = time.monotonic()
+        
+        if self._pattern_sets is not None and now - self._checked_at < interval:
+            return self._pattern_sets
+        
+        with self._lock:
+            if self._pattern_sets is None or now - self._checked_at >= interval:
+                version = cache.get(self.VERSION_KEY, 0)
+                if self._pattern_sets is None or version != self._version:
+                    self._pattern_sets = self.compile()
+                    self._version = version
+                self._checked_at = now
+        
+        return self._pattern_sets
+    
+    def compile(self, pattern_ids=None):
+        """Compile the current patterns
+        
+        pattern_ids restricts the set to those ScreeningPattern rows, leaving
+        out the settings lists.
+        """
+        patterns = {'message': [], 'email_domain': []}
+        if pattern_ids is None:
+            patterns['message'] += getattr(settings, 'SUSPICIOUS_MESSAGE_PATTERNS', self.default_message_patterns)
+            patterns['email_domain'] += getattr(settings, 'SUSPICIOUS_EMAIL_DOMAINS', self.default_email_domains)
+        
+        for kind, pattern in self._load_stored_patterns(pattern_ids):
+            if kind == 'message':
+                try:
+                    # Checked as it will be embedded in the alternation
+                    re.compile(f'(?:{pattern})')
+                except re.error as e:
+                    logger.error(f"Skipping invalid screening pattern {pattern!r}: {e}")
+                    continue
+            patterns[kind].append(pattern)
+        
+        return {
+            'message': PatternSet(patterns['message']),
+            'email_domain': PatternSet(patterns['email_domain'], literal=True),
+        }
+    
+    def invalidate(self):
+        """Make every process recompile its patterns on its next check"""
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            cache.set(self.VERSION_KEY, 1, None)
+        
+        # This process reloads right away
+        self.reset()
+    
+    def reset(self):
+        """Recompile this process's patterns on the next screening"""
+        with self._lock:
+            self._pattern_sets = None
+    
+    def rescreen_donations(self, queryset, pattern_ids=None, batch_size=2000):
+        """Yield (donation, matched patterns) for historical donation messages
+        
+        Only messages are fetched, in primary-key order; pattern_ids limits
+        the scan to newly added ScreeningPattern rows.
+        """
+        pattern_set = self.compile(pattern_ids=pattern_ids)['message']
+        if not pattern_set:
+            return
+        
+        donations = (
+            queryset.exclude(message='')
+            .only('id', 'message', 'admin_notes')
+            .order_by('pk')
+        )
+        for donation in donations.iterator(chunk_size=batch_size):
+            matched = pattern_set.findall(donation.message)
+            if matched:
+                yield donation, matched
+    
+    @staticmethod
+    def _load_stored_patterns(pattern_ids=None):
+        stored = ScreeningPattern.objects.filter(active=True)
+        if pattern_ids is not None:
+            stored = stored.filter(id__in=pattern_ids)
+        
+        try:
+            return list(stored.values_list('kind', 'pattern'))
+        except DatabaseError as e:
+            # Not migrated yet; the settings lists still apply
+            logger.warning(f"Could not load screening patterns: {e}")
+            return []
@@ -0,0 +1,337 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models.expressions import RawSQL
+from contextlib import contextmanager
+from .models import Campaign
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Words of a search query; anything else (quotes, operators) is dropped
+SEARCH_TERM = re.compile(r'\w+', re.UNICODE)
+MAX_SEARCH_TERMS = 8
+# Shorter terms are matched whole; prefix-matching one or two letters touches most of the index
+MIN_PREFIX_LENGTH = 3
+
+def search_terms(query):
+    """The words of a search query, lowercased, at most MAX_SEARCH_TERMS"""
+    return [term.lower() for term in SEARCH_TERM.findall(query or '')][:MAX_SEARCH_TERMS]
+
+def campaign_document(campaign):
+    """The indexed text of a campaign, by field; campaign.student should be loaded"""
+    student = campaign.student
+    return {
+        'title': campaign.title,
+        'description': campaign.description,
+        'category': campaign.get_category_display(),
+        'student_name': student.full_name or student.get_full_name() or student.username,
+    }
+
+class SearchResults:
+    """One page of ranked campaign search results
+    
+    timed_out is True when the query ran over CAMPAIGN_SEARCH_TIMEOUT and
+    was cancelled; campaigns is then empty.
+    """
+    
+    def __init__(self, campaigns=(), page=1, has_next=False, timed_out=False):
+        self.campaigns = list(campaigns)
+        self.page = page
+        self.has_next = has_next
+        self.timed_out = timed_out
+    
+    def __iter__(self):
+        return iter(self.campaigns)
+    
+    def __len__(self):
+        return len(self.campaigns)
+    
+    def __repr__(self):
+        return f"SearchResults(page={self.page}, count={len(self.campaigns)}, timed_out={self.timed_out})"
+
+class CampaignSearchIndex:
+    """Full-text index of campaigns over title, description, category and student name
+    
+    The index lives in a side table next to fundraising_campaign, keyed by
+    campaign id, and is kept up to date by the Campaign and User signal
+    receivers. Subclasses implement it for one database backend.
+    """
+    
+    table = 'fundraising_campaign_search'
+    
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+    
+    @property
+    def connection(self):
+        return connections[self.using]
+    
+    def exists(self):
+        return self.table in self.connection.introspection.table_names()
+    
+    def install(self):
+        """Create the index table if it is missing; True if it was created"""
+        if self.exists():
+            return False
+        with self.connection.cursor() as cursor:
+            for statement in self.schema():
+                cursor.execute(statement)
+        return True
+    
+    def schema(self):
+        raise NotImplementedError
+    
+    def update(self, campaigns):
+        """(Re)index campaigns"""
+        raise NotImplementedError
+    
+    def remove(self, campaign_ids):
+        """Drop campaigns from the index"""
+        raise NotImplementedError
+    
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+    
+    def rebuild(self, batch_size=1000):
+        """Reindex every campaign; returns how many were indexed"""
+        self.install()
+        
+        indexed = 0
+        with transaction.atomic(using=self.using):
+            self.clear()
+            campaigns = Campaign.objects.using(self.using).select_related('student').order_by('pk')
+            batch = []
+            for campaign in campaigns.iterator(chunk_size=batch_size):
+                batch.append(campaign)
+                if len(batch) >= batch_size:
+                    self.update(batch)
+                    indexed += len(batch)
+                    batch = []
+            self.update(batch)
+            indexed += len(batch)
+        return indexed
+    
+    def search(self, query, category='', active=None, featured=False, page=1, page_size=None, queryset=None):
+        """Approved campaigns matching every word of query, best match first
+        
+        Words are prefix-matched, so results update as the query is typed.
+        The query is cancelled once it runs over CAMPAIGN_SEARCH_TIMEOUT
+        seconds. The page's campaigns are loaded from queryset.
+        """
+        page_size = page_size or getattr(settings, 'CAMPAIGN_BROWSE_PAGE_SIZE', 12)
+        page = max(1, page)
+        terms = search_terms(query)
+        if not terms:
+            return SearchResults(page=page)
+        
+        # Only the filters that cut down the matches are applied in the database
+        conditions = ['c.approved']
+        params = []
+        if category:
+            conditions.append('c.category = %s')
+            params.append(category)
+        if active is not None:
+            conditions.append('c.is_active = %s')
+            params.append(active)
+        if featured:
+            conditions.append('c.is_featured')
+        
+        ids = self.ranked_ids(query, terms, ' AND '.join(conditions), params, page_size + 1, (page - 1) * page_size)
+        if ids is None:
+            return SearchResults(page=page, timed_out=True)
+        
+        has_next = len(ids) > page_size
+        ids = ids[:page_size]
+        if queryset is None:
+            queryset = Campaign.objects.all()
+        campaigns = queryset.using(self.using).in_bulk(ids)
+        return SearchResults([campaigns[pk] for pk in ids if pk in campaigns], page, has_next)
+    
+    def matching_ids(self, query, limit=1000):
+        """Ids of campaigns, approved or not, matching every word of query, best first
+        
+        None if the query was cancelled for running over its time budget.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        return self.ranked_ids(query, terms, '1 = 1', [], limit, 0)
+    
+    def matching_subquery(self, query):
+        """RawSQL selecting the ids of every campaign matching query, for campaign_id__in filters
+        
+        Unranked and unlimited, and not held to the search time budget.
+        """
+        sql, params = self.filter_sql(self.match_expression(search_terms(query)))
+        return RawSQL(sql, params)
+    
+    def ranked_ids(self, query, terms, conditions, params, limit, offset):
+        """Run the ranked search within CAMPAIGN_SEARCH_TIMEOUT; None if it was cancelled"""
+        sql, sql_params = self.search_sql(self.match_expression(terms), conditions, params)
+        timeout = getattr(settings, 'CAMPAIGN_SEARCH_TIMEOUT', 0.2)
+        
+        try:
+            with transaction.atomic(using=self.using):
+                with self.connection.cursor() as cursor:
+                    with self.time_budget(cursor, timeout):
+                        cursor.execute(sql, sql_params + [limit, offset])
+                        return [row[0] for row in cursor.fetchall()]
+        except OperationalError as e:
+            logger.warning(f"Campaign search for {query[:100]!r} cancelled after {timeout}s: {e}")
+            return None
+    
+    def match_expression(self, terms):
+        raise NotImplementedError
+    
+    def search_sql(self, match, conditions, params):
+        """SQL selecting matching campaign ids, best first, with LIMIT and OFFSET placeholders last"""
+        raise NotImplementedError
+    
+    def filter_sql(self, match):
+        """SQL selecting the ids of all matching campaigns, in no particular order"""
+        raise NotImplementedError
+    
+    @contextmanager
+    def time_budget(self, cursor, seconds):
+        yield
+
+class SQLiteCampaignSearchIndex(CampaignSearchIndex):
+    """FTS5 virtual table whose rowid is the campaign id, ranked with BM25"""
+    
+    # BM25 weight of each column: title, description, category, student name
+    COLUMN_WEIGHTS = (10.0, 1.0, 2.0, 5.0)
+    # Virtual machine instructions between checks of the time budget
+    PROGRESS_INTERVAL = 1000
+    
+    def schema(self):
+        return [
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            "title, description, category, student_name, tokenize = 'unicode61 remove_diacritics 2')"
+        ]
+    
+    def update(self, campaigns):
+        rows = [
+            (campaign.pk, *campaign_document(campaign).values())
+            for campaign in campaigns
+        ]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, description, category, student_name) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+    
+    def remove(self, campaign_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in campaign_ids])
+    
+    def match_expression(self, terms):
+        # Every term quoted, so FTS5 syntax in the query is taken literally
+        return ' '.join(
+            f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"'
+            for term in terms
+        )
+    
+    def search_sql(self, match, conditions, params):
+        weights = ', '.join(str(weight) for weight in self.COLUMN_WEIGHTS)
+        sql = (
+            f'SELECT c.id FROM {self.table} '
+            f'JOIN {Campaign._meta.db_table} c ON c.id = {self.table}.rowid '
+            f'WHERE {self.table} MATCH %s AND {conditions} '
+            f'ORDER BY bm25({self.table}, {weights}), c.id DESC LIMIT %s OFFSET %s'
+        )
+        return sql, [match] + params
+    
+    def filter_sql(self, match):
+        return f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match]
+    
+    @contextmanager
+    def time_budget(self, cursor, seconds):
+        # SQLite has no statement timeout; the progress handler aborts the query instead
+        deadline = time.monotonic() + seconds
+        raw = self.connection.connection
+        raw.set_progress_handler(lambda: time.monotonic() > deadline, self.PROGRESS_INTERVAL)
+        try:
+            yield
+        finally:
+            raw.set_progress_handler(None, 0)
+
+class PostgresCampaignSearchIndex(CampaignSearchIndex):
+    """Weighted tsvector per campaign under a GIN index, ranked with ts_rank_cd"""
+    
+    # Words are indexed as written, so names and categories are not stemmed
+    CONFIG = 'simple'
+    DOCUMENT = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'C') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'B')"
+    )
+    
+    def schema(self):
+        return [
+            # No foreign key, so flushing the campaign table is not blocked; rows go with post_delete
+            f"CREATE TABLE {self.table} (campaign_id bigint PRIMARY KEY, document tsvector NOT NULL)",
+            f"CREATE INDEX {self.table}_document ON {self.table} USING GIN (document)",
+        ]
+    
+    def update(self, campaigns):
+        rows = [
+            (campaign.pk, *campaign_document(campaign).values())
+            for campaign in campaigns
+        ]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (campaign_id, document) VALUES (%s, {self.DOCUMENT}) '
+                'ON CONFLICT (campaign_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+    
+    def remove(self, campaign_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE campaign_id = ANY(%s)', [list(campaign_ids)])
+    
+    def match_expression(self, terms):
+        # \w+ terms need no escaping in to_tsquery
+        return ' & '.join(
+            f'{term}:*' if len(term) >= MIN_PREFIX_LENGTH else term
+            for term in terms
+        )
+    
+    def search_sql(self, match, conditions, params):
+        sql = (
+            f'SELECT c.id FROM {self.table} s '
+            f'JOIN {Campaign._meta.db_table} c ON c.id = s.campaign_id, '
+            f"to_tsquery('{self.CONFIG}', %s) q "
+            f'WHERE s.document @@ q AND {conditions} '
+            'ORDER BY ts_rank_cd(s.document, q) DESC, c.id DESC LIMIT %s OFFSET %s'
+        )
+        return sql, [match] + params
+    
+    def filter_sql(self, match):
+        return f"SELECT campaign_id FROM {self.table} WHERE document @@ to_tsquery('{self.CONFIG}', %s)", [match]
+    
+    @contextmanager
+    def time_budget(self, cursor, seconds):
+        # Scoped to the surrounding transaction; a cancelled query rolls it back
+        cursor.execute('SET LOCAL statement_timeout = %s', [max(1, int(seconds * 1000))])
+        yield
+        cursor.execute('SET LOCAL statement_timeout TO DEFAULT')
+
+SEARCH_INDEXES = {
+    'sqlite': SQLiteCampaignSearchIndex,
+    'postgresql': PostgresCampaignSearchIndex,
+}
+
+def get_campaign_search_index(using=DEFAULT_DB_ALIAS):
+    """The campaign search index for a database, or None if its backend has no full-text support"""
+    index_class = SEARCH_INDEXES.get(connections[using].vendor)
+    return index_class(using) if index_class else None
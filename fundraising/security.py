@@ -5,12 +5,20 @@ from django.conf import settings
 from decimal import Decimal, InvalidOperation
 import hashlib
 import hmac
-import re
 import logging
 from datetime import timedelta
+from .fraud import VelocityFeatureStore, in_flagged_network, velocity_entities
+from .ratelimit import SlidingWindowRateLimiter
+from .screening import ContentScreener
 
 logger = logging.getLogger(__name__)
 
+donation_rate_limiter = SlidingWindowRateLimiter(
+    'donation_attempts', window=getattr(settings, 'DONATION_RATE_LIMIT_WINDOW', 3600)
+)
+
+donation_velocity = VelocityFeatureStore('donations')
+
 class PaymentSecurityValidator:
     """Security validation for payment processing"""
     
@@ -24,6 +32,13 @@ class PaymentSecurityValidator:
         r'illegal',
     ]
     
+    # Disposable email providers
+    SUSPICIOUS_EMAIL_DOMAINS = [
+        'tempmail.com',
+        '10minutemail.com',
+        'guerrillamail.com',
+    ]
+    
     # Countries with higher fraud risk (ISO country codes)
     HIGH_RISK_COUNTRIES = [
         'NG',  # Nigeria
@@ -32,6 +47,17 @@ class PaymentSecurityValidator:
         'BD',  # Bangladesh
     ]
     
+    # Velocity rules: (entity, window, feature, threshold, risk points, flag).
+    # Features cover earlier donations; amounts include the one being scored.
+    VELOCITY_RULES = [
+        ('user', '1m', 'count', 2, 30, "Multiple rapid donations"),
+        ('user', '1h', 'count', 5, 20, "High donation frequency"),
+        ('user', '1d', 'amount', 5000, 20, "High daily donation volume"),
+        ('ip', '1h', 'count', 10, 30, "Many donations from one IP address"),
+        ('ip', '1d', 'amount', 20000, 20, "High daily donation volume from one IP address"),
+        ('email_domain', '1m', 'count', 20, 20, "Donation burst from one email domain"),
+    ]
+    
     @classmethod
     def validate_donation_amount(cls, amount, user=None):
         """Validate donation amount for suspicious patterns"""
@@ -73,14 +99,12 @@ class PaymentSecurityValidator:
             return []
         
         errors = []
-        message_lower = message.lower()
         
-        # Check for suspicious patterns
-        for pattern in cls.SUSPICIOUS_PATTERNS:
-            if re.search(pattern, message_lower):
-                errors.append("Message contains suspicious content")
-                logger.warning(f"Suspicious donation message detected: {message[:100]}")
-                break
+        # Check for suspicious patterns, all of them in one pass
+        matched = content_screener.screen_message(message)
+        if matched:
+            errors.append("Message contains suspicious content")
+            logger.warning(f"Suspicious donation message detected ({matched}): {message[:100]}")
         
         # Check message length
         if len(message) > 500:
@@ -88,41 +112,48 @@ class PaymentSecurityValidator:
         
         return errors
     
-    @classmethod
-    def check_rate_limiting(cls, user, ip_address):
-        """Check if user/IP is making too many donation attempts"""
-        errors = []
-        
-        # Check user rate limiting
+    @staticmethod
+    def _rate_limits(user, ip_address):
+        """Donation attempt limits per user and per IP, in attempts per window"""
+        limits = {}
         if user:
-            user_key = f"donation_attempts_user_{user.id}"
-            user_attempts = cache.get(user_key, 0)
-            
-            if user_attempts >= 5:  # Max 5 attempts per hour
-                errors.append("Too many donation attempts. Please try again later.")
-                logger.warning(f"Rate limit exceeded for user {user.id}")
-        
-        # Check IP rate limiting
+            limits[f'user:{user.id}'] = getattr(settings, 'DONATION_RATE_LIMIT_PER_USER', 5)
         if ip_address:
-            ip_key = f"donation_attempts_ip_{ip_address}"
-            ip_attempts = cache.get(ip_key, 0)
-            
-            if ip_attempts >= 10:  # Max 10 attempts per hour per IP
-                errors.append("Too many donation attempts from this IP. Please try again later.")
-                logger.warning(f"Rate limit exceeded for IP {ip_address}")
+            limits[f'ip:{ip_address}'] = getattr(settings, 'DONATION_RATE_LIMIT_PER_IP', 10)
+        return limits
+    
+    @staticmethod
+    def _rate_limit_errors(exceeded, user, ip_address):
+        errors = []
+        if user and f'user:{user.id}' in exceeded:
+            errors.append("Too many donation attempts. Please try again later.")
+            logger.warning(f"Rate limit exceeded for user {user.id}")
         
+        if ip_address and f'ip:{ip_address}' in exceeded:
+            errors.append("Too many donation attempts from this IP. Please try again later.")
+            logger.warning(f"Rate limit exceeded for IP {ip_address}")
         return errors
     
+    @classmethod
+    def check_rate_limiting(cls, user, ip_address):
+        """Check if user/IP is making too many donation attempts"""
+        exceeded = donation_rate_limiter.check(cls._rate_limits(user, ip_address))
+        return cls._rate_limit_errors(exceeded, user, ip_address)
+    
+    @classmethod
+    def reserve_rate_limit(cls, user, ip_address):
+        """Count a donation attempt unless the user or IP is over its limit
+        
+        Returns (errors, reservation); release the reservation with
+        donation_rate_limiter.release() if the attempt is rejected later on.
+        """
+        reservation = donation_rate_limiter.acquire(cls._rate_limits(user, ip_address))
+        return cls._rate_limit_errors(reservation.exceeded, user, ip_address), reservation
+    
     @classmethod
     def increment_rate_limit_counters(cls, user, ip_address):
         """Increment rate limiting counters"""
-        if user:
-            user_key = f"donation_attempts_user_{user.id}"
-            cache.set(user_key, cache.get(user_key, 0) + 1, 3600)  # 1 hour
-        
-        if ip_address:
-            ip_key = f"donation_attempts_ip_{ip_address}"
-            cache.set(ip_key, cache.get(ip_key, 0) + 1, 3600)  # 1 hour
+        donation_rate_limiter.hit(list(cls._rate_limits(user, ip_address)))
     
     @classmethod
     def validate_payment_method(cls, payment_method, amount):
@@ -155,32 +186,44 @@ class PaymentSecurityValidator:
     @classmethod
     def detect_fraud_patterns(cls, donation_data):
         """Detect potential fraud patterns"""
+        user = donation_data.get('user')
+        email = donation_data.get('donor_email') or (user.email if user else '')
+        ip_address = donation_data.get('ip_address')
+        
+        # Every velocity feature in one cache round-trip
+        features = donation_velocity.features(
+            velocity_entities(user.id if user else None, ip_address, email)
+        )
+        return cls.score_donation(features, donation_data.get('amount'), email, ip_address)
+    
+    @classmethod
+    def score_donation(cls, features, amount, email='', ip_address=None):
+        """Risk score of a donation from its velocity features and details"""
         risk_score = 0
         flags = []
         
-        # Check for rapid successive donations
-        if donation_data.get('user'):
-            recent_donations = cache.get(f"recent_donations_{donation_data['user'].id}", [])
-            if len(recent_donations) >= 3:  # 3 donations in short time
-                risk_score += 30
-                flags.append("Multiple rapid donations")
+        # Check for rapid successive donations and volume per donor, IP and email domain
+        for entity, window, feature, threshold, points, flag in cls.VELOCITY_RULES:
+            if entity not in features:
+                continue
+            value = features[entity][window][feature]
+            if feature == 'amount' and amount:
+                value += float(amount)
+            if value >= threshold:
+                risk_score += points
+                flags.append(flag)
         
         # Check for suspicious email patterns
-        if donation_data.get('donor_email'):
-            email = donation_data['donor_email'].lower()
-            suspicious_domains = ['tempmail.com', '10minutemail.com', 'guerrillamail.com']
-            if any(domain in email for domain in suspicious_domains):
-                risk_score += 20
-                flags.append("Temporary email address")
-        
-        # Check for VPN/Proxy usage (simplified check)
-        if donation_data.get('ip_address'):
-            # This would typically integrate with a service like MaxMind
-            # For now, just a placeholder
-            pass
+        if email and content_screener.screen_email(email):
+            risk_score += 20
+            flags.append("Temporary email address")
+        
+        # Check for known VPN/proxy/hosting ranges
+        if in_flagged_network(ip_address):
+            risk_score += 25
+            flags.append("IP address in a flagged network")
         
         # Check donation amount patterns
-        amount = donation_data.get('amount', 0)
         if amount in [Decimal('1.00'), Decimal('0.01')]:
             risk_score += 10
             flags.append("Test amount detected")
@@ -188,9 +231,14 @@ class PaymentSecurityValidator:
         return {
             'risk_score': risk_score,
             'flags': flags,
-            'requires_review': risk_score >= 50
+            'requires_review': risk_score >= getattr(settings, 'FRAUD_REVIEW_THRESHOLD', 50)
         }
 
+content_screener = ContentScreener(
+    message_patterns=PaymentSecurityValidator.SUSPICIOUS_PATTERNS,
+    email_domains=PaymentSecurityValidator.SUSPICIOUS_EMAIL_DOMAINS,
+)
+
 class PaymentSecurityMiddleware:
     """Middleware for payment security"""
     
@@ -252,26 +300,66 @@ class PaymentSecurityMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
+class WebhookValidationResult:
+    """Outcome of a webhook validation, carrying the parsed event when valid
+    
+    Truthy when the webhook is valid, so it can be tested like a boolean.
+    """
+    
+    def __init__(self, valid, event=None, error=''):
+        self.valid = valid
+        self.event = event
+        self.error = error
+    
+    def __bool__(self):
+        return self.valid
+    
+    def __repr__(self):
+        return f"WebhookValidationResult(valid={self.valid}, error={self.error!r})"
+
 class WebhookSecurityValidator:
     """Security validation for webhook endpoints"""
     
     @staticmethod
     def validate_stripe_webhook(payload, signature, secret):
-        """Validate Stripe webhook signature"""
+        """Validate Stripe webhook signature and parse the event
+        
+        The signature is checked once and the JSON parsed once; handlers use
+        the plain dict on the result instead of constructing the event again.
+        """
+        import json
+        import stripe
+        
         try:
-            import stripe
-            stripe.Webhook.construct_event(payload, signature, secret)
-            return True
-        except (ValueError, stripe.error.SignatureVerificationError):
-            return False
+            if hasattr(payload, 'decode'):
+                payload = payload.decode('utf-8')
+            
+            stripe.WebhookSignature.verify_header(
+                payload, signature, secret, stripe.Webhook.DEFAULT_TOLERANCE
+            )
+            event = json.loads(payload)
+        except stripe.error.SignatureVerificationError:
+            return WebhookValidationResult(False, error='Invalid signature')
+        except ValueError:
+            return WebhookValidationResult(False, error='Invalid payload')
+        
+        if not isinstance(event, dict) or 'id' not in event or 'type' not in event:
+            return WebhookValidationResult(False, error='Invalid payload')
+        
+        return WebhookValidationResult(True, event=event)
     
     @staticmethod
     def validate_paypal_webhook(payload, headers):
-        """Validate PayPal webhook (simplified)"""
+        """Validate PayPal webhook (simplified) and parse the IPN fields"""
+        from urllib.parse import parse_qsl
+        
         # In a real implementation, you would verify PayPal's signature
         # This is a simplified version
         required_headers = ['HTTP_PAYPAL_TRANSMISSION_ID', 'HTTP_PAYPAL_CERT_ID']
-        return all(header in headers for header in required_headers)
+        if not all(header in headers for header in required_headers):
+            return WebhookValidationResult(False, error='Missing PayPal transmission headers')
+        
+        return WebhookValidationResult(True, event=dict(parse_qsl(payload, keep_blank_values=True)))
     
     @staticmethod
     def log_webhook_attempt(source, ip_address, success=True):
@@ -328,9 +416,10 @@ class DonationValidator:
         message_errors = PaymentSecurityValidator.validate_donation_message(message)
         errors.extend(message_errors)
         
-        # Rate limiting
+        # Rate limiting: take the slot now so concurrent requests cannot all pass the check
+        reservation = None
         if request.user.is_authenticated:
-            rate_errors = PaymentSecurityValidator.check_rate_limiting(
+            rate_errors, reservation = PaymentSecurityValidator.reserve_rate_limit(
                 request.user, ip_address
             )
             errors.extend(rate_errors)
@@ -355,12 +444,12 @@ class DonationValidator:
         if fraud_analysis['requires_review']:
             warnings.append("Donation flagged for manual review")
         
-        # Increment rate limiting counters if validation passes
-        if not errors:
-            PaymentSecurityValidator.increment_rate_limit_counters(
-                request.user if request.user.is_authenticated else None,
-                ip_address
-            )
+        # Only attempts that pass validation count towards the rate limits
+        if reservation is not None:
+            if errors:
+                donation_rate_limiter.release(reservation)
+        elif not errors:
+            PaymentSecurityValidator.increment_rate_limit_counters(None, ip_address)
         
         return {
             'valid': len(errors) == 0,
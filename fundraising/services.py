@@ -1,28 +1,41 @@
 from django.core.mail import send_mail
+from django.core.cache import cache
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Left
 from django.template.loader import render_to_string
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 import uuid
 import logging
-from .models import Donation, DonationReceipt, Campaign
+from .models import (
+    Donation, DonationReceipt, Campaign, DonationDailyRollup, RollupWatermark, RecurringSchedule,
+    WebhookEvent,
+)
+from .email_service import EmailOutboxService
+from .pagination import keyset_page
+from .search import SearchResults, get_campaign_search_index, search_terms
+from .webhook_handlers import router as webhook_router
 
 logger = logging.getLogger(__name__)
 
 class DonationService:
     """Service class to handle donation business logic"""
     
+    PROCESSING_FEES = {
+        'stripe': {'percentage': 0.029, 'fixed': 0.30},
+        'paypal': {'percentage': 0.034, 'fixed': 0.30},
+        'mobile_money': {'percentage': 0.025, 'fixed': 0.00},
+        'bank_transfer': {'percentage': 0.01, 'fixed': 1.00},
+        'crypto': {'percentage': 0.015, 'fixed': 0.00},
+    }
+    
     @staticmethod
     def calculate_processing_fee(amount, payment_method='stripe'):
         """Calculate processing fee based on payment method"""
-        fees = {
-            'stripe': {'percentage': 0.029, 'fixed': 0.30},
-            'paypal': {'percentage': 0.034, 'fixed': 0.30},
-            'mobile_money': {'percentage': 0.025, 'fixed': 0.00},
-            'bank_transfer': {'percentage': 0.01, 'fixed': 1.00},
-            'crypto': {'percentage': 0.015, 'fixed': 0.00},
-        }
-        
+        fees = DonationService.PROCESSING_FEES
         fee_structure = fees.get(payment_method, fees['stripe'])
         percentage_fee = amount * Decimal(str(fee_structure['percentage']))
         fixed_fee = Decimal(str(fee_structure['fixed']))
@@ -31,7 +44,12 @@ class DonationService:
     
     @staticmethod
     def process_payment(donation, payment_data):
-        """Process payment through appropriate gateway"""
+        """Process payment through appropriate gateway
+        
+        payment_data['idempotency_key'], if given, is sent to the provider so
+        that retrying a charge returns the original payment instead of
+        charging again.
+        """
         try:
             # This is a simulation - replace with actual payment gateway integration
             payment_method = donation.payment_method
@@ -45,7 +63,7 @@ class DonationService:
             else:
                 # Default processing
                 donation.status = 'completed'
-                donation.payment_id = f"sim_{uuid.uuid4().hex[:12]}"
+                donation.payment_id = DonationService._simulated_payment_id('sim', payment_data)
                 donation.completed_at = timezone.now()
                 donation.save()
                 return {'success': True, 'payment_id': donation.payment_id}
@@ -57,6 +75,13 @@ class DonationService:
             donation.save()
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def _simulated_payment_id(prefix, payment_data):
+        """Payment id of a simulated charge; the same idempotency key gets the same charge"""
+        key = payment_data.get('idempotency_key')
+        charge = uuid.uuid5(uuid.NAMESPACE_OID, f'{prefix}:{key}') if key else uuid.uuid4()
+        return f"{prefix}_{charge.hex[:12]}"
+    
     @staticmethod
     def _process_stripe_payment(donation, payment_data):
         """Process Stripe payment (simulation)"""
@@ -65,7 +90,7 @@ class DonationService:
         time.sleep(1)  # Simulate processing time
         
         donation.status = 'completed'
-        donation.payment_id = f"stripe_{uuid.uuid4().hex[:12]}"
+        donation.payment_id = DonationService._simulated_payment_id('stripe', payment_data)
         donation.completed_at = timezone.now()
         donation.save()
         
@@ -76,7 +101,7 @@ class DonationService:
         """Process PayPal payment (simulation)"""
         # In real implementation, use PayPal API
         donation.status = 'completed'
-        donation.payment_id = f"paypal_{uuid.uuid4().hex[:12]}"
+        donation.payment_id = DonationService._simulated_payment_id('paypal', payment_data)
         donation.completed_at = timezone.now()
         donation.save()
         
@@ -87,7 +112,7 @@ class DonationService:
         """Process Mobile Money payment (simulation)"""
         # In real implementation, integrate with M-Pesa, Airtel Money, etc.
         donation.status = 'processing'  # Mobile money usually takes time
-        donation.payment_id = f"mm_{uuid.uuid4().hex[:12]}"
+        donation.payment_id = DonationService._simulated_payment_id('mm', payment_data)
         donation.save()
         
         return {'success': True, 'payment_id': donation.payment_id, 'status': 'processing'}
@@ -189,9 +214,6 @@ class DonationService:
             donation.admin_notes = f"Refunded: {reason}" if reason else "Refunded"
             donation.save()
             
-            # Update campaign amount
-            donation.update_campaign_amount()
-            
             return {'success': True, 'refund_id': f"refund_{uuid.uuid4().hex[:12]}"}
             
         except Exception as e:
@@ -200,11 +222,17 @@ class DonationService:
     
     @staticmethod
     def get_donation_analytics(campaign=None, date_from=None, date_to=None):
-        """Get donation analytics"""
+        """Get donation analytics, reading full past days from the daily rollups"""
+        from django.db.models import Sum, Count, Q
+        
+        rollup_start, rollup_end = DonationRollupService.get_rollup_window(date_from, date_to)
+        
         queryset = Donation.objects.filter(status='completed')
+        rollups = DonationDailyRollup.objects.filter(status='completed')
         
         if campaign:
             queryset = queryset.filter(campaign=campaign)
+            rollups = rollups.filter(campaign=campaign)
         
         if date_from:
             queryset = queryset.filter(created_at__gte=date_from)
@@ -212,55 +240,229 @@ class DonationService:
         if date_to:
             queryset = queryset.filter(created_at__lte=date_to)
         
-        from django.db.models import Sum, Avg, Count
+        breakdowns = []
+        if rollup_start is not None:
+            # Whole days covered by the rollups are read from there, the rest raw
+            queryset = queryset.exclude(created_at__gte=rollup_start, created_at__lt=rollup_end)
+            rollups = rollups.filter(date__gte=rollup_start.date(), date__lt=rollup_end.date())
+            breakdowns.append(rollups.order_by().values('payment_method').annotate(
+                count=Sum('donation_count'),
+                total=Sum('net_amount'),
+                fees=Sum('fee_amount'),
+            ))
         
-        analytics = queryset.aggregate(
-            total_amount=Sum('net_amount'),
-            total_donations=Count('id'),
-            average_donation=Avg('net_amount'),
-            total_processing_fees=Sum('processing_fee')
-        )
+        breakdowns.append(queryset.order_by().values('payment_method').annotate(
+            count=Count('id'),
+            total=Sum('net_amount'),
+            fees=Sum('processing_fee'),
+        ))
+        
+        # Merge the rollup and raw payment method breakdowns
+        payment_methods = {}
+        for breakdown in breakdowns:
+            for row in breakdown:
+                entry = payment_methods.setdefault(row['payment_method'], {
+                    'payment_method': row['payment_method'],
+                    'count': 0,
+                    'total': Decimal('0.00'),
+                    'fees': Decimal('0.00'),
+                })
+                entry['count'] += row['count'] or 0
+                entry['total'] += row['total'] or 0
+                entry['fees'] += row['fees'] or 0
+        
+        total_donations = sum(entry['count'] for entry in payment_methods.values())
+        total_amount = sum(entry['total'] for entry in payment_methods.values())
+        total_fees = sum(entry['fees'] for entry in payment_methods.values())
+        
+        analytics = {
+            'total_amount': total_amount if total_donations else None,
+            'total_donations': total_donations,
+            'average_donation': total_amount / total_donations if total_donations else None,
+            'total_processing_fees': total_fees if total_donations else None,
+        }
         
         # Payment method breakdown
-        payment_methods = queryset.values('payment_method').annotate(
+        analytics['payment_methods'] = sorted(
+            (
+                {'payment_method': entry['payment_method'], 'count': entry['count'], 'total': entry['total']}
+                for entry in payment_methods.values() if entry['count']
+            ),
+            key=lambda entry: entry['total'],
+            reverse=True,
+        )
+        
+        return analytics
+
+class CampaignLedgerService:
+    """Service for reconciling incrementally maintained campaign statistics"""
+    
+    LEDGER_FIELDS = ('current_amount', 'donation_count', 'unique_donor_count', 'donations_total')
+    
+    @staticmethod
+    def calculate_ledger(donations):
+        """Aggregate completed donations into per-campaign ledger values"""
+        rows = donations.filter(status='completed').order_by().values('campaign').annotate(
+            net=Sum('net_amount'),
+            gross=Sum('amount'),
             count=Count('id'),
-            total=Sum('net_amount')
-        ).order_by('-total')
+            donors=Count('donor', distinct=True),
+            guests=Count('id', filter=Q(donor__isnull=True)),
+        )
         
-        analytics['payment_methods'] = payment_methods
+        ledgers = {}
+        for row in rows:
+            ledgers[row['campaign']] = {
+                'current_amount': row['net'] or Decimal('0.00'),
+                'donation_count': row['count'],
+                # Guest donations count as one donor, like values('donor').distinct()
+                'unique_donor_count': row['donors'] + (1 if row['guests'] else 0),
+                'donations_total': row['gross'] or Decimal('0.00'),
+            }
+        return ledgers
+    
+    @staticmethod
+    def reconcile(campaign_ids=None, dry_run=False, batch_size=500):
+        """Compare campaign statistics with a full aggregate and repair any drift
         
-        return analytics
+        Campaigns are walked in id order, batch_size at a time, each batch
+        checked against one grouped aggregate of its own donations.
+        """
+        empty = {
+            'current_amount': Decimal('0.00'),
+            'donation_count': 0,
+            'unique_donor_count': 0,
+            'donations_total': Decimal('0.00'),
+        }
+        fields = CampaignLedgerService.LEDGER_FIELDS
+        
+        campaigns = Campaign.objects.only('id', 'title', *fields).order_by('id')
+        if campaign_ids is not None:
+            campaigns = campaigns.filter(id__in=campaign_ids)
+        
+        drifted = []
+        last_id = 0
+        while True:
+            batch = list(campaigns.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            
+            expected_ledgers = CampaignLedgerService.calculate_ledger(
+                Donation.objects.filter(campaign_id__in=[campaign.id for campaign in batch])
+            )
+            
+            for campaign in batch:
+                expected = expected_ledgers.get(campaign.id, empty)
+                recorded = {field: getattr(campaign, field) for field in fields}
+                if recorded == expected:
+                    continue
+                
+                drifted.append({
+                    'campaign_id': campaign.id,
+                    'title': campaign.title,
+                    'recorded': recorded,
+                    'expected': expected,
+                })
+                
+                if dry_run:
+                    continue
+                
+                # Recompute under a row lock so concurrent deltas are not lost
+                with transaction.atomic():
+                    Campaign.objects.select_for_update().filter(pk=campaign.pk).values('pk').first()
+                    ledger = CampaignLedgerService.calculate_ledger(
+                        Donation.objects.filter(campaign_id=campaign.pk)
+                    ).get(campaign.pk, empty)
+                    Campaign.objects.filter(pk=campaign.pk).update(**ledger)
+        
+        return drifted
 
 class RecurringDonationService:
     """Service for handling recurring donations"""
     
     @staticmethod
-    def create_recurring_donation(original_donation):
-        """Create next recurring donation"""
-        if not original_donation.is_recurring:
+    def schedule_recurring_donation(donation):
+        """Create the billing schedule for a completed recurring donation"""
+        if not donation.is_recurring or donation.parent_donation_id:
             return None
         
-        # Calculate next donation date
-        next_date = RecurringDonationService._calculate_next_date(
-            original_donation.created_at,
-            original_donation.recurring_frequency
+        frequency = donation.recurring_frequency or 'monthly'
+        schedule, _ = RecurringSchedule.objects.get_or_create(
+            template=donation,
+            defaults={
+                'frequency': frequency,
+                'next_charge_at': RecurringDonationService._calculate_next_date(
+                    donation.completed_at or donation.created_at, frequency
+                ),
+            }
         )
         
-        # Create new donation
-        new_donation = Donation.objects.create(
-            amount=original_donation.amount,
-            campaign=original_donation.campaign,
-            donor=original_donation.donor,
-            payment_method=original_donation.payment_method,
-            anonymous=original_donation.anonymous,
+        return schedule
+    
+    @staticmethod
+    def create_recurring_donation(schedule, status='pending'):
+        """Create the donation for the schedule's current charge date
+        
+        The schedule is advanced with a compare-and-set on the charge date that
+        was read, so when several runners race only one of them creates the
+        donation; the others get None.
+        """
+        from django.db import transaction
+        
+        charge_at = schedule.next_charge_at
+        next_date = RecurringDonationService._calculate_next_date(charge_at, schedule.frequency)
+        
+        with transaction.atomic():
+            advanced = RecurringSchedule.objects.filter(
+                pk=schedule.pk, next_charge_at=charge_at, active=True
+            ).update(
+                next_charge_at=next_date,
+                last_charged_at=charge_at,
+                # A frequency that does not advance would charge forever
+                active=next_date > charge_at,
+                updated_at=timezone.now(),
+            )
+            if not advanced:
+                return None
+            
+            original_donation = schedule.template
+            new_donation, _ = Donation.objects.get_or_create(
+                parent_donation=original_donation,
+                scheduled_for=charge_at,
+                defaults={
+                    'amount': original_donation.amount,
+                    'campaign_id': original_donation.campaign_id,
+                    'donor_id': original_donation.donor_id,
+                    'payment_method': original_donation.payment_method,
+                    'anonymous': original_donation.anonymous,
+                    'is_recurring': True,
+                    'recurring_frequency': schedule.frequency,
+                    'processing_fee': original_donation.processing_fee,
+                    'status': status,
+                }
+            )
+        
+        schedule.next_charge_at = next_date
+        schedule.last_charged_at = charge_at
+        return new_donation
+    
+    @staticmethod
+    def backfill_schedules():
+        """Create schedules for completed recurring donations that have none"""
+        created = 0
+        templates = Donation.objects.filter(
             is_recurring=True,
-            recurring_frequency=original_donation.recurring_frequency,
-            parent_donation=original_donation,
-            processing_fee=original_donation.processing_fee,
-            created_at=next_date
+            parent_donation__isnull=True,
+            status='completed',
+            recurring_schedule__isnull=True,
         )
         
-        return new_donation
+        for donation in templates.iterator():
+            if RecurringDonationService.schedule_recurring_donation(donation):
+                created += 1
+        
+        return created
     
     @staticmethod
     def _calculate_next_date(current_date, frequency):
@@ -277,128 +479,1263 @@ class RecurringDonationService:
         return current_date
     
     @staticmethod
-    def process_due_recurring_donations():
-        """Process all due recurring donations"""
+    def process_due_recurring_donations(batch_size=None, max_workers=None, on_batch=None):
+        """Process all due recurring donations in concurrent batches
+        
+        Due schedules are claimed in keyset-paginated batches with
+        select_for_update(skip_locked=True), so several runners can work side
+        by side. Gateway calls run on a thread pool capped at max_workers.
+        on_batch, if given, is called with per-batch throughput statistics.
+        Charges left behind by a runner that died are retried first.
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
         from django.utils import timezone
         
-        due_donations = Donation.objects.filter(
-            is_recurring=True,
-            status='pending',
-            created_at__lte=timezone.now()
-        )
+        batch_size = batch_size or getattr(settings, 'RECURRING_BATCH_SIZE', 100)
+        max_workers = RecurringDonationService.get_concurrency(max_workers, warn=True)
+        now = timezone.now()
         
         results = []
-        for donation in due_donations:
-            result = DonationService.process_payment(donation, {})
-            results.append({
-                'donation_id': donation.id,
-                'success': result.get('success', False),
-                'error': result.get('error')
-            })
+        last_key = None
+        batch_number = 0
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def charge(batch):
+                nonlocal batch_number
+                batch_number += 1
+                
+                started = time.monotonic()
+                batch_results = list(executor.map(RecurringDonationService._charge_donation, batch))
+                elapsed = time.monotonic() - started
+                results.extend(batch_results)
+                
+                if on_batch:
+                    succeeded = sum(1 for result in batch_results if result['success'])
+                    on_batch({
+                        'batch': batch_number,
+                        'size': len(batch),
+                        'succeeded': succeeded,
+                        'failed': len(batch) - succeeded,
+                        'elapsed': elapsed,
+                        'throughput': len(batch) / elapsed if elapsed > 0 else len(batch),
+                    })
+            
+            try:
+                while True:
+                    batch = RecurringDonationService._reclaim_stale_charges(now, batch_size)
+                    if not batch:
+                        break
+                    charge(batch)
+                
+                while True:
+                    last_key, batch = RecurringDonationService._claim_due_batch(now, last_key, batch_size)
+                    if last_key is None:
+                        break
+                    if batch:
+                        charge(batch)
+            finally:
+                RecurringDonationService._close_worker_connections(executor, max_workers)
         
         return results
+    
+    @staticmethod
+    def _close_worker_connections(executor, max_workers):
+        """Close each pool thread's database connection once, before the pool shuts down
+        
+        Worker threads keep their connection from one charge to the next. One
+        close task is queued per thread, and a barrier holds every task until
+        all threads have taken one, so no thread runs two of them.
+        """
+        import threading
+        
+        barrier = threading.Barrier(max_workers)
+        
+        def close(_):
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            connection.close()
+        
+        list(executor.map(close, range(max_workers)))
+    
+    @staticmethod
+    def get_concurrency(max_workers=None, warn=False):
+        """Return the number of concurrent charges the database can sustain"""
+        from django.db import connection
+        
+        max_workers = max_workers or getattr(settings, 'RECURRING_MAX_CONCURRENCY', 8)
+        
+        # Without row locks (SQLite) concurrent writers fail with "database is locked"
+        if max_workers > 1 and not connection.features.has_select_for_update_skip_locked:
+            if warn:
+                logger.warning(
+                    f"{connection.vendor} does not support skip_locked row locks; "
+                    "processing recurring donations sequentially"
+                )
+            return 1
+        
+        return max_workers
+    
+    @staticmethod
+    def plan_recurring_run(cycles=3, max_workers=None, charge_latency=1.0):
+        """Forecast charges, gross and fees for the next billing cycles
+        
+        Uses grouped aggregates only: schedules are bucketed by frequency,
+        payment method and next charge day, and each bucket is projected forward
+        with _calculate_next_date. Cycle k covers [now + k months, now + k + 1 months).
+        """
+        from django.db.models import Sum, Count, F
+        from django.db.models.functions import TruncDate
+        from dateutil.relativedelta import relativedelta
+        from datetime import datetime, time
+        
+        now = timezone.now()
+        max_workers = RecurringDonationService.get_concurrency(max_workers)
+        
+        scheduled = RecurringSchedule.objects.filter(active=True)
+        
+        # Charges that the next run would fire, per payment method
+        due_now = [
+            RecurringDonationService._plan_entry(row)
+            for row in scheduled.filter(next_charge_at__lte=now).order_by().values(
+                payment_method=F('template__payment_method')
+            ).annotate(
+                count=Count('id'), gross=Sum('template__amount'), fees=Sum('template__processing_fee'),
+            ).order_by('payment_method')
+        ]
+        
+        windows = [
+            (now + relativedelta(months=cycle), now + relativedelta(months=cycle + 1))
+            for cycle in range(cycles)
+        ]
+        forecast = [
+            {'cycle': cycle + 1, 'start': start, 'end': end, 'count': 0,
+             'gross': Decimal('0.00'), 'fees': Decimal('0.00')}
+            for cycle, (start, end) in enumerate(windows)
+        ]
+        
+        buckets = scheduled.order_by().values(
+            'frequency', payment_method=F('template__payment_method'), day=TruncDate('next_charge_at')
+        ).annotate(count=Count('id'), gross=Sum('template__amount'), fees=Sum('template__processing_fee'))
+        
+        horizon = windows[-1][1] if windows else now
+        for bucket in buckets:
+            entry = RecurringDonationService._plan_entry(bucket)
+            charge_date = timezone.make_aware(datetime.combine(bucket['day'], time.min))
+            
+            while charge_date < horizon:
+                # Overdue charges fire in the first cycle
+                cycle = 0 if charge_date < now else next(
+                    index for index, (start, end) in enumerate(windows) if start <= charge_date < end
+                )
+                forecast[cycle]['count'] += entry['count']
+                forecast[cycle]['gross'] += entry['gross']
+                forecast[cycle]['fees'] += entry['fees']
+                
+                next_date = RecurringDonationService._calculate_next_date(
+                    charge_date, bucket['frequency']
+                )
+                if next_date == charge_date:
+                    break
+                charge_date = next_date
+        
+        for cycle in forecast:
+            cycle['duration'] = cycle['count'] * charge_latency / max_workers
+        
+        due_count = sum(entry['count'] for entry in due_now)
+        return {
+            'due_now': due_now,
+            'due_count': due_count,
+            'due_gross': sum((entry['gross'] for entry in due_now), Decimal('0.00')),
+            'due_fees': sum((entry['fees'] for entry in due_now), Decimal('0.00')),
+            'estimated_duration': due_count * charge_latency / max_workers,
+            'concurrency': max_workers,
+            'forecast': forecast,
+        }
+    
+    @staticmethod
+    def _plan_entry(row):
+        """Build a planning row from an aggregated bucket
+        
+        Charges copy their template's processing_fee, so the fees are the sum of
+        those rather than a recalculation from the current fee table.
+        """
+        return {
+            'payment_method': row['payment_method'],
+            'count': row['count'],
+            'gross': row['gross'] or Decimal('0.00'),
+            'fees': row['fees'] or Decimal('0.00'),
+        }
+    
+    @staticmethod
+    def _claim_due_batch(now, last_key, batch_size):
+        """Lock the next batch of due schedules and create their donations"""
+        from django.db import transaction
+        from django.db.models import Q
+        
+        with transaction.atomic():
+            # Index range scan on (next_charge_at, active); schedules advanced
+            # during this run are skipped so each one is charged once per run
+            due_schedules = RecurringSchedule.objects.select_for_update(skip_locked=True).filter(
+                next_charge_at__lte=now,
+                active=True,
+                updated_at__lt=now,
+            )
+            
+            if last_key:
+                next_charge_at, pk = last_key
+                due_schedules = due_schedules.filter(
+                    Q(next_charge_at__gt=next_charge_at) | Q(next_charge_at=next_charge_at, pk__gt=pk)
+                )
+            
+            schedules = list(
+                due_schedules.select_related('template').order_by('next_charge_at', 'pk')[:batch_size]
+            )
+            if not schedules:
+                return None, []
+            
+            next_key = (schedules[-1].next_charge_at, schedules[-1].pk)
+            
+            # Claimed donations are created as processing so nothing else picks them up
+            batch = []
+            for schedule in schedules:
+                donation = RecurringDonationService.create_recurring_donation(schedule, status='processing')
+                if donation and donation.status == 'processing':
+                    batch.append(donation)
+        
+        return next_key, batch
+    
+    @staticmethod
+    def _reclaim_stale_charges(now, batch_size):
+        """Claim a batch of charges a runner created but never got a gateway result for
+        
+        Charges are created as processing before the gateway call, after their
+        schedule has moved on, so a runner that dies in between would leave
+        them unpaid for good. Once RECURRING_PROCESSING_TIMEOUT seconds have
+        passed without a payment_id they are claimed again by touching
+        updated_at. Processing charges with a payment_id are waiting on the
+        provider and are left to its webhooks. The runner may also have died
+        after the provider charged but before the payment_id was saved;
+        _charge_donation sends the donation id as the idempotency key, so the
+        retry gets that charge back instead of a second one.
+        """
+        stale_before = now - timedelta(seconds=getattr(settings, 'RECURRING_PROCESSING_TIMEOUT', 900))
+        
+        with transaction.atomic():
+            batch = list(
+                Donation.objects.select_for_update(skip_locked=True).filter(
+                    parent_donation__isnull=False,
+                    status='processing',
+                    updated_at__lt=stale_before,
+                ).filter(
+                    Q(payment_id__isnull=True) | Q(payment_id='')
+                ).order_by('updated_at', 'pk')[:batch_size]
+            )
+            Donation.objects.filter(pk__in=[donation.pk for donation in batch]).update(
+                updated_at=timezone.now()
+            )
+        
+        if batch:
+            logger.warning(f"Retrying {len(batch)} recurring charges left processing by an earlier run")
+        return batch
+    
+    @staticmethod
+    def _charge_donation(donation):
+        """Charge a single claimed donation on a worker thread"""
+        try:
+            # Retried charges reuse the key, so the provider never charges a donation twice
+            result = DonationService.process_payment(donation, {'idempotency_key': str(donation.id)})
+        except Exception as e:
+            logger.error(f"Recurring charge failed for donation {donation.id}: {str(e)}")
+            result = {'success': False, 'error': str(e)}
+        
+        return {
+            'donation_id': donation.id,
+            'success': result.get('success', False),
+            'error': result.get('error')
+        }
 
 class DonationAnalyticsService:
     """Advanced analytics service for donations and campaigns"""
     
     @staticmethod
     def get_platform_analytics():
-        """Get platform-wide analytics"""
-        from django.db.models import Sum, Avg, Count, Q
-        
-        # Basic statistics
-        total_raised = Donation.objects.filter(status='completed').aggregate(
-            Sum('net_amount')
-        )['net_amount__sum'] or 0
-        
-        total_donations = Donation.objects.filter(status='completed').count()
-        total_campaigns = Campaign.objects.count()
-        active_campaigns = Campaign.objects.filter(approved=True, is_active=True).count()
-        successful_campaigns = Campaign.objects.filter(
-            current_amount__gte=models.F('goal')
-        ).count()
-        
-        total_donors = Donation.objects.filter(
-            status='completed'
-        ).values('donor').distinct().count()
-        
-        # Averages
-        avg_campaign_goal = Campaign.objects.aggregate(
-            Avg('goal')
-        )['goal__avg'] or 0
-        
-        avg_donation = Donation.objects.filter(status='completed').aggregate(
-            Avg('net_amount')
-        )['net_amount__avg'] or 0
+        """Get platform-wide analytics in one donation query and one campaign query"""
+        from django.db.models import Sum, Avg, Count, Q, F
+        
+        payment_methods = [method for method, _ in Donation.PAYMENT_METHOD_CHOICES]
+        categories = [category for category, _ in Campaign._meta.get_field('category').choices]
+        
+        # Donation-side metrics, with per payment method breakdown as filtered aggregates
+        donation_metrics = {
+            'total_raised': Sum('net_amount'),
+            'total_donations': Count('id'),
+            'average_donation': Avg('net_amount'),
+            'total_donors': Count('donor', distinct=True),
+            'guest_donations': Count('id', filter=Q(donor__isnull=True)),
+        }
+        for method in payment_methods:
+            donation_metrics[f'count_{method}'] = Count('id', filter=Q(payment_method=method))
+            donation_metrics[f'total_{method}'] = Sum('net_amount', filter=Q(payment_method=method))
+        
+        donation_stats = Donation.objects.filter(status='completed').aggregate(**donation_metrics)
+        
+        # Campaign-side metrics, with per category breakdown as filtered aggregates
+        campaign_metrics = {
+            'total_campaigns': Count('id'),
+            'active_campaigns': Count('id', filter=Q(approved=True, is_active=True)),
+            'successful_campaigns': Count('id', filter=Q(current_amount__gte=F('goal'))),
+            'average_campaign_goal': Avg('goal'),
+        }
+        for category in categories:
+            campaign_metrics[f'count_{category}'] = Count('id', filter=Q(category=category))
+            campaign_metrics[f'raised_{category}'] = Sum('current_amount', filter=Q(category=category))
+        
+        campaign_stats = Campaign.objects.aggregate(**campaign_metrics)
         
         # Payment method statistics
-        payment_method_stats = Donation.objects.filter(status='completed').values(
-            'payment_method'
-        ).annotate(
-            count=Count('id'),
-            total=Sum('net_amount')
-        ).order_by('-total')
+        payment_method_stats = sorted(
+            (
+                {
+                    'payment_method': method,
+                    'count': donation_stats[f'count_{method}'],
+                    'total': donation_stats[f'total_{method}'] or 0,
+                }
+                for method in payment_methods
+                if donation_stats[f'count_{method}']
+            ),
+            key=lambda stat: stat['total'],
+            reverse=True,
+        )
         
         # Category statistics
-        category_stats = Campaign.objects.values('category').annotate(
-            count=Count('id'),
-            total_raised=Sum('current_amount')
-        ).order_by('-total_raised')
+        category_stats = sorted(
+            (
+                {
+                    'category': category,
+                    'count': campaign_stats[f'count_{category}'],
+                    'total_raised': campaign_stats[f'raised_{category}'] or 0,
+                }
+                for category in categories
+                if campaign_stats[f'count_{category}']
+            ),
+            key=lambda stat: stat['total_raised'],
+            reverse=True,
+        )
+        
+        # Guest donations count as one donor, like values('donor').distinct()
+        total_donors = donation_stats['total_donors'] + (1 if donation_stats['guest_donations'] else 0)
         
         return {
-            'total_raised': total_raised,
-            'total_donations': total_donations,
-            'total_campaigns': total_campaigns,
-            'active_campaigns': active_campaigns,
-            'successful_campaigns': successful_campaigns,
+            'total_raised': donation_stats['total_raised'] or 0,
+            'total_donations': donation_stats['total_donations'],
+            'total_campaigns': campaign_stats['total_campaigns'],
+            'active_campaigns': campaign_stats['active_campaigns'],
+            'successful_campaigns': campaign_stats['successful_campaigns'],
             'total_donors': total_donors,
-            'average_campaign_goal': avg_campaign_goal,
-            'average_donation': avg_donation,
-            'payment_method_stats': list(payment_method_stats),
-            'category_stats': list(category_stats),
+            'average_campaign_goal': campaign_stats['average_campaign_goal'] or 0,
+            'average_donation': donation_stats['average_donation'] or 0,
+            'payment_method_stats': payment_method_stats,
+            'category_stats': category_stats,
         }
     
     @staticmethod
     def get_campaign_analytics(campaign):
         """Get detailed analytics for a specific campaign"""
-        from django.db.models import Sum, Avg, Count
         from django.utils import timezone
         from datetime import timedelta
         
-        donations = campaign.donations.filter(status='completed')
-        
-        # Basic stats
-        total_raised = donations.aggregate(Sum('net_amount'))['net_amount__sum'] or 0
-        total_donations = donations.count()
-        unique_donors = donations.values('donor').distinct().count()
-        average_donation = donations.aggregate(Avg('net_amount'))['net_amount__avg'] or 0
+        # Totals and breakdown come from the rollups plus today's raw donations
+        analytics = DonationService.get_donation_analytics(campaign=campaign)
         
         # Progress
         progress_percentage = campaign.progress_percentage()
         days_active = (timezone.now() - campaign.created_at).days
         
-        # Payment method breakdown
-        payment_method_breakdown = donations.values('payment_method').annotate(
-            count=Count('id'),
-            total=Sum('net_amount')
-        ).order_by('-total')
-        
         # Recent activity (last 30 days)
         thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_donations = donations.filter(created_at__gte=thirty_days_ago)
-        recent_total = recent_donations.aggregate(Sum('net_amount'))['net_amount__sum'] or 0
-        recent_count = recent_donations.count()
+        recent = DonationService.get_donation_analytics(campaign=campaign, date_from=thirty_days_ago)
         
         return {
-            'total_raised': total_raised,
-            'total_donations': total_donations,
-            'unique_donors': unique_donors,
-            'average_donation': average_donation,
+            'total_raised': analytics['total_amount'] or 0,
+            'total_donations': analytics['total_donations'],
+            'unique_donors': campaign.unique_donor_count,
+            'average_donation': analytics['average_donation'] or 0,
             'progress_percentage': progress_percentage,
             'days_active': days_active,
-            'payment_method_breakdown': list(payment_method_breakdown),
+            'payment_method_breakdown': analytics['payment_methods'],
             'recent_activity': {
-                'total': recent_total,
-                'count': recent_count,
+                'total': recent['total_amount'] or 0,
+                'count': recent['total_donations'],
             }
         }
+
+class PlatformStatsService:
+    """Cached, periodically refreshed snapshot of platform-wide statistics"""
+    
+    # Bump the version when the snapshot layout changes
+    CACHE_KEY = 'platform_stats:v1'
+    GENERATION_KEY = 'platform_stats:generation'
+    LOCK_KEY = 'platform_stats:lock'
+    
+    @classmethod
+    def get_stats(cls):
+        """Return platform statistics, recomputing them at most once per expiry"""
+        max_age = getattr(settings, 'PLATFORM_STATS_MAX_AGE', 300)
+        min_age = getattr(settings, 'PLATFORM_STATS_MIN_AGE', 5)
+        lock_timeout = getattr(settings, 'PLATFORM_STATS_LOCK_TIMEOUT', 30)
+        
+        cached = cache.get_many([cls.CACHE_KEY, cls.GENERATION_KEY])
+        snapshot = cached.get(cls.CACHE_KEY)
+        generation = cached.get(cls.GENERATION_KEY, 0)
+        
+        if snapshot:
+            age = (timezone.now() - snapshot['computed_at']).total_seconds()
+            # Invalidations are coalesced: a very fresh snapshot is always served
+            if age < min_age or (snapshot['generation'] == generation and age < max_age):
+                return snapshot['stats']
+        
+        # Only the worker holding the lock recomputes; the others serve the stale copy
+        if cache.add(cls.LOCK_KEY, True, lock_timeout):
+            try:
+                return cls.refresh(generation)
+            finally:
+                cache.delete(cls.LOCK_KEY)
+        
+        if snapshot:
+            return snapshot['stats']
+        
+        return cls.calculate_stats()
+    
+    @classmethod
+    def refresh(cls, generation=None):
+        """Recompute the snapshot and store it in the cache"""
+        if generation is None:
+            generation = cache.get(cls.GENERATION_KEY, 0)
+        
+        stats = cls.calculate_stats()
+        snapshot = {
+            'generation': generation,
+            'computed_at': timezone.now(),
+            'stats': stats,
+        }
+        
+        # Keep stale snapshots around so they can be served while refreshing
+        retention = getattr(settings, 'PLATFORM_STATS_RETENTION', 24 * 3600)
+        cache.set(cls.CACHE_KEY, snapshot, retention)
+        
+        return stats
+    
+    @classmethod
+    def invalidate(cls):
+        """Mark the current snapshot as outdated"""
+        try:
+            cache.incr(cls.GENERATION_KEY)
+        except ValueError:
+            cache.set(cls.GENERATION_KEY, 1, None)
+    
+    @staticmethod
+    def calculate_stats():
+        """Compute platform statistics from the database"""
+        from django.db.models import Sum, Count, Q, Exists, OuterRef
+        from authentication.models import User
+        
+        # Campaign counters already hold the completed donation totals
+        stats = Campaign.objects.aggregate(
+            total_campaigns=Count('id'),
+            pending_campaigns=Count('id', filter=Q(approved=False)),
+            total_students_helped=Count('id', filter=Q(approved=True, current_amount__gt=0)),
+            total_raised=Sum('donations_total'),
+        )
+        stats['total_raised'] = stats['total_raised'] or 0
+        
+        stats.update(User.objects.annotate(
+            has_donations=Exists(Donation.objects.filter(donor=OuterRef('pk')))
+        ).aggregate(
+            total_users=Count('id'),
+            total_donors=Count('id', filter=Q(role='donor', has_donations=True)),
+        ))
+        
+        return stats
+
+class CampaignBrowseService:
+    """Keyset-paginated browsing of approved campaigns with cached category facets"""
+    
+    # Bump the version when the facet layout changes
+    FACETS_KEY = 'campaign_facets:v1:{active}:{featured}'
+    GENERATION_KEY = 'campaign_facets:generation'
+    
+    # Columns the campaign cards show
+    CARD_FIELDS = (
+        'id', 'title', 'description', 'goal', 'current_amount', 'image',
+        'category', 'is_active', 'is_featured', 'created_at',
+    )
+    
+    @classmethod
+    def browse(cls, category='', active=None, featured=False, cursor=None, page_size=None):
+        """One page of approved campaigns, newest first
+        
+        Pages follow a keyset cursor on (created_at, id). Returns
+        (campaigns, next_cursor); next_cursor is None on the last page.
+        """
+        page_size = page_size or getattr(settings, 'CAMPAIGN_BROWSE_PAGE_SIZE', 12)
+        
+        campaigns = cls._approved(active, featured)
+        if category:
+            campaigns = campaigns.filter(category=category)
+        
+        return keyset_page(campaigns.only(*cls.CARD_FIELDS), '-created_at', cursor, page_size)
+    
+    @classmethod
+    def search(cls, query, category='', active=None, featured=False, page=1, page_size=None):
+        """Ranked full-text search of approved campaigns, a page at a time
+        
+        Databases without a full-text index fall back to substring matching
+        of every word, newest first.
+        """
+        queryset = Campaign.objects.only(*cls.CARD_FIELDS)
+        index = get_campaign_search_index()
+        if index is not None:
+            return index.search(
+                query, category, active, featured, page=page, page_size=page_size, queryset=queryset
+            )
+        
+        page_size = page_size or getattr(settings, 'CAMPAIGN_BROWSE_PAGE_SIZE', 12)
+        page = max(1, page)
+        terms = search_terms(query)
+        if not terms:
+            return SearchResults(page=page)
+        
+        campaigns = cls._approved(active, featured).only(*cls.CARD_FIELDS)
+        if category:
+            campaigns = campaigns.filter(category=category)
+        for term in terms:
+            campaigns = campaigns.filter(
+                Q(title__icontains=term) | Q(description__icontains=term) | Q(student__full_name__icontains=term)
+            )
+        
+        offset = (page - 1) * page_size
+        found = list(campaigns.order_by('-created_at', '-id')[offset:offset + page_size + 1])
+        return SearchResults(found[:page_size], page, len(found) > page_size)
+    
+    @classmethod
+    def get_category_facets(cls, active=None, featured=False):
+        """Approved campaigns per category under the other filters
+        
+        Counted with one grouped query and cached until a campaign changes.
+        """
+        key = cls.FACETS_KEY.format(active=active, featured=featured)
+        cached = cache.get_many([key, cls.GENERATION_KEY])
+        generation = cached.get(cls.GENERATION_KEY, 0)
+        entry = cached.get(key)
+        if entry and entry['generation'] == generation:
+            return entry['facets']
+        
+        counts = dict(
+            cls._approved(active, featured).order_by().values_list('category').annotate(count=Count('id'))
+        )
+        facets = [
+            {'category': category, 'label': label, 'count': counts.get(category, 0)}
+            for category, label in Campaign._meta.get_field('category').choices
+        ]
+        
+        max_age = getattr(settings, 'CAMPAIGN_FACETS_MAX_AGE', 300)
+        cache.set(key, {'generation': generation, 'facets': facets}, max_age)
+        return facets
+    
+    @classmethod
+    def invalidate(cls):
+        """Mark the cached facets as outdated"""
+        try:
+            cache.incr(cls.GENERATION_KEY)
+        except ValueError:
+            cache.set(cls.GENERATION_KEY, 1, None)
+    
+    @staticmethod
+    def _approved(active=None, featured=False):
+        campaigns = Campaign.objects.filter(approved=True)
+        if active is not None:
+            campaigns = campaigns.filter(is_active=active)
+        if featured:
+            campaigns = campaigns.filter(is_featured=True)
+        return campaigns
+
+class DonationSearchService:
+    """Filtered, keyset-paginated donation listing for the admin dashboard"""
+    
+    SORT_FIELDS = ('-created_at', 'created_at', '-amount', 'amount')
+    
+    # Text columns the list only shows an excerpt of, or not at all
+    DEFERRED_FIELDS = (
+        'message', 'user_agent', 'admin_notes', 'fraud_flags', 'campaign__description', 'donor__bio',
+    )
+    # One character more than the list shows, so it can tell an excerpt was cut short
+    EXCERPT_LENGTH = 200
+    # Matching campaign ids inlined into the search; more matches join the index instead
+    CAMPAIGN_MATCH_LIMIT = 1000
+    
+    @classmethod
+    def filter(cls, search='', status='', payment_method='', min_amount=None, max_amount=None):
+        """Donations matching the admin search filters
+        
+        search matches donor names, and campaigns through the campaign
+        search index (substring matching of the title without one, or when
+        the index query runs over its time budget).
+        """
+        donations = Donation.objects.all()
+        if status:
+            donations = donations.filter(status=status)
+        if payment_method:
+            donations = donations.filter(payment_method=payment_method)
+        if min_amount is not None:
+            donations = donations.filter(amount__gte=min_amount)
+        if max_amount is not None:
+            donations = donations.filter(amount__lte=max_amount)
+        
+        if search:
+            matches = (
+                Q(donor__full_name__icontains=search)
+                | Q(donor__username__icontains=search)
+                | Q(donor_name__icontains=search)
+            )
+            index = get_campaign_search_index()
+            campaign_ids = index.matching_ids(search, cls.CAMPAIGN_MATCH_LIMIT) if index is not None else None
+            if campaign_ids is None:
+                matches |= Q(campaign__title__icontains=search)
+            elif len(campaign_ids) < cls.CAMPAIGN_MATCH_LIMIT:
+                matches |= Q(campaign_id__in=campaign_ids)
+            else:
+                # Too many matches to list; the ids were cut off at the limit
+                matches |= Q(campaign_id__in=index.matching_subquery(search))
+            donations = donations.filter(matches)
+        
+        return donations
+    
+    @staticmethod
+    def get_stats(donations):
+        """Count, completed total and pending count of donations from one aggregate query"""
+        stats = donations.aggregate(
+            total_donations=Count('id'),
+            total_amount=Sum('amount', filter=Q(status='completed')),
+            pending_count=Count('id', filter=Q(status='pending')),
+        )
+        stats['total_amount'] = stats['total_amount'] or 0
+        return stats
+    
+    @classmethod
+    def get_page(cls, donations, sort='-created_at', cursor=None, page_size=None):
+        """One page of donations with their campaign and donor, and the next page's cursor"""
+        page_size = page_size or getattr(settings, 'ADMIN_DONATIONS_PAGE_SIZE', 50)
+        if sort not in cls.SORT_FIELDS:
+            sort = '-created_at'
+        
+        rows = (
+            donations.select_related('donor', 'campaign')
+            .defer(*cls.DEFERRED_FIELDS)
+            .annotate(
+                message_excerpt=Left('message', cls.EXCERPT_LENGTH + 1),
+                admin_notes_excerpt=Left('admin_notes', cls.EXCERPT_LENGTH + 1),
+            )
+        )
+        return keyset_page(rows, sort, cursor, page_size)
+
+class CachedSummaryService:
+    """Per-user dashboard statistics, cached until invalidated for that user
+    
+    Each user has a generation counter next to the cached summary; invalidating
+    bumps the counter, so a summary computed while it changed is not served.
+    """
+    
+    CACHE_KEY = None
+    GENERATION_KEY = None
+    MAX_AGE_SETTING = None
+    
+    @classmethod
+    def get_summary(cls, user_id):
+        key = cls.CACHE_KEY.format(user_id=user_id)
+        generation_key = cls.GENERATION_KEY.format(user_id=user_id)
+        
+        cached = cache.get_many([key, generation_key])
+        generation = cached.get(generation_key, 0)
+        entry = cached.get(key)
+        if entry and entry['generation'] == generation:
+            return entry['summary']
+        
+        summary = cls.calculate_summary(user_id)
+        max_age = getattr(settings, cls.MAX_AGE_SETTING, 300)
+        cache.set(key, {'generation': generation, 'summary': summary}, max_age)
+        return summary
+    
+    @classmethod
+    def invalidate(cls, user_id):
+        """Mark a user's cached summary as outdated"""
+        key = cls.GENERATION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+    
+    @staticmethod
+    def calculate_summary(user_id):
+        raise NotImplementedError
+
+class DonorSummaryService(CachedSummaryService):
+    """Cached per-donor giving statistics for the donor dashboard
+    
+    Invalidated when one of the donor's donations changes state.
+    """
+    
+    # Bump the version when the summary layout changes
+    CACHE_KEY = 'donor_summary:v1:{user_id}'
+    GENERATION_KEY = 'donor_summary:generation:{user_id}'
+    MAX_AGE_SETTING = 'DONOR_SUMMARY_MAX_AGE'
+    
+    @staticmethod
+    def calculate_summary(donor_id):
+        """Compute a donor's statistics from one query grouped by campaign"""
+        completed = Q(status='completed')
+        per_campaign = (
+            Donation.objects.filter(donor_id=donor_id)
+            .values('campaign_id', 'campaign__student_id', 'campaign__current_amount', 'campaign__goal')
+            .annotate(
+                donated=Sum('amount', filter=completed),
+                completed_count=Count('id', filter=completed),
+            )
+            .order_by()
+        )
+        
+        supported = [row for row in per_campaign if row['completed_count']]
+        # Share of supported campaigns that have reached their goal
+        successful = sum(
+            1 for row in supported if row['campaign__current_amount'] >= row['campaign__goal']
+        )
+        
+        return {
+            'total_donated': sum((row['donated'] for row in supported), Decimal('0')),
+            'donation_count': sum(row['completed_count'] for row in supported),
+            'campaigns_supported': len(supported),
+            'students_helped': len({row['campaign__student_id'] for row in supported}),
+            'impact_score': int(successful / len(supported) * 100) if supported else 0,
+            # Campaigns with a donation in any state, left out of recommendations
+            'donated_campaign_ids': [row['campaign_id'] for row in per_campaign],
+        }
+
+class StudentSummaryService(CachedSummaryService):
+    """Cached per-student campaign statistics for the student dashboard
+    
+    Invalidated when one of the student's campaigns changes, and when a
+    donation to one of them enters or leaves the completed state.
+    """
+    
+    # Bump the version when the summary layout changes
+    CACHE_KEY = 'student_summary:v1:{user_id}'
+    GENERATION_KEY = 'student_summary:generation:{user_id}'
+    MAX_AGE_SETTING = 'STUDENT_SUMMARY_MAX_AGE'
+    
+    @staticmethod
+    def calculate_summary(student_id):
+        """Compute a student's statistics from one campaign aggregate and one supporter count"""
+        summary = Campaign.objects.filter(student_id=student_id).aggregate(
+            campaign_count=Count('id'),
+            approved_campaigns_count=Count('id', filter=Q(approved=True)),
+            pending_campaigns_count=Count('id', filter=Q(approved=False)),
+            total_raised=Sum('current_amount'),
+            total_goal=Sum('goal'),
+        )
+        summary['total_raised'] = summary['total_raised'] or Decimal('0')
+        summary['total_goal'] = summary['total_goal'] or Decimal('0')
+        
+        # Unique donors across all the student's campaigns; anonymous
+        # donations count as one supporter, as in calculate_ledger
+        supporters = Donation.objects.filter(
+            campaign__student_id=student_id,
+            status='completed',
+        ).aggregate(
+            donors=Count('donor', distinct=True),
+            guests=Count('id', filter=Q(donor__isnull=True)),
+        )
+        summary['total_supporters'] = supporters['donors'] + (1 if supporters['guests'] else 0)
+        return summary
+
+class DonationRollupService:
+    """Incremental builder for the DonationDailyRollup table
+    
+    Incremental builds find changed days from Donation.updated_at. Deleted
+    donations are handled by rebuild_days from a post_delete receiver, but
+    Donation queryset update() calls do not move updated_at: they must set
+    it themselves, or be followed by a --full rebuild.
+    """
+    
+    WATERMARK_NAME = 'donation_daily_rollup'
+    
+    @staticmethod
+    def _day_start(day):
+        """Aware datetime for the start of a day in the current time zone"""
+        from datetime import datetime, time
+        return timezone.make_aware(datetime.combine(day, time.min))
+    
+    @classmethod
+    def get_rollup_window(cls, date_from=None, date_to=None):
+        """Return the [start, end) range of whole days that can be read from rollups"""
+        from datetime import datetime, timedelta
+        
+        watermark = RollupWatermark.objects.filter(name=cls.WATERMARK_NAME).values_list(
+            'processed_until', flat=True
+        ).first()
+        if not watermark:
+            return None, None
+        
+        # Only days that ended before today and before the last build are complete
+        today = timezone.localdate()
+        end_day = min(today, timezone.localtime(watermark).date())
+        
+        if date_to:
+            if not isinstance(date_to, datetime):
+                date_to = cls._day_start(date_to)
+            end_day = min(end_day, timezone.localtime(date_to).date())
+        
+        start_day = None
+        if date_from:
+            if not isinstance(date_from, datetime):
+                date_from = cls._day_start(date_from)
+            local_from = timezone.localtime(date_from)
+            start_day = local_from.date()
+            if local_from != cls._day_start(start_day):
+                start_day += timedelta(days=1)
+        else:
+            start_day = DonationDailyRollup.objects.order_by('date').values_list('date', flat=True).first()
+        
+        if start_day is None or start_day >= end_day:
+            return None, None
+        
+        return cls._day_start(start_day), cls._day_start(end_day)
+    
+    @classmethod
+    def build(cls, full=False):
+        """Rebuild the rollups for every day touched since the last watermark"""
+        from django.db import transaction
+        from django.db.models.functions import TruncDate
+        from datetime import timedelta
+        
+        now = timezone.now()
+        
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+                name=cls.WATERMARK_NAME
+            )
+            
+            if full or watermark.processed_until is None:
+                DonationDailyRollup.objects.all().delete()
+                days = Donation.objects.order_by().annotate(
+                    day=TruncDate('created_at')
+                ).values_list('day', flat=True).distinct()
+            else:
+                # Overlap the previous run to catch rows committed late
+                lag = timedelta(seconds=getattr(settings, 'DONATION_ROLLUP_LAG_SECONDS', 300))
+                days = Donation.objects.filter(
+                    updated_at__gt=watermark.processed_until - lag,
+                    updated_at__lte=now,
+                ).order_by().annotate(
+                    day=TruncDate('created_at')
+                ).values_list('day', flat=True).distinct()
+            
+            days = sorted(set(days))
+            for day in days:
+                cls._build_day(day)
+            
+            watermark.processed_until = now
+            watermark.save(update_fields=['processed_until', 'updated_at'])
+        
+        return days
+    
+    @classmethod
+    def rebuild_days(cls, days):
+        """Rebuild the given days' rollups now, if a build has already covered them"""
+        watermark = RollupWatermark.objects.filter(name=cls.WATERMARK_NAME).values_list(
+            'processed_until', flat=True
+        ).first()
+        if not watermark:
+            return
+        
+        last_day = timezone.localtime(watermark).date()
+        with transaction.atomic():
+            for day in sorted(set(days)):
+                if day <= last_day:
+                    cls._build_day(day)
+    
+    @classmethod
+    def _build_day(cls, day):
+        """Replace the rollup rows of a single day"""
+        from django.db.models import Sum, Count
+        from datetime import timedelta
+        
+        start = cls._day_start(day)
+        end = cls._day_start(day + timedelta(days=1))
+        
+        rows = Donation.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).order_by().values('campaign', 'payment_method', 'status').annotate(
+            donation_count=Count('id'),
+            gross_amount=Sum('amount'),
+            fee_amount=Sum('processing_fee'),
+            net_amount=Sum('net_amount'),
+        )
+        
+        DonationDailyRollup.objects.filter(date=day).delete()
+        DonationDailyRollup.objects.bulk_create([
+            DonationDailyRollup(
+                campaign_id=row['campaign'],
+                date=day,
+                payment_method=row['payment_method'],
+                status=row['status'],
+                donation_count=row['donation_count'],
+                gross_amount=row['gross_amount'] or 0,
+                fee_amount=row['fee_amount'] or 0,
+                net_amount=row['net_amount'] or 0,
+            )
+            for row in rows
+        ])
+
+
+class WebhookInboxService:
+    """Durable inbox for payment provider webhooks
+    
+    Views only verify and record events; a worker applies them later. Events
+    are unique per (provider, event_id), so redelivered webhooks are no-ops,
+    and events for the same donation are applied one at a time in the order
+    they were received.
+    """
+    
+    @staticmethod
+    def record(provider, event_id, event_type, donation_ref, payload):
+        """Store a verified event; returns False if it was already received"""
+        _, created = WebhookEvent.objects.get_or_create(
+            provider=provider,
+            event_id=event_id,
+            defaults={
+                'event_type': event_type,
+                'donation_ref': (donation_ref or '')[:64],
+                'payload': payload,
+            }
+        )
+        
+        if not created:
+            logger.info(f"Duplicate {provider} webhook event {event_id} ignored")
+        return created
+    
+    @staticmethod
+    def process_pending(batch_size=None, max_workers=None):
+        """Apply pending events in batches; returns counts per final status"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        batch_size = batch_size or getattr(settings, 'WEBHOOK_BATCH_SIZE', 100)
+        max_workers = WebhookInboxService.get_concurrency(max_workers, warn=True)
+        counts = {'processed': 0, 'ignored': 0, 'failed': 0, 'retried': 0}
+        # Events that failed in this run wait for the next one, with their donation
+        deferred = set()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                groups = WebhookInboxService._claim_batch(batch_size, deferred)
+                if not groups:
+                    break
+                
+                for group_counts, failed_event in executor.map(WebhookInboxService._process_group, groups):
+                    for status, count in group_counts.items():
+                        counts[status] += count
+                    if failed_event:
+                        deferred.add(failed_event.donation_ref or failed_event.pk)
+        
+        return counts
+    
+    @staticmethod
+    def get_concurrency(max_workers=None, warn=False):
+        """Return the number of donation groups that can be processed concurrently"""
+        max_workers = max_workers or getattr(settings, 'WEBHOOK_MAX_CONCURRENCY', 4)
+        
+        # Without row locks (SQLite) concurrent writers fail with "database is locked"
+        if max_workers > 1 and not connection.features.has_select_for_update_skip_locked:
+            if warn:
+                logger.warning(
+                    f"{connection.vendor} does not support skip_locked row locks; "
+                    "processing webhook events sequentially"
+                )
+            return 1
+        
+        return max_workers
+    
+    @staticmethod
+    def _claim_batch(batch_size, deferred=()):
+        """Claim pending events, grouped per donation in received order
+        
+        A donation's events are claimed only together with its earliest
+        unfinished event, and only as an unbroken run from it. That event's
+        row lock is the donation's lock: a worker whose candidates skipped
+        it, because another worker holds it or has it processing, leaves the
+        donation's later events alone, so they cannot overtake it.
+        """
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=getattr(settings, 'WEBHOOK_PROCESSING_TIMEOUT', 600))
+        claimable = Q(status='pending') | Q(status='processing', updated_at__lt=stale_before)
+        
+        with transaction.atomic():
+            candidates = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True).filter(claimable).exclude(
+                    Q(donation_ref__in=[ref for ref in deferred if isinstance(ref, str)]) |
+                    Q(pk__in=[pk for pk in deferred if isinstance(pk, int)])
+                ).order_by('received_at', 'pk')[:batch_size]
+            )
+            locked = {event.pk: event for event in candidates}
+            
+            # Every unfinished event of the candidates' donations, in order
+            unfinished = {}
+            refs = {event.donation_ref for event in candidates if event.donation_ref}
+            for ref, pk in WebhookEvent.objects.filter(
+                donation_ref__in=refs, status__in=('pending', 'processing')
+            ).order_by('received_at', 'pk').values_list('donation_ref', 'pk'):
+                unfinished.setdefault(ref, []).append(pk)
+            
+            groups = []
+            for event in candidates:
+                if not event.donation_ref:
+                    groups.append([event])
+            for ref, pks in unfinished.items():
+                run = []
+                for pk in pks:
+                    if pk not in locked:
+                        break
+                    run.append(locked[pk])
+                if run:
+                    groups.append(run)
+            
+            WebhookEvent.objects.filter(pk__in=[event.pk for group in groups for event in group]).update(
+                status='processing', updated_at=now
+            )
+        
+        return groups
+    
+    @staticmethod
+    def _process_group(events):
+        """Apply one donation's events in order, stopping at the first failure
+        
+        Returns the status counts and the event that failed, if any.
+        """
+        counts = {'processed': 0, 'ignored': 0, 'failed': 0, 'retried': 0}
+        failed_event = None
+        
+        try:
+            for index, event in enumerate(events):
+                try:
+                    with transaction.atomic():
+                        status = WebhookInboxService._apply_event(event)
+                    last_error = '' if status == 'processed' else 'No matching donation or unhandled event type'
+                    WebhookEvent.objects.filter(pk=event.pk).update(
+                        status=status, last_error=last_error,
+                        processed_at=timezone.now(), updated_at=timezone.now(),
+                    )
+                    counts[status] += 1
+                except Exception as e:
+                    logger.error(f"Failed to process {event.provider} webhook event {event.event_id}: {str(e)}")
+                    counts[WebhookInboxService._schedule_retry(event, e)] += 1
+                    failed_event = event
+                    
+                    # Later events for this donation must wait for this one
+                    WebhookEvent.objects.filter(
+                        pk__in=[later.pk for later in events[index + 1:]]
+                    ).update(status='pending', updated_at=timezone.now())
+                    break
+        finally:
+            # Worker threads hold their own connections
+            connection.close()
+        
+        return counts, failed_event
+    
+    @staticmethod
+    def _schedule_retry(event, error):
+        """Put a failed event back in the queue, or give up after the maximum attempts"""
+        attempts = event.attempts + 1
+        status = 'failed' if attempts >= getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5) else 'pending'
+        
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            status=status,
+            attempts=attempts,
+            last_error=str(error)[:1000],
+            updated_at=timezone.now(),
+        )
+        
+        return 'failed' if status == 'failed' else 'retried'
+    
+    @staticmethod
+    def _apply_event(event):
+        """Apply the event through its registered handler"""
+        return webhook_router.dispatch(event)
+
+class PayPalIPNBatchService:
+    """Applies replayed PayPal IPN dumps in bulk
+    
+    Each line of a dump is one urlencoded IPN message. Only the last
+    notification per donation is applied, with one bulk update per chunk,
+    and the campaign ledgers are reconciled once for the affected campaigns
+    instead of per saved donation.
+    """
+    
+    # Only these IPN fields are kept from each message
+    FIELDS = frozenset(('custom', 'payment_status', 'txn_id', 'ipn_track_id'))
+    
+    @staticmethod
+    def parse_line(line):
+        """Decode one IPN message into the fields the ingestion needs"""
+        from urllib.parse import parse_qsl
+        
+        line = line.strip()
+        if not line:
+            return None
+        
+        fields = PayPalIPNBatchService.FIELDS
+        data = {key: value for key, value in parse_qsl(line, keep_blank_values=True) if key in fields}
+        
+        payment_status = data.get('payment_status', '').lower()
+        txn_id = data.get('txn_id', '')
+        data['event_id'] = data.get('ipn_track_id') or (f"{txn_id}:{payment_status}" if txn_id else '')
+        data['payment_status'] = payment_status
+        
+        return data
+    
+    @staticmethod
+    def ingest(lines, chunk_size=5000, dry_run=False):
+        """Apply IPN messages from an iterable of lines; returns counts"""
+        counts = {
+            'messages': 0, 'duplicates': 0, 'skipped': 0,
+            'donations': 0, 'updated': 0, 'unchanged': 0, 'missing': 0, 'campaigns': 0,
+        }
+        
+        chunk = []
+        for line in lines:
+            message = PayPalIPNBatchService.parse_line(line)
+            if message is None:
+                continue
+            chunk.append(message)
+            if len(chunk) >= chunk_size:
+                PayPalIPNBatchService._apply_chunk(chunk, counts, dry_run)
+                chunk = []
+        
+        if chunk:
+            PayPalIPNBatchService._apply_chunk(chunk, counts, dry_run)
+        
+        return counts
+    
+    @staticmethod
+    def _apply_chunk(messages, counts, dry_run):
+        from django.db import transaction
+        from .webhook_handlers import PAYPAL_STATUSES
+        
+        counts['messages'] += len(messages)
+        
+        # Messages already received through the webhook or an earlier replay
+        event_ids = {message['event_id'] for message in messages if message['event_id']}
+        seen = set(WebhookEvent.objects.filter(
+            provider='paypal', event_id__in=event_ids
+        ).values_list('event_id', flat=True))
+        
+        # Last notification per donation wins; dumps are in delivery order
+        final = {}
+        new_events = {}
+        for message in messages:
+            if message['event_id'] in seen:
+                counts['duplicates'] += 1
+                continue
+            
+            status = PAYPAL_STATUSES.get(message['payment_status'])
+            try:
+                donation_id = uuid.UUID(message.get('custom', ''))
+            except ValueError:
+                donation_id = None
+            if not status or not donation_id:
+                counts['skipped'] += 1
+                continue
+            
+            final[donation_id] = (status, message.get('txn_id', ''))
+            if message['event_id']:
+                new_events[message['event_id']] = message
+        
+        counts['donations'] += len(final)
+        if not final:
+            return
+        
+        now = timezone.now()
+        with transaction.atomic():
+            donations = list(Donation.objects.select_for_update().filter(id__in=final).only(
+                'id', 'status', 'payment_id', 'completed_at', 'campaign', 'donor', 'is_recurring',
+                'parent_donation', 'recurring_frequency', 'created_at',
+            ))
+            counts['missing'] += len(final) - len(donations)
+            
+            changed = []
+            completed = []
+            for donation in donations:
+                status, txn_id = final[donation.id]
+                if donation.status == status:
+                    counts['unchanged'] += 1
+                    continue
+                
+                donation.status = status
+                donation.updated_at = now
+                if status == 'completed':
+                    donation.completed_at = now
+                    donation.payment_id = txn_id or donation.payment_id
+                    completed.append(donation)
+                changed.append(donation)
+            
+            counts['updated'] += len(changed)
+            if dry_run:
+                transaction.set_rollback(True)
+                return
+            
+            Donation.objects.bulk_update(
+                changed, ['status', 'completed_at', 'payment_id', 'updated_at'], batch_size=500
+            )
+            WebhookEvent.objects.bulk_create(
+                [
+                    WebhookEvent(
+                        provider='paypal', event_id=event_id, event_type=message['payment_status'],
+                        donation_ref=message.get('custom', '')[:64], payload=message,
+                        status='processed', processed_at=now,
+                    )
+                    for event_id, message in new_events.items()
+                ],
+                ignore_conflicts=True,
+            )
+            
+            # bulk_update bypasses save(), so rebuild the touched ledgers in one aggregate
+            campaign_ids = {donation.campaign_id for donation in changed}
+            if campaign_ids:
+                CampaignLedgerService.reconcile(campaign_ids=campaign_ids)
+            counts['campaigns'] += len(campaign_ids)
+            
+            EmailOutboxService.enqueue_bulk(completed)
+            for donation in completed:
+                if donation.is_recurring and not donation.parent_donation_id:
+                    RecurringDonationService.schedule_recurring_donation(donation)
+            
+            if changed:
+                donor_ids = {donation.donor_id for donation in changed if donation.donor_id}
+                transaction.on_commit(
+                    lambda: PayPalIPNBatchService._invalidate_caches(donor_ids, campaign_ids)
+                )
+    
+    @staticmethod
+    def _invalidate_caches(donor_ids, campaign_ids):
+        """Refresh what donation_status_changed receivers would have, once per chunk
+        
+        bulk_update sends no donation_status_changed, and sending it per
+        donation would repeat the same invalidations thousands of times.
+        """
+        PlatformStatsService.invalidate()
+        for donor_id in donor_ids:
+            DonorSummaryService.invalidate(donor_id)
+        # reconcile rewrote these campaigns' totals
+        student_ids = Campaign.objects.filter(pk__in=campaign_ids).values_list('student_id', flat=True)
+        for student_id in set(student_ids):
+            StudentSummaryService.invalidate(student_id)
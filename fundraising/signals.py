@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Campaign, Donation, ScreeningPattern, donation_status_changed
+from .fraud import donation_entities
+from .search import get_campaign_search_index
+from .security import content_screener, donation_velocity
+from .services import (
+    CampaignBrowseService, DonationRollupService, DonorSummaryService, PlatformStatsService,
+    RecurringDonationService, StudentSummaryService,
+)
+
+@receiver(donation_status_changed)
+def donation_status_changed_handler(sender, donation, previous_status=None, status=None, campaign_ids=None,
+                                    previous_donor_id=None, **kwargs):
+    """Refresh cached statistics affected by a donation state change"""
+    PlatformStatsService.invalidate()
+    # A donation moved to another donor changes both donors' summaries
+    for donor_id in {donation.donor_id, previous_donor_id} - {None}:
+        DonorSummaryService.invalidate(donor_id)
+    
+    # Only completed donations count towards a student's raised amount and supporters
+    if 'completed' in (previous_status, status):
+        student_ids = Campaign.objects.filter(
+            pk__in=campaign_ids or {donation.campaign_id}
+        ).values_list('student_id', flat=True)
+        for student_id in set(student_ids):
+            StudentSummaryService.invalidate(student_id)
+    
+    # New donor-made donations feed the fraud velocity features; scheduled charges do not
+    if previous_status is None and status is not None and not donation.parent_donation_id:
+        donation_velocity.record(donation_entities(donation), donation.amount)
+    
+    # Completed recurring donations start their billing schedule
+    if status == 'completed' and donation.is_recurring and not donation.parent_donation_id:
+        RecurringDonationService.schedule_recurring_donation(donation)
+
+@receiver(pre_delete, sender=Donation)
+def donation_ledger_lock_handler(sender, instance, **kwargs):
+    """Lock a donation being deleted and keep the stored values its delete reverses"""
+    instance._ledger_previous = Donation.objects.select_for_update().filter(pk=instance.pk).values(
+        *Donation.LEDGER_VALUES
+    ).first()
+
+@receiver(post_delete, sender=Donation)
+def donation_ledger_delete_handler(sender, instance, **kwargs):
+    """Take a deleted donation out of its campaign ledger, including queryset and cascade deletes"""
+    previous = instance.__dict__.pop('_ledger_previous', None)
+    if previous:
+        instance._apply_ledger_transition(previous, current=False)
+        instance._notify_status_change(previous, None)
+
+@receiver(post_delete, sender=Donation)
+def donation_deleted_handler(sender, instance, **kwargs):
+    """Rebuild the rollup day a deleted donation was counted in; updated_at cannot show it"""
+    day = timezone.localdate(instance.created_at)
+    transaction.on_commit(lambda: DonationRollupService.rebuild_days([day]))
+
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+def campaign_changed_handler(sender, instance, **kwargs):
+    """Refresh cached statistics affected by a campaign change"""
+    PlatformStatsService.invalidate()
+    CampaignBrowseService.invalidate()
+    StudentSummaryService.invalidate(instance.student_id)
+
+# Fields that make up a campaign's search document
+SEARCH_FIELDS = {'title', 'description', 'category', 'student'}
+STUDENT_NAME_FIELDS = {'full_name', 'first_name', 'last_name', 'username'}
+
+@receiver(post_save, sender=Campaign)
+def campaign_search_index_handler(sender, instance, using, update_fields=None, **kwargs):
+    """Reindex a campaign when its searchable text changes"""
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    
+    index = get_campaign_search_index(using)
+    if index is not None:
+        index.update([instance])
+
+@receiver(post_delete, sender=Campaign)
+def campaign_search_remove_handler(sender, instance, using, **kwargs):
+    index = get_campaign_search_index(using)
+    if index is not None:
+        index.remove([instance.pk])
+
+@receiver(post_save, sender=get_user_model())
+def student_search_index_handler(sender, instance, using, created=False, update_fields=None, **kwargs):
+    """Reindex a student's campaigns when their name changes"""
+    if created or instance.role != 'student':
+        return
+    if update_fields is not None and not STUDENT_NAME_FIELDS.intersection(update_fields):
+        return
+    
+    index = get_campaign_search_index(using)
+    if index is not None:
+        index.update(instance.campaigns.using(using).select_related('student'))
+
+@receiver(post_migrate)
+def search_index_migrate_handler(sender, using, **kwargs):
+    """Create the campaign search index, filling it if it is new"""
+    if sender.label != 'fundraising':
+        return
+    
+    index = get_campaign_search_index(using)
+    if index is not None and index.install():
+        index.rebuild()
+
+@receiver(post_save, sender=ScreeningPattern)
+@receiver(post_delete, sender=ScreeningPattern)
+def screening_pattern_changed_handler(sender, instance, **kwargs):
+    """Have every process recompile its screening patterns"""
+    content_screener.invalidate()
+
+@receiver(setting_changed)
+def screening_setting_changed_handler(sender, setting, **kwargs):
+    if setting in ('SUSPICIOUS_MESSAGE_PATTERNS', 'SUSPICIOUS_EMAIL_DOMAINS'):
+        content_screener.reset()
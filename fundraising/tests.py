@@ -1,3 +1,1316 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.core import mail
+from django.test import (
+    AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db.models import Count, Sum
+from django.urls import include, path, reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+import csv
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from authentication.models import User
+from . import views
+from .decorators import rate_limit_payment
+from .email_service import EmailOutboxService
+from .fraud import VelocityFeatureStore
+from .management.commands.generate_analytics_reports import EXPORT_COLUMNS
+from .models import (
+    Campaign, Donation, DonationDailyRollup, DonationReceipt, EmailOutbox, RecurringSchedule,
+    ScreeningPattern, WebhookEvent, donation_status_changed,
+)
+from .ratelimit import SlidingWindowRateLimiter
+from .screening import PatternSet
+from .search import SQLiteCampaignSearchIndex
+from .security import PaymentSecurityValidator, content_screener
+from .services import (
+    CampaignBrowseService, CampaignLedgerService, DonationAnalyticsService, DonationRollupService,
+    DonationSearchService, DonationService, DonorSummaryService, PayPalIPNBatchService,
+    PlatformStatsService, RecurringDonationService, StudentSummaryService, WebhookInboxService,
+)
+
+class PlatformAnalyticsTests(TestCase):
+    """Tests for DonationAnalyticsService.get_platform_analytics"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        cls.other_donor = User.objects.create_user(username='other', password='pass', role='donor')
+        
+        cls.tuition = Campaign.objects.create(
+            title='Tuition campaign', description='Tuition', goal=Decimal('100.00'),
+            student=cls.student, approved=True, category='tuition',
+        )
+        cls.books = Campaign.objects.create(
+            title='Books campaign', description='Books', goal=Decimal('500.00'),
+            student=cls.student, approved=False, category='books',
+        )
+        
+        Donation.objects.create(
+            amount=Decimal('80.00'), campaign=cls.tuition, donor=cls.donor,
+            payment_method='stripe', status='completed',
+        )
+        Donation.objects.create(
+            amount=Decimal('40.00'), campaign=cls.tuition, donor=cls.other_donor,
+            payment_method='paypal', status='completed',
+        )
+        Donation.objects.create(
+            amount=Decimal('20.00'), campaign=cls.books, donor=cls.donor,
+            payment_method='stripe', status='completed',
+        )
+        Donation.objects.create(
+            amount=Decimal('999.00'), campaign=cls.books, donor=cls.other_donor,
+            payment_method='paypal', status='pending',
+        )
+    
+    def test_query_count(self):
+        with self.assertNumQueries(2):
+            DonationAnalyticsService.get_platform_analytics()
+    
+    def test_donation_metrics(self):
+        analytics = DonationAnalyticsService.get_platform_analytics()
+        
+        self.assertEqual(analytics['total_raised'], Decimal('140.00'))
+        self.assertEqual(analytics['total_donations'], 3)
+        self.assertEqual(analytics['total_donors'], 2)
+        self.assertEqual(analytics['payment_method_stats'], [
+            {'payment_method': 'stripe', 'count': 2, 'total': Decimal('100.00')},
+            {'payment_method': 'paypal', 'count': 1, 'total': Decimal('40.00')},
+        ])
+    
+    def test_campaign_metrics(self):
+        analytics = DonationAnalyticsService.get_platform_analytics()
+        
+        self.assertEqual(analytics['total_campaigns'], 2)
+        self.assertEqual(analytics['active_campaigns'], 1)
+        self.assertEqual(analytics['successful_campaigns'], 1)
+        self.assertEqual(analytics['average_campaign_goal'], Decimal('300.00'))
+        self.assertEqual(analytics['category_stats'], [
+            {'category': 'tuition', 'count': 1, 'total_raised': Decimal('120.00')},
+            {'category': 'books', 'count': 1, 'total_raised': Decimal('20.00')},
+        ])
+
+class UnavailableCache:
+    """Cache backend whose server cannot be reached"""
+    
+    def __getattr__(self, name):
+        def unavailable(*args, **kwargs):
+            raise ConnectionError('cache server unreachable')
+        return unavailable
+
+class CampaignLedgerTests(TestCase):
+    """Tests for the incrementally maintained campaign totals"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        cls.campaign, cls.other = [
+            Campaign.objects.create(
+                title=title, description=title, goal=Decimal('1000.00'),
+                student=student, approved=True, category='books',
+            )
+            for title in ('Books', 'Laptop')
+        ]
+    
+    def ledger(self, campaign):
+        campaign.refresh_from_db()
+        return (campaign.current_amount, campaign.donations_total, campaign.donation_count, campaign.unique_donor_count)
+    
+    def test_status_transitions_shift_the_totals(self):
+        donation = Donation.objects.create(
+            amount=Decimal('100.00'), processing_fee=Decimal('3.00'), status='pending',
+            payment_method='stripe', campaign=self.campaign, donor=self.donor,
+        )
+        self.assertEqual(self.ledger(self.campaign), (Decimal('0.00'), Decimal('0.00'), 0, 0))
+        
+        donation.status = 'completed'
+        donation.save()
+        self.assertEqual(self.ledger(self.campaign), (Decimal('97.00'), Decimal('100.00'), 1, 1))
+        
+        # Saving again without a status change adds nothing
+        donation.save()
+        self.assertEqual(self.ledger(self.campaign), (Decimal('97.00'), Decimal('100.00'), 1, 1))
+        
+        donation.status = 'refunded'
+        donation.save(update_fields=['status'])
+        self.assertEqual(self.ledger(self.campaign), (Decimal('0.00'), Decimal('0.00'), 0, 0))
+    
+    def test_moving_a_completed_donation_moves_its_totals(self):
+        for amount in ('40.00', '60.00'):
+            Donation.objects.create(
+                amount=Decimal(amount), status='completed', payment_method='stripe',
+                campaign=self.campaign, donor=self.donor,
+            )
+        donation = Donation.objects.get(amount=Decimal('60.00'))
+        donation.campaign = self.other
+        donation.save()
+        
+        # The donor still has a donation on the first campaign
+        self.assertEqual(self.ledger(self.campaign), (Decimal('40.00'), Decimal('40.00'), 1, 1))
+        self.assertEqual(self.ledger(self.other), (Decimal('60.00'), Decimal('60.00'), 1, 1))
+        
+        donation.delete()
+        self.assertEqual(self.ledger(self.other), (Decimal('0.00'), Decimal('0.00'), 0, 0))
+    
+    def test_queryset_and_cascade_deletes_reverse_the_totals(self):
+        first, guest = [
+            Donation.objects.create(
+                amount=Decimal(amount), status='completed', payment_method='stripe',
+                campaign=self.campaign, donor=donor,
+            )
+            for amount, donor in (('40.00', self.donor), ('25.00', None))
+        ]
+        Donation.objects.create(
+            amount=Decimal('60.00'), status='completed', payment_method='stripe',
+            campaign=self.campaign, donor=self.donor, parent_donation=first,
+        )
+        self.assertEqual(self.ledger(self.campaign), (Decimal('125.00'), Decimal('125.00'), 3, 2))
+        
+        # Deleting the parent cascades to its recurring charge in the same batch
+        Donation.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.ledger(self.campaign), (Decimal('25.00'), Decimal('25.00'), 1, 1))
+        
+        received = mock.Mock()
+        donation_status_changed.connect(received)
+        self.addCleanup(donation_status_changed.disconnect, received)
+        with self.captureOnCommitCallbacks(execute=True):
+            Donation.objects.filter(campaign=self.campaign).delete()
+        self.assertEqual(self.ledger(self.campaign), (Decimal('0.00'), Decimal('0.00'), 0, 0))
+        received.assert_called_once()
+        self.assertEqual(received.call_args.kwargs['previous_status'], 'completed')
+        self.assertIsNone(received.call_args.kwargs['status'])
+    
+    def test_reconcile_repairs_drift_batch_by_batch(self):
+        for campaign in (self.campaign, self.other):
+            Donation.objects.create(
+                amount=Decimal('25.00'), status='completed', payment_method='stripe',
+                campaign=campaign, donor=None,
+            )
+        Campaign.objects.filter(pk=self.other.pk).update(current_amount=Decimal('999.00'), donation_count=7)
+        
+        drifted = CampaignLedgerService.reconcile(dry_run=True, batch_size=1)
+        self.assertEqual([entry['campaign_id'] for entry in drifted], [self.other.pk])
+        self.assertEqual(self.ledger(self.other)[0], Decimal('999.00'))
+        
+        out = StringIO()
+        with self.assertLogs('fundraising.management.commands.reconcile_campaign_totals', 'WARNING'):
+            call_command('reconcile_campaign_totals', '--batch-size', '1', stdout=out)
+        self.assertIn('1 campaigns repaired', out.getvalue())
+        self.assertEqual(self.ledger(self.campaign), (Decimal('25.00'), Decimal('25.00'), 1, 1))
+        self.assertEqual(self.ledger(self.other), (Decimal('25.00'), Decimal('25.00'), 1, 1))
+        self.assertEqual(CampaignLedgerService.reconcile(), [])
+
+@override_settings(PLATFORM_STATS_MIN_AGE=0, PLATFORM_STATS_MAX_AGE=300)
+class PlatformStatsTests(TestCase):
+    """Tests for the cached platform statistics snapshot"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=cls.student, approved=False, category='books',
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_snapshot_is_computed_once_then_cached(self):
+        with self.assertNumQueries(2):
+            stats = PlatformStatsService.get_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(PlatformStatsService.get_stats(), stats)
+        self.assertEqual((stats['total_campaigns'], stats['pending_campaigns']), (1, 1))
+    
+    def test_invalidation_refreshes_the_snapshot(self):
+        PlatformStatsService.get_stats()
+        Campaign.objects.update(approved=True)
+        
+        # A queryset update sends no signal, so the cached snapshot is still served
+        with self.assertNumQueries(0):
+            self.assertEqual(PlatformStatsService.get_stats()['pending_campaigns'], 1)
+        PlatformStatsService.invalidate()
+        self.assertEqual(PlatformStatsService.get_stats()['pending_campaigns'], 0)
+    
+    @override_settings(PLATFORM_STATS_MIN_AGE=60)
+    def test_invalidations_within_min_age_are_coalesced(self):
+        PlatformStatsService.get_stats()
+        PlatformStatsService.invalidate()
+        with self.assertNumQueries(0):
+            PlatformStatsService.get_stats()
+    
+    def test_callers_without_the_lock_do_not_refresh(self):
+        stats = PlatformStatsService.get_stats()
+        PlatformStatsService.invalidate()
+        
+        # Another worker is refreshing: serve the outdated snapshot
+        cache.add(PlatformStatsService.LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(PlatformStatsService.get_stats(), stats)
+        
+        # With nothing cached, compute without storing
+        cache.delete(PlatformStatsService.CACHE_KEY)
+        with self.assertNumQueries(2):
+            PlatformStatsService.get_stats()
+        self.assertIsNone(cache.get(PlatformStatsService.CACHE_KEY))
+        
+        cache.delete(PlatformStatsService.LOCK_KEY)
+        PlatformStatsService.get_stats()
+        self.assertIsNotNone(cache.get(PlatformStatsService.CACHE_KEY))
+        self.assertIsNone(cache.get(PlatformStatsService.LOCK_KEY))
+
+class DonationRollupTests(TestCase):
+    """Tests for the incrementally built daily donation rollups"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        for amount, status in [('10.00', 'pending'), ('20.00', 'completed'), ('30.00', 'completed')]:
+            Donation.objects.create(
+                amount=Decimal(amount), status=status, payment_method='stripe', campaign=campaign,
+            )
+        Donation.objects.update(created_at=timezone.now() - timedelta(days=2))
+    
+    def assertRollupsMatchDonations(self):
+        fields = ('campaign', 'payment_method', 'status')
+        raw = Donation.objects.order_by().values(*fields).annotate(
+            count=Count('id'), gross=Sum('amount'),
+        )
+        rolled = DonationDailyRollup.objects.order_by().values(*fields).annotate(
+            count=Sum('donation_count'), gross=Sum('gross_amount'),
+        )
+        key = lambda row: tuple(row[field] for field in fields)
+        self.assertEqual(sorted(raw, key=key), sorted(rolled, key=key))
+    
+    def test_incremental_build_follows_status_changes_and_deletes(self):
+        DonationRollupService.build()
+        self.assertRollupsMatchDonations()
+        
+        donation = Donation.objects.get(status='pending')
+        donation.status = 'completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            donation.save()
+        self.assertEqual(len(DonationRollupService.build()), 1)
+        self.assertRollupsMatchDonations()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Donation.objects.filter(amount=Decimal('20.00')).delete()
+        self.assertRollupsMatchDonations()
+
+class AnalyticsExportTests(TestCase):
+    """Tests for generate_analytics_reports --export"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        cls.donations = [
+            Donation.objects.create(
+                amount=Decimal(amount), processing_fee=Decimal('1.00'), status=status,
+                payment_method='stripe', campaign=campaign, donor=donor if index % 2 else None,
+            )
+            for index, (amount, status) in enumerate([
+                ('10.00', 'completed'), ('20.00', 'pending'), ('30.00', 'completed'),
+                ('40.00', 'completed'), ('50.00', 'failed'),
+            ])
+        ]
+        # The first two were made last week
+        for days, donation in zip((7, 6), cls.donations):
+            Donation.objects.filter(pk=donation.pk).update(created_at=timezone.now() - timedelta(days=days))
+    
+    def export(self, export_format, *args):
+        """Run an export in chunks of two and read the rows back as dicts"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'donations.{export_format}')
+            stderr = StringIO()
+            call_command(
+                'generate_analytics_reports', '--export', '--output-file', path,
+                '--export-format', export_format, '--chunk-size', '2', *args,
+                stdout=StringIO(), stderr=stderr,
+            )
+            
+            if export_format == 'csv':
+                with open(path, newline='') as f:
+                    reader = csv.DictReader(f)
+                    self.assertEqual(tuple(reader.fieldnames), EXPORT_COLUMNS)
+                    rows = list(reader)
+            elif export_format == 'jsonl':
+                with open(path) as f:
+                    rows = [json.loads(line) for line in f]
+            else:
+                import pyarrow.parquet as pq
+                table = pq.read_table(path)
+                self.assertEqual(tuple(table.column_names), EXPORT_COLUMNS)
+                rows = table.to_pylist()
+        
+        if rows:
+            self.assertEqual(tuple(rows[0]), EXPORT_COLUMNS)
+        return rows, stderr.getvalue()
+    
+    def assertExportRoundTrips(self, export_format):
+        rows, progress = self.export(export_format)
+        # Five rows in chunks of two: progress after the first two chunks
+        self.assertEqual(progress.count('Exported'), 2)
+        self.assertEqual([str(row['id']) for row in rows], [str(d.pk) for d in self.donations])
+        self.assertEqual([Decimal(str(row['net_amount'])) for row in rows][:2], [Decimal('9.00'), Decimal('19.00')])
+        
+        today = timezone.localdate().isoformat()
+        rows, _ = self.export(export_format, '--status', 'completed', '--date-from', today)
+        self.assertEqual([str(row['id']) for row in rows], [str(d.pk) for d in self.donations[2:4]])
+        
+        rows, _ = self.export(export_format, '--date-to', (timezone.localdate() - timedelta(days=1)).isoformat())
+        self.assertEqual(len(rows), 2)
+    
+    def test_csv_export_round_trips(self):
+        self.assertExportRoundTrips('csv')
+    
+    def test_jsonl_export_round_trips(self):
+        self.assertExportRoundTrips('jsonl')
+    
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_export_round_trips(self):
+        self.assertExportRoundTrips('parquet')
+    
+    def test_bad_dates_are_command_errors(self):
+        for value in ('yesterday', '2024-02-30'):
+            with self.subTest(value=value), self.assertRaisesMessage(CommandError, f'Invalid date: {value}'):
+                call_command(
+                    'generate_analytics_reports', '--export', '--output-file', '/dev/null',
+                    '--date-from', value, stdout=StringIO(), stderr=StringIO(),
+                )
+
+class RecurringDonationTests(TransactionTestCase):
+    """Tests for claiming and charging recurring donations
+    
+    Charges run on worker threads with their own connections, so the data
+    has to be committed.
+    """
+    
+    def setUp(self):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        self.template = Donation.objects.create(
+            amount=Decimal('20.00'), status='completed', payment_method='paypal',
+            campaign=campaign, donor=donor, is_recurring=True, recurring_frequency='monthly',
+        )
+        self.charge_at = timezone.now() - timedelta(days=1)
+        # Completing the template created its schedule
+        RecurringSchedule.objects.filter(template=self.template).update(next_charge_at=self.charge_at)
+        self.schedule = RecurringSchedule.objects.get(template=self.template)
+    
+    def test_only_one_runner_wins_a_charge_date(self):
+        # Two runners that both read the schedule before either advanced it
+        first, second = RecurringSchedule.objects.get(), RecurringSchedule.objects.get()
+        
+        donation = RecurringDonationService.create_recurring_donation(first)
+        self.assertEqual(donation.scheduled_for, self.charge_at)
+        self.assertIsNone(RecurringDonationService.create_recurring_donation(second))
+        
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.last_charged_at, self.charge_at)
+        self.assertGreater(self.schedule.next_charge_at, timezone.now())
+        self.assertEqual(Donation.objects.filter(parent_donation=self.template).count(), 1)
+    
+    def test_plan_sums_the_fees_the_charges_copy(self):
+        # Charges copy the template's fee, whatever the fee table says today
+        Donation.objects.filter(pk=self.template.pk).update(processing_fee=Decimal('3.00'))
+        
+        plan = RecurringDonationService.plan_recurring_run(cycles=1, max_workers=1)
+        self.assertEqual(plan['due_now'], [
+            {'payment_method': 'paypal', 'count': 1, 'gross': Decimal('20.00'), 'fees': Decimal('3.00')},
+        ])
+        # The overdue charge and the next monthly one both fall in the first cycle
+        cycle = plan['forecast'][0]
+        self.assertEqual((cycle['count'], cycle['fees']), (2, Decimal('6.00')))
+    
+    def test_stale_unsent_charges_are_retried(self):
+        RecurringSchedule.objects.update(next_charge_at=timezone.now() + timedelta(days=30))
+        stale, waiting, recent = [
+            Donation.objects.create(
+                amount=Decimal('20.00'), status='processing', payment_method='paypal',
+                campaign=self.template.campaign, donor=self.template.donor,
+                parent_donation=self.template, scheduled_for=self.charge_at - timedelta(days=days),
+                payment_id=payment_id,
+            )
+            for days, payment_id in [(30, None), (60, 'mm_pending'), (90, None)]
+        ]
+        Donation.objects.filter(pk__in=[stale.pk, waiting.pk]).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        
+        process_payment = mock.patch.object(
+            DonationService, 'process_payment', wraps=DonationService.process_payment
+        )
+        with process_payment as charged, self.assertLogs('fundraising.services', 'WARNING'):
+            results = RecurringDonationService.process_due_recurring_donations(max_workers=1)
+        self.assertEqual([(result['donation_id'], result['success']) for result in results], [(stale.pk, True)])
+        
+        # The retry names the donation, so a charge the dead runner already made is returned
+        idempotency = {'idempotency_key': str(stale.pk)}
+        charged.assert_called_once_with(mock.ANY, idempotency)
+        stale.refresh_from_db()
+        self.assertEqual(stale.payment_id, DonationService._simulated_payment_id('paypal', idempotency))
+        
+        statuses = dict(Donation.objects.filter(parent_donation=self.template).values_list('pk', 'status'))
+        self.assertEqual(statuses, {stale.pk: 'completed', waiting.pk: 'processing', recent.pk: 'processing'})
+
+class EmailOutboxTests(TestCase):
+    """Tests for queueing and delivering donation emails through the outbox"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(
+            username='student', password='pass', role='student', email='student@example.com',
+        )
+        donor = User.objects.create_user(username='donor', password='pass', role='donor', email='donor@example.com')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        cls.donation = Donation.objects.create(
+            amount=Decimal('20.00'), status='completed', payment_method='stripe',
+            campaign=campaign, donor=donor,
+        )
+        DonationReceipt.objects.create(donation=cls.donation, receipt_number='EDU-TEST-1')
+    
+    def test_each_event_is_queued_once(self):
+        EmailOutboxService.enqueue_donation_emails(self.donation)
+        EmailOutboxService.enqueue_donation_emails(self.donation)
+        EmailOutboxService.enqueue_bulk([self.donation])
+        
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('event', 'status')),
+            [('donation_receipt', 'pending'), ('student_notification', 'pending')],
+        )
+        self.assertIsNone(EmailOutboxService.enqueue(self.donation, 'donation_receipt'))
+    
+    def test_send_pending_delivers_the_batch(self):
+        EmailOutboxService.enqueue_donation_emails(self.donation)
+        
+        counts = EmailOutboxService.send_pending()
+        self.assertEqual(counts, {'claimed': 2, 'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['donor@example.com', 'student@example.com'])
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+        self.assertTrue(DonationReceipt.objects.get().email_sent)
+        
+        # Nothing is due any more
+        self.assertEqual(EmailOutboxService.send_pending()['claimed'], 0)
+    
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failures_back_off_then_give_up(self):
+        outbox_email = EmailOutboxService.enqueue(self.donation, 'donation_receipt')
+        failing = mock.Mock(side_effect=ConnectionError('mailbox unavailable'))
+        
+        with mock.patch.dict(EmailOutboxService.BUILDERS, {'donation_receipt': failing}):
+            with self.assertLogs('fundraising.email_service', 'ERROR'):
+                self.assertEqual(EmailOutboxService.send_pending()['retried'], 1)
+            outbox_email.refresh_from_db()
+            self.assertEqual((outbox_email.status, outbox_email.attempts), ('pending', 1))
+            self.assertGreater(outbox_email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            
+            # Not due until the backoff has passed
+            self.assertEqual(EmailOutboxService.send_pending()['claimed'], 0)
+            
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('fundraising.email_service', 'ERROR'):
+                self.assertEqual(EmailOutboxService.send_pending()['failed'], 1)
+        
+        outbox_email.refresh_from_db()
+        self.assertEqual((outbox_email.status, outbox_email.attempts), ('failed', 2))
+        self.assertEqual(outbox_email.last_error, 'mailbox unavailable')
+        self.assertEqual(mail.outbox, [])
+    
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_SENDING_TIMEOUT=600)
+    def test_stale_sending_rows_count_as_an_attempt(self):
+        EmailOutboxService.enqueue_donation_emails(self.donation)
+        EmailOutbox.objects.update(status='sending')
+        EmailOutbox.objects.filter(event='student_notification').update(attempts=1)
+        EmailOutbox.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        
+        with self.assertLogs('fundraising.email_service', 'WARNING'):
+            counts = EmailOutboxService.send_pending()
+        self.assertEqual(counts, {'claimed': 0, 'sent': 0, 'retried': 1, 'failed': 1})
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('event', 'status', 'attempts')),
+            [('donation_receipt', 'pending', 1), ('student_notification', 'failed', 2)],
+        )
+        self.assertEqual(mail.outbox, [])
+
+class WebhookInboxTests(TransactionTestCase):
+    """Tests for the webhook inbox worker
+    
+    Events are applied on worker threads with their own connections, so the
+    data has to be committed.
+    """
+    
+    def setUp(self):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        self.donation, self.other = [
+            Donation.objects.create(
+                amount=Decimal('20.00'), status='pending', payment_method='paypal', campaign=campaign,
+            )
+            for _ in range(2)
+        ]
+    
+    def record(self, event_id, event_type, donation):
+        return WebhookInboxService.record('paypal', event_id, event_type, str(donation.pk), {'txn_id': event_id})
+    
+    def test_redelivered_events_are_no_ops(self):
+        self.assertTrue(self.record('ipn-1', 'completed', self.donation))
+        self.assertFalse(self.record('ipn-1', 'completed', self.donation))
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        
+        counts = WebhookInboxService.process_pending(max_workers=1)
+        self.assertEqual(counts['processed'], 1)
+        self.assertFalse(self.record('ipn-1', 'completed', self.donation))
+        self.assertEqual(WebhookInboxService.process_pending(max_workers=1)['processed'], 0)
+        
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'completed')
+    
+    def test_events_of_a_donation_apply_in_received_order(self):
+        self.record('ipn-1', 'completed', self.donation)
+        self.record('ipn-2', 'refunded', self.donation)
+        self.record('ipn-3', 'completed', self.other)
+        
+        counts = WebhookInboxService.process_pending(max_workers=1)
+        self.assertEqual(counts['processed'], 3)
+        self.assertEqual(
+            dict(Donation.objects.values_list('pk', 'status')),
+            {self.donation.pk: 'refunded', self.other.pk: 'completed'},
+        )
+    
+    def test_events_wait_behind_an_earlier_event_being_processed(self):
+        self.record('ipn-1', 'completed', self.donation)
+        self.record('ipn-2', 'refunded', self.donation)
+        self.record('ipn-3', 'completed', self.other)
+        first = WebhookEvent.objects.get(event_id='ipn-1')
+        
+        # Left out of the candidates, as when another worker holds its row lock
+        groups = WebhookInboxService._claim_batch(10, deferred={first.pk})
+        self.assertEqual([[event.event_id for event in group] for group in groups], [['ipn-3']])
+        WebhookEvent.objects.filter(event_id='ipn-3').update(status='pending')
+        
+        # Another worker is applying the donation's first event
+        WebhookEvent.objects.filter(event_id='ipn-1').update(status='processing', updated_at=timezone.now())
+        
+        groups = WebhookInboxService._claim_batch(10)
+        self.assertEqual([[event.event_id for event in group] for group in groups], [['ipn-3']])
+        self.assertEqual(WebhookEvent.objects.get(event_id='ipn-2').status, 'pending')
+        
+        # Once it is done, the rest of the donation's events are claimed as one run
+        WebhookEvent.objects.filter(event_id='ipn-1').update(status='processed')
+        self.record('ipn-4', 'completed', self.donation)
+        groups = WebhookInboxService._claim_batch(10)
+        self.assertEqual([[event.event_id for event in group] for group in groups], [['ipn-2', 'ipn-4']])
+
+class PayPalIPNBatchTests(TestCase):
+    """Tests for replaying PayPal IPN dumps in bulk"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=cls.student, approved=True, category='books',
+        )
+        cls.donation = Donation.objects.create(
+            amount=Decimal('40.00'), status='pending', payment_method='paypal',
+            campaign=campaign, donor=cls.donor,
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_replay_refreshes_donor_and_student_summaries(self):
+        self.assertEqual(DonorSummaryService.get_summary(self.donor.pk)['total_donated'], Decimal('0'))
+        self.assertEqual(StudentSummaryService.get_summary(self.student.pk)['total_raised'], Decimal('0'))
+        
+        lines = [
+            f'custom={self.donation.pk}&payment_status=Pending&txn_id=T1&ipn_track_id=a',
+            f'custom={self.donation.pk}&payment_status=Completed&txn_id=T1&ipn_track_id=b',
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = PayPalIPNBatchService.ingest(lines)
+        self.assertEqual((counts['updated'], counts['campaigns']), (1, 1))
+        
+        self.assertEqual(DonorSummaryService.get_summary(self.donor.pk)['total_donated'], Decimal('40.00'))
+        summary = StudentSummaryService.get_summary(self.student.pk)
+        self.assertEqual((summary['total_raised'], summary['total_supporters']), (Decimal('40.00'), 1))
+
+# The project's routes with the async payment views in front, as ASYNC_PAYMENT_VIEWS routes them
+urlpatterns = [
+    path('donations/<uuid:donation_id>/payment/', views.aprocess_payment),
+    path('webhooks/stripe/', views.astripe_webhook),
+    path('webhooks/paypal/', views.apaypal_webhook),
+    path('', include('edufund_backend.urls')),
+]
+
+@override_settings(ROOT_URLCONF='fundraising.tests', STRIPE_WEBHOOK_SECRET='whsec_test')
+class AsyncPaymentViewTests(TestCase):
+    """Tests for the async payment views and the async branches of their decorators"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        campaign = Campaign.objects.create(
+            title='Books', description='Books', goal=Decimal('1000.00'),
+            student=cls.student, approved=True, category='books',
+        )
+        cls.donation = Donation.objects.create(
+            amount=Decimal('20.00'), status='pending', payment_method='stripe',
+            campaign=campaign, donor=cls.donor,
+        )
+        cls.payment_url = f'/donations/{cls.donation.pk}/payment/'
+    
+    async def test_anonymous_requests_are_sent_to_log_in(self):
+        response = await self.async_client.get(self.payment_url)
+        self.assertRedirects(response, f'/login/?next={self.payment_url}', fetch_redirect_response=False)
+    
+    async def test_other_roles_are_refused(self):
+        await sync_to_async(self.async_client.force_login)(self.student)
+        response = await self.async_client.get(self.payment_url)
+        self.assertRedirects(response, f'/login/?next={self.payment_url}', fetch_redirect_response=False)
+    
+    async def test_the_donor_gets_the_payment_page(self):
+        await sync_to_async(self.async_client.force_login)(self.donor)
+        response = await self.async_client.get(self.payment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['donation'], self.donation)
+    
+    async def test_webhooks_are_csrf_exempt(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        
+        payload = json.dumps({
+            'id': 'evt_1', 'type': 'payment_intent.succeeded',
+            'data': {'object': {'metadata': {'donation_id': str(self.donation.pk)}}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        response = await client.post(
+            '/webhooks/stripe/', payload, content_type='application/json',
+            headers={'Stripe-Signature': f't={timestamp},v1={signature}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        
+        response = await client.post(
+            '/webhooks/paypal/', f'custom={self.donation.pk}&payment_status=Completed&txn_id=T1',
+            content_type='application/x-www-form-urlencoded',
+            headers={'PayPal-Transmission-Id': '1', 'PayPal-Cert-Id': '1'},
+        )
+        self.assertEqual(response.status_code, 200)
+        
+        events = WebhookEvent.objects.order_by('provider').values_list('provider', 'donation_ref')
+        self.assertEqual(
+            [event async for event in events],
+            [('paypal', str(self.donation.pk)), ('stripe', str(self.donation.pk))],
+        )
+    
+    async def test_webhooks_only_accept_post(self):
+        for url in ('/webhooks/stripe/', '/webhooks/paypal/'):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 405)
+
+class SlidingWindowRateLimiterTests(SimpleTestCase):
+    """Tests for SlidingWindowRateLimiter"""
+    
+    def setUp(self):
+        self.cache = LocMemCache('ratelimit-tests', {})
+        self.cache.clear()
+        self.limiter = SlidingWindowRateLimiter('tests', window=60, cache=self.cache)
+    
+    def test_concurrent_acquire_never_over_admits(self):
+        limit = 10
+        start = threading.Barrier(50)
+        admitted = []
+        
+        def attempt():
+            start.wait()
+            if self.limiter.acquire({'ip:10.0.0.1': limit}):
+                admitted.append(True)
+        
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1000.0):
+            threads = [threading.Thread(target=attempt) for _ in range(50)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            self.assertLessEqual(len(admitted), limit)
+            # Denied attempts gave their slots back, so the counter holds only admissions
+            self.assertEqual(self.cache.get(self.limiter._key('ip:10.0.0.1', 16)), len(admitted))
+    
+    def test_concurrent_payment_views_never_over_admit(self):
+        limit = 10
+        start = threading.Barrier(50)
+        statuses = []
+        
+        @rate_limit_payment(max_attempts=limit, window_minutes=1)
+        def view(request):
+            return HttpResponse('ok')
+        
+        def attempt():
+            request = RequestFactory().post('/donate/', REMOTE_ADDR='10.0.0.2')
+            request.user = AnonymousUser()
+            start.wait()
+            statuses.append(view(request).status_code)
+        
+        cache.clear()
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1000.0), \
+                self.assertLogs('fundraising.decorators', 'WARNING'):
+            threads = [threading.Thread(target=attempt) for _ in range(50)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(statuses.count(200), limit)
+        self.assertEqual(statuses.count(429), 50 - limit)
+    
+    def test_any_exceeded_identifier_denies_and_releases_the_others(self):
+        limits = {'user:1': 2, 'ip:10.0.0.1': 5}
+        
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1000.0):
+            self.assertTrue(self.limiter.acquire(limits))
+            self.assertTrue(self.limiter.acquire(limits))
+            
+            reservation = self.limiter.acquire(limits)
+            self.assertFalse(reservation)
+            self.assertEqual(reservation.exceeded, ['user:1'])
+            self.assertEqual(self.limiter.check(limits), ['user:1'])
+            self.assertEqual(self.cache.get(self.limiter._key('ip:10.0.0.1', 16)), 2)
+    
+    def test_release_returns_the_slot(self):
+        limits = {'user:1': 1}
+        
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1000.0):
+            reservation = self.limiter.acquire(limits)
+            self.limiter.release(reservation)
+            self.assertTrue(self.limiter.acquire(limits))
+    
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        limits = {'user:1': 4}
+        
+        # Four hits at the very end of window 16
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1019.0):
+            for _ in range(4):
+                self.assertTrue(self.limiter.acquire(limits))
+        
+        # A quarter into window 17 three of them still count
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1035.0):
+            self.assertTrue(self.limiter.acquire(limits))
+            self.assertFalse(self.limiter.acquire(limits))
+        
+        # Three quarters in, only one does
+        with mock.patch('fundraising.ratelimit.time.time', return_value=1065.0):
+            self.assertTrue(self.limiter.acquire(limits))
+            self.assertTrue(self.limiter.acquire(limits))
+    
+    def test_falls_back_to_in_process_counters(self):
+        limiter = SlidingWindowRateLimiter('tests-fallback', window=60, cache=UnavailableCache())
+        limiter.fallback.clear()
+        
+        with self.assertLogs('fundraising.ratelimit', 'WARNING'):
+            admitted = [bool(limiter.acquire({'user:1': 3})) for _ in range(5)]
+        
+        self.assertEqual(admitted, [True, True, True, False, False])
+
+class PatternSetTests(SimpleTestCase):
+    """Tests for the single-pass PatternSet"""
+    
+    def test_reports_the_matching_pattern(self):
+        patterns = PatternSet([r'fake\s*donation', r'fraud', r'fr', r'a{2}b', r'(?:x|y)z'])
+        
+        self.assertEqual(patterns.search('This is a FAKE   donation'), r'fake\s*donation')
+        self.assertEqual(patterns.search('fr'), 'fr')
+        self.assertEqual(patterns.search('aab'), 'a{2}b')
+        self.assertEqual(patterns.search('yz'), '(?:x|y)z')
+        self.assertIsNone(patterns.search('Good luck with your studies'))
+        self.assertEqual(patterns.findall('fraud, then a fake donation'), [r'fake\s*donation', 'fraud', 'fr'])
+    
+    def test_patterns_with_groups_keep_their_numbering(self):
+        sources = [r'(x)y', r'(\w)\1{3}', r'(?P<digit>\d)(?P=digit)', 'spam']
+        patterns = PatternSet(sources)
+        
+        for text in ('aaaa', 'call 4455', 'xy', 'spam', 'abab', 'spam then zzzz'):
+            with self.subTest(text=text):
+                expected = [source for source in sources if re.search(source, text)]
+                self.assertEqual(patterns.findall(text), expected)
+                self.assertEqual(patterns.search(text) is None, not expected)
+        self.assertEqual(patterns.search('aaaa'), r'(\w)\1{3}')
+        self.assertEqual(patterns.search('spam then zzzz'), 'spam')
+    
+    def test_findall_reports_overlapping_patterns(self):
+        self.assertEqual(PatternSet(['bitcoin', 'coin']).findall('bitcoin'), ['bitcoin', 'coin'])
+        self.assertEqual(PatternSet(['free', 'free money']).findall('Free money'), ['free', 'free money'])
+        self.assertEqual(PatternSet(['coin', 'bitcoin']).findall('no crypto here'), [])
+    
+    def test_literal_patterns_are_escaped(self):
+        domains = PatternSet(['tempmail.com'], literal=True)
+        
+        self.assertEqual(domains.search('someone@TempMail.com'), 'tempmail.com')
+        self.assertIsNone(domains.search('someone@tempmailxcom.org'))
+
+class ContentScreeningTests(TestCase):
+    """Tests for suspicious-content screening of donation messages"""
+    
+    def test_stored_patterns_apply_without_restart(self):
+        message = 'Double your crypto giveaway'
+        self.assertEqual(PaymentSecurityValidator.validate_donation_message(message), [])
+        
+        ScreeningPattern.objects.create(kind='message', pattern=r'crypto\s+giveaway')
+        # The row is rolled back without a delete signal
+        self.addCleanup(content_screener.reset)
+        
+        with self.assertLogs('fundraising.security', 'WARNING'):
+            errors = PaymentSecurityValidator.validate_donation_message(message)
+        self.assertEqual(errors, ['Message contains suspicious content'])
+    
+    def test_rescreen_rejects_bad_since_dates(self):
+        for value in ('yesterday', '2024-02-30'):
+            with self.subTest(value=value), self.assertRaisesMessage(CommandError, f'Invalid --since date: {value}'):
+                call_command('rescreen_donation_messages', since=value, stdout=StringIO())
+
+class VelocityFeatureStoreTests(SimpleTestCase):
+    """Tests for the rolling velocity feature windows"""
+    
+    def setUp(self):
+        self.store = VelocityFeatureStore('tests', windows={'1m': 60}, cache=LocMemCache('tests-velocity', {}))
+        self.store.cache.clear()
+    
+    def test_counts_and_amounts_slide_with_the_window(self):
+        entities = {'user': '1', 'ip': '10.0.0.1'}
+        self.store.record(entities, Decimal('25.00'), now=1025.0)
+        self.store.record(entities, Decimal('10.50'), now=1025.0)
+        self.store.record({'ip': '10.0.0.1'}, Decimal('4.00'), now=1030.0)
+        
+        features = self.store.features(entities, now=1030.0)
+        self.assertEqual(features['user']['1m'], {'count': 2, 'amount': 35.5})
+        self.assertEqual(features['ip']['1m'], {'count': 3, 'amount': 39.5})
+        
+        # Half way into the next window, half of the previous one still counts
+        features = self.store.features(entities, now=1110.0)
+        self.assertEqual(features['user']['1m'], {'count': 1, 'amount': 17.75})
+        
+        self.assertEqual(self.store.features({'user': '2'}, now=1030.0)['user']['1m'], {'count': 0, 'amount': 0.0})
+
+class FraudScoringTests(TestCase):
+    """Tests for velocity-based fraud scoring"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(
+            username='donor', password='pass', role='donor', email='donor@example.org'
+        )
+        cls.campaign = Campaign.objects.create(
+            title='Tuition campaign', description='Tuition', goal=Decimal('1000.00'),
+            student=cls.student, approved=True, category='tuition',
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def donate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Donation.objects.create(
+                amount=Decimal('30.00'), campaign=self.campaign, donor=self.donor,
+                payment_method='stripe', ip_address='10.0.0.1',
+            )
+    
+    def test_created_donations_feed_velocity_features(self):
+        donation_data = {'user': self.donor, 'amount': Decimal('30.00'), 'ip_address': '10.0.0.1'}
+        self.assertEqual(PaymentSecurityValidator.detect_fraud_patterns(donation_data)['flags'], [])
+        
+        self.donate()
+        self.donate()
+        
+        analysis = PaymentSecurityValidator.detect_fraud_patterns(donation_data)
+        self.assertEqual(analysis['flags'], ['Multiple rapid donations'])
+        self.assertEqual(analysis['risk_score'], 30)
+    
+    def test_rescore_backfills_scores_in_creation_order(self):
+        donations = [self.donate() for _ in range(3)]
+        
+        with self.settings(FRAUD_FLAGGED_NETWORKS=['10.0.0.0/8']), self.assertLogs('fundraising', 'WARNING'):
+            call_command('rescore_donations', batch_size=2, stdout=StringIO())
+        
+        scores = dict(Donation.objects.values_list('id', 'fraud_score'))
+        self.assertEqual([scores[donation.id] for donation in donations], [25, 25, 55])
+        self.assertEqual(
+            Donation.objects.get(pk=donations[2].pk).fraud_flags,
+            ['Multiple rapid donations', 'IP address in a flagged network'],
+        )
+    
+    def test_rescore_rejects_bad_since_dates(self):
+        for value in ('yesterday', '2024-02-30'):
+            with self.subTest(value=value), self.assertRaisesMessage(CommandError, f'Invalid --since date: {value}'):
+                call_command('rescore_donations', since=value, stdout=StringIO())
+
+class CampaignBrowseTests(TestCase):
+    """Tests for keyset-paginated campaign browsing"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.campaigns = Campaign.objects.bulk_create([
+            Campaign(
+                title=f'Campaign {index}', description='Studies', goal=Decimal('100.00'),
+                student=cls.student, approved=index != 0, category='books' if index % 3 else 'tuition',
+                is_featured=index % 2 == 0,
+            )
+            for index in range(8)
+        ])
+        # Ties on created_at are broken by id
+        Campaign.objects.filter(pk__in=[c.pk for c in cls.campaigns[2:6]]).update(
+            created_at=cls.campaigns[2].created_at
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        seen = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                page, cursor = CampaignBrowseService.browse(cursor=cursor, page_size=3)
+            seen += [campaign.pk for campaign in page]
+            if cursor is None:
+                break
+        
+        expected = Campaign.objects.filter(approved=True).order_by('-created_at', '-id')
+        self.assertEqual(seen, list(expected.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 7)
+        
+        page, _ = CampaignBrowseService.browse(category='tuition', featured=True, cursor='not-a-cursor')
+        self.assertEqual([campaign.title for campaign in page], ['Campaign 6'])
+    
+    def test_category_facets_are_cached_until_a_campaign_changes(self):
+        with self.assertNumQueries(1):
+            facets = CampaignBrowseService.get_category_facets()
+        counts = {facet['category']: facet['count'] for facet in facets}
+        self.assertEqual((counts['books'], counts['tuition'], counts['other']), (5, 2, 0))
+        
+        with self.assertNumQueries(0):
+            CampaignBrowseService.get_category_facets()
+        
+        Campaign.objects.create(
+            title='New', description='Studies', goal=Decimal('50.00'),
+            student=self.student, approved=True, category='other',
+        )
+        facets = CampaignBrowseService.get_category_facets()
+        self.assertEqual({facet['category']: facet['count'] for facet in facets}['other'], 1)
+        
+        self.client.force_login(self.student)
+        response = self.client.get('/campaigns/', {'category': 'books', 'active': 'active'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['campaigns']), 5)
+
+class CampaignSearchTests(TestCase):
+    """Tests for the campaign full-text search index"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username='student', password='pass', role='student', full_name='Amara Okafor'
+        )
+        cls.robotics = Campaign.objects.create(
+            title='Robotics club kit', description='Sensors and motors for our team',
+            goal=Decimal('500.00'), student=cls.student, approved=True, category='technology',
+        )
+        cls.tuition = Campaign.objects.create(
+            title='Final year tuition', description='Engineering degree, including a robotics module',
+            goal=Decimal('5000.00'), student=cls.student, approved=True, category='tuition',
+        )
+        cls.pending = Campaign.objects.create(
+            title='Robotics competition travel', description='Flights',
+            goal=Decimal('900.00'), student=cls.student, approved=False, category='travel',
+        )
+    
+    def search(self, query, **kwargs):
+        return [campaign.title for campaign in CampaignBrowseService.search(query, **kwargs)]
+    
+    def test_ranks_title_matches_first_and_skips_unapproved(self):
+        self.assertEqual(self.search('robot'), ['Robotics club kit', 'Final year tuition'])
+        self.assertEqual(self.search('robotics', category='tuition'), ['Final year tuition'])
+        self.assertEqual(self.search('amara tuition fees'), ['Final year tuition'])
+        self.assertEqual(self.search('"robotics" OR NEAR(*'), [])
+        
+        results = CampaignBrowseService.search('robot', page_size=1)
+        self.assertTrue(results.has_next)
+        self.assertFalse(CampaignBrowseService.search('robot', page=2, page_size=1).has_next)
+    
+    def test_index_follows_campaign_and_student_changes(self):
+        self.tuition.title = 'Masters thesis printing'
+        self.tuition.save()
+        self.assertEqual(self.search('thesis'), ['Masters thesis printing'])
+        
+        self.student.full_name = 'Amara Nwosu'
+        self.student.save(update_fields=['full_name'])
+        self.assertEqual(len(self.search('nwosu')), 2)
+        
+        self.robotics.delete()
+        self.assertEqual(self.search('sensors'), [])
+    
+    def test_queries_over_the_time_budget_are_cancelled(self):
+        with (
+            self.settings(CAMPAIGN_SEARCH_TIMEOUT=0),
+            mock.patch.object(SQLiteCampaignSearchIndex, 'PROGRESS_INTERVAL', 1),
+            self.assertLogs('fundraising.search', 'WARNING'),
+        ):
+            results = CampaignBrowseService.search('robot')
+        self.assertTrue(results.timed_out)
+        self.assertEqual(len(results), 0)
+        
+        # The connection is usable afterwards
+        self.assertEqual(self.search('robot')[0], 'Robotics club kit')
+
+class DonationSearchTests(TestCase):
+    """Tests for the admin donation search"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(username='student', password='pass', role='student')
+        cls.donor = User.objects.create_user(
+            username='donor', password='pass', role='donor', full_name='Thabo Mokoena'
+        )
+        cls.campaign = Campaign.objects.create(
+            title='Laboratory equipment', description='Lab', goal=Decimal('1000.00'),
+            student=student, approved=True, category='research',
+        )
+        other = Campaign.objects.create(
+            title='Textbooks', description='Books', goal=Decimal('1000.00'),
+            student=student, approved=True, category='books',
+        )
+        for index, (amount, status) in enumerate([
+            ('25.00', 'completed'), ('25.00', 'pending'), ('10.00', 'completed'),
+            ('40.00', 'failed'), ('25.00', 'completed'), ('60.00', 'pending'),
+        ]):
+            Donation.objects.create(
+                amount=Decimal(amount), status=status, payment_method='stripe',
+                campaign=cls.campaign if index % 2 else other,
+                donor=cls.donor if index < 3 else None, message='Good luck ' * 50,
+            )
+    
+    def test_stats_come_from_one_aggregate(self):
+        donations = DonationSearchService.filter(min_amount=Decimal('20.00'))
+        with self.assertNumQueries(1):
+            stats = DonationSearchService.get_stats(donations)
+        self.assertEqual(stats, {'total_donations': 5, 'total_amount': Decimal('50.00'), 'pending_count': 2})
+    
+    def test_pages_follow_the_sort_with_ties_and_defer_text(self):
+        donations = DonationSearchService.filter()
+        seen = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                page, cursor = DonationSearchService.get_page(donations, 'amount', cursor, page_size=2)
+            seen += page
+            if cursor is None:
+                break
+        
+        self.assertEqual([d.amount for d in seen], [Decimal(a) for a in ['10', '25', '25', '25', '40', '60']])
+        self.assertEqual(len({d.pk for d in seen}), 6)
+        self.assertTrue({'message', 'user_agent', 'admin_notes'} <= seen[0].get_deferred_fields())
+        self.assertEqual(len(seen[0].message_excerpt), DonationSearchService.EXCERPT_LENGTH + 1)
+    
+    def test_search_matches_donor_names_and_campaigns(self):
+        self.assertEqual(DonationSearchService.filter(search='mokoena').count(), 3)
+        self.assertEqual(DonationSearchService.filter(search='laboratory').count(), 3)
+        self.assertEqual(DonationSearchService.filter(search='laboratory', status='pending').count(), 2)
+    
+    def test_campaign_matches_over_the_limit_still_count(self):
+        # Both campaigns belong to the student, but only one id fits under the limit
+        with mock.patch.object(DonationSearchService, 'CAMPAIGN_MATCH_LIMIT', 1):
+            donations = DonationSearchService.filter(search='student')
+            self.assertEqual(donations.count(), 6)
+            self.assertEqual(DonationSearchService.get_stats(donations)['total_donations'], 6)
+            self.assertEqual(DonationSearchService.filter(search='student', status='pending').count(), 2)
+            self.assertEqual(DonationSearchService.filter(search='chemistry').count(), 0)
+
+class DonorSummaryTests(TestCase):
+    """Tests for the cached donor dashboard statistics"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = User.objects.create_user(username='donor', password='pass', role='donor')
+        students = [
+            User.objects.create_user(username=f'student{index}', password='pass', role='student')
+            for index in range(2)
+        ]
+        cls.funded, cls.open, cls.pending = [
+            Campaign.objects.create(
+                title=title, description=title, goal=Decimal(goal),
+                student=student, approved=True, category='books',
+            )
+            for title, goal, student in [
+                ('Funded', '100.00', students[0]), ('Open', '1000.00', students[0]), ('Pending', '500.00', students[1]),
+            ]
+        ]
+        for campaign, amount, status in [
+            (cls.funded, '60.00', 'completed'), (cls.funded, '40.00', 'completed'),
+            (cls.open, '10.00', 'completed'), (cls.pending, '25.00', 'pending'),
+        ]:
+            Donation.objects.create(
+                amount=Decimal(amount), status=status, payment_method='stripe',
+                campaign=campaign, donor=cls.donor,
+            )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_summary_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            summary = DonorSummaryService.get_summary(self.donor.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(DonorSummaryService.get_summary(self.donor.pk), summary)
+        
+        self.assertEqual(summary['total_donated'], Decimal('110.00'))
+        self.assertEqual(summary['donation_count'], 3)
+        self.assertEqual(summary['campaigns_supported'], 2)
+        self.assertEqual(summary['students_helped'], 1)
+        self.assertEqual(summary['impact_score'], 50)
+        self.assertEqual(
+            sorted(summary['donated_campaign_ids']),
+            sorted([self.funded.pk, self.open.pk, self.pending.pk]),
+        )
+    
+    def test_status_change_refreshes_the_donors_summary(self):
+        DonorSummaryService.get_summary(self.donor.pk)
+        
+        donation = Donation.objects.get(campaign=self.pending)
+        donation.status = 'completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            donation.save()
+        
+        summary = DonorSummaryService.get_summary(self.donor.pk)
+        self.assertEqual(summary['total_donated'], Decimal('135.00'))
+        self.assertEqual(summary['students_helped'], 2)
+        self.assertEqual(summary['impact_score'], 33)
+    
+    def test_moving_a_donation_refreshes_both_donors(self):
+        other = User.objects.create_user(username='other', password='pass', role='donor')
+        DonorSummaryService.get_summary(self.donor.pk)
+        DonorSummaryService.get_summary(other.pk)
+        
+        donation = Donation.objects.get(campaign=self.open)
+        donation.donor = other
+        with self.captureOnCommitCallbacks(execute=True):
+            donation.save()
+        
+        self.assertEqual(DonorSummaryService.get_summary(self.donor.pk)['total_donated'], Decimal('100.00'))
+        self.assertEqual(DonorSummaryService.get_summary(other.pk)['total_donated'], Decimal('10.00'))
+    
+    def test_dashboard_pages_donation_history(self):
+        self.client.force_login(self.donor)
+        DonorSummaryService.get_summary(self.donor.pk)
+        
+        with self.settings(DONOR_HISTORY_PAGE_SIZE=3):
+            response = self.client.get(reverse('donor_dashboard'))
+            self.assertEqual(len(response.context['donations']), 3)
+            self.assertFalse(response.context['recommended_campaigns'])
+            
+            response = self.client.get(f"{reverse('donor_dashboard')}?{response.context['next_query']}")
+            self.assertEqual(len(response.context['donations']), 1)
+            self.assertIsNone(response.context['next_query'])
+
+class StudentSummaryTests(TestCase):
+    """Tests for the cached student dashboard statistics"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass', role='student')
+        donors = [
+            User.objects.create_user(username=f'donor{index}', password='pass', role='donor')
+            for index in range(2)
+        ]
+        cls.approved = Campaign.objects.create(
+            title='Approved', description='Approved', goal=Decimal('500.00'),
+            student=cls.student, approved=True, category='books',
+        )
+        Campaign.objects.create(
+            title='Waiting', description='Waiting', goal=Decimal('300.00'),
+            student=cls.student, category='books',
+        )
+        for donor, amount, status in [
+            (donors[0], '50.00', 'completed'), (donors[0], '20.00', 'completed'),
+            (donors[1], '30.00', 'pending'), (None, '15.00', 'completed'),
+        ]:
+            Donation.objects.create(
+                amount=Decimal(amount), status=status, payment_method='stripe',
+                campaign=cls.approved, donor=donor,
+            )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_summary_is_two_queries_then_cached(self):
+        with self.assertNumQueries(2):
+            summary = StudentSummaryService.get_summary(self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(StudentSummaryService.get_summary(self.student.pk), summary)
+        
+        self.assertEqual(summary, {
+            'campaign_count': 2,
+            'approved_campaigns_count': 1,
+            'pending_campaigns_count': 1,
+            'total_raised': Decimal('85.00'),
+            'total_goal': Decimal('800.00'),
+            'total_supporters': 2,
+        })
+    
+    def test_campaign_and_donation_changes_refresh_the_summary(self):
+        StudentSummaryService.get_summary(self.student.pk)
+        
+        donation = Donation.objects.get(status='pending')
+        donation.status = 'completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            donation.save()
+        summary = StudentSummaryService.get_summary(self.student.pk)
+        self.assertEqual(summary['total_raised'], Decimal('115.00'))
+        self.assertEqual(summary['total_supporters'], 3)
+        
+        Campaign.objects.filter(title='Waiting').get().delete()
+        summary = StudentSummaryService.get_summary(self.student.pk)
+        self.assertEqual(summary['campaign_count'], 1)
+        self.assertEqual(summary['total_goal'], Decimal('500.00'))
 
-# Create your tests here.
@@ -1,6 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Payment views that wait on a provider round-trip; the async versions need an ASGI server
+if getattr(settings, 'ASYNC_PAYMENT_VIEWS', False):
+    process_payment = views.aprocess_payment
+    paypal_return = views.apaypal_return
+    stripe_webhook = views.astripe_webhook
+    paypal_webhook = views.apaypal_webhook
+else:
+    process_payment = views.process_payment
+    paypal_return = views.paypal_return
+    stripe_webhook = views.stripe_webhook
+    paypal_webhook = views.paypal_webhook
+
 urlpatterns = [
     # General pages
     path('', views.home_view, name='home'),
@@ -33,15 +46,18 @@ urlpatterns = [
     
     # Donation routes
     path('campaigns/<int:campaign_id>/donate/', views.make_donation, name='make_donation'),
-    path('donations/<uuid:donation_id>/payment/', views.process_payment, name='process_payment'),
+    path('donations/<uuid:donation_id>/payment/', process_payment, name='process_payment'),
     path('donations/<uuid:donation_id>/success/', views.donation_success, name='donation_success'),
     
     # PayPal specific routes
-    path('donations/<int:donation_id>/paypal/return/', views.paypal_return, name='paypal_return'),
-    path('donations/<int:donation_id>/paypal/cancel/', views.paypal_cancel, name='paypal_cancel'),
+    path('donations/<uuid:donation_id>/paypal/return/', paypal_return, name='paypal_return'),
+    path('donations/<uuid:donation_id>/paypal/cancel/', views.paypal_cancel, name='paypal_cancel'),
     
     # Webhook endpoints
-    path('webhooks/stripe/', views.stripe_webhook, name='stripe_webhook'),
-    path('webhooks/paypal/', views.paypal_webhook, name='paypal_webhook'),
+    path('webhooks/stripe/', stripe_webhook, name='stripe_webhook'),
+    path('webhooks/paypal/', paypal_webhook, name='paypal_webhook'),
+    
+    # Monitoring
+    path('metrics/gateways/', views.gateway_metrics, name='gateway_metrics'),
 ]
 
@@ -1,9 +1,10 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
-from django.db.models import Sum, Count, Q, F
+from django.http import HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, HttpResponse, Http404
+from django.db.models import Count, Q
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
@@ -11,18 +12,24 @@ from django.conf import settings
 import json
 import logging
 from django.utils import timezone
-import stripe
 import hashlib
 import hmac
 from uuid import UUID
 
 from .models import Campaign, Donation
-from authentication.models import User
-from .forms import CampaignForm, DonationForm
-from .decorators import student_required, donor_required, admin_required, secure_payment_view, log_payment_activity
+from .forms import CampaignBrowseForm, CampaignForm, DonationForm, DonationSearchForm
+from .decorators import (
+    student_required, donor_required, admin_required, secure_payment_view, log_payment_activity,
+    async_login_required,
+)
 from .payment_gateways import PaymentGatewayFactory, PaymentGatewayError
-from .email_service import DonationReceiptEmailService
+from .email_service import EmailOutboxService
 from .security import WebhookSecurityValidator, DonationValidator
+from .pagination import keyset_page
+from .services import (
+    CampaignBrowseService, DonationSearchService, DonorSummaryService, PlatformStatsService, StudentSummaryService,
+    WebhookInboxService,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -30,16 +37,14 @@ def home_view(request):
     # Get only approved campaigns for the home page
     approved_campaigns = Campaign.objects.filter(approved=True).order_by('-created_at')[:3]
     
-    # Get some statistics for the home page
-    total_raised = Donation.objects.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_students_helped = Campaign.objects.filter(approved=True, current_amount__gt=0).count()
-    total_donors = User.objects.filter(role='donor', donations__isnull=False).distinct().count()
+    # Get some statistics for the home page from the cached snapshot
+    stats = PlatformStatsService.get_stats()
     
     context = {
         'campaigns': approved_campaigns,
-        'total_raised': total_raised,
-        'total_students_helped': total_students_helped,
-        'total_donors': total_donors,
+        'total_raised': stats['total_raised'],
+        'total_students_helped': stats['total_students_helped'],
+        'total_donors': stats['total_donors'],
     }
     return render(request, 'authentication/home.html', context)
 
@@ -58,9 +63,61 @@ def dashboard_redirect(request):
 # Campaign Views
 @login_required
 def campaigns_list(request):
-    # Show approved campaigns for everyone
-    campaigns = Campaign.objects.filter(approved=True).order_by('-created_at')
-    return render(request, 'campaigns/list.html', {'campaigns': campaigns})
+    # Show approved campaigns for everyone, a page at a time
+    form = CampaignBrowseForm(request.GET)
+    filters = form.get_filters()
+    query, page = form.get_search()
+    
+    search_timed_out = False
+    if query:
+        # Ranked search results are paged by number
+        results = CampaignBrowseService.search(query, page=page, **filters)
+        campaigns = results.campaigns
+        search_timed_out = results.timed_out
+        next_query = _page_query(request, page=str(page + 1)) if results.has_next else None
+        first_query = _page_query(request) if page > 1 else None
+    else:
+        campaigns, next_cursor = CampaignBrowseService.browse(
+            cursor=request.GET.get('cursor'), **filters
+        )
+        next_query = _page_query(request, cursor=next_cursor) if next_cursor else None
+        first_query = _page_query(request) if request.GET.get('cursor') else None
+    
+    facets = CampaignBrowseService.get_category_facets(filters['active'], filters['featured'])
+    
+    # Links keep the other filters; changing a filter starts again from the first page
+    category_links = [
+        {
+            **facet,
+            'query': _page_query(request, category=facet['category']),
+            'selected': facet['category'] == filters['category'],
+        }
+        for facet in facets
+    ]
+    
+    context = {
+        'campaigns': campaigns,
+        'form': form,
+        'category_links': category_links,
+        'all_categories_query': _page_query(request, category=None),
+        'total_count': sum(facet['count'] for facet in facets),
+        'query': query,
+        'search_timed_out': search_timed_out,
+        'next_query': next_query,
+        'first_query': first_query,
+    }
+    return render(request, 'campaigns/list.html', context)
+
+def _page_query(request, **changes):
+    """The page's query string with some parameters changed, back on the first page unless given"""
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    query.pop('page', None)
+    for name, value in changes.items():
+        query.pop(name, None)
+        if value:
+            query[name] = value
+    return query.urlencode()
 
 @login_required
 def campaign_detail(request, pk):
@@ -146,20 +203,17 @@ def campaign_delete(request, pk):
 @login_required
 @admin_required
 def admin_dashboard(request):
-    # Get statistics for admin dashboard
-    total_campaigns = Campaign.objects.count()
-    pending_campaigns = Campaign.objects.filter(approved=False).count()
-    total_users = User.objects.count()
-    total_raised = Donation.objects.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or 0
+    # Get statistics for admin dashboard from the cached snapshot
+    stats = PlatformStatsService.get_stats()
     
     # Get recent campaigns that need approval
     campaigns_for_approval = Campaign.objects.filter(approved=False).order_by('-created_at')[:5]
     
     context = {
-        'total_campaigns': total_campaigns,
-        'pending_campaigns': pending_campaigns,
-        'total_users': total_users,
-        'total_raised': total_raised,
+        'total_campaigns': stats['total_campaigns'],
+        'pending_campaigns': stats['pending_campaigns'],
+        'total_users': stats['total_users'],
+        'total_raised': stats['total_raised'],
         'campaigns_for_approval': campaigns_for_approval,
     }
     return render(request, 'dashboards/admin.html', context)
@@ -220,12 +274,8 @@ def process_manual_payment(request, donation_id:UUID):
             donation.completed_at = timezone.now()
             donation.save()
             
-            # Update campaign amount
-            donation.update_campaign_amount()
-            
-            # Send confirmation emails
-            DonationReceiptEmailService.send_donation_confirmation(donation)
-            DonationReceiptEmailService.send_donation_received_notification(donation)
+            # Queue confirmation emails for the outbox worker
+            EmailOutboxService.enqueue_donation_emails(donation)
             
             messages.success(request, f"Payment for donation {donation.id} has been approved.")
             
@@ -234,13 +284,7 @@ def process_manual_payment(request, donation_id:UUID):
             donation.status = 'failed'
             donation.save()
             
-            # Send failure notification
-            # Send failure notification using new email service
-            try:
-                DonationReceiptEmailService.send_donation_receipt(donation)
-                logger.info(f"Payment failure notification sent for donation {donation.id}")
-            except Exception as e:
-                logger.error(f"Failed to send payment failure notification: {str(e)}")
+            logger.info(f"Manual payment rejected for donation {donation.id}")
             
             messages.success(request, f"Payment for donation {donation.id} has been rejected.")
         return redirect('donations_list')
@@ -251,32 +295,23 @@ def process_manual_payment(request, donation_id:UUID):
 @admin_required
 def donations_list(request):
     """Admin view to list and manage donations"""
-    status_filter = request.GET.get('status', 'all')
-    payment_method_filter = request.GET.get('payment_method', 'all')
-    
-    donations = Donation.objects.select_related('donor', 'campaign', 'campaign__student').order_by('-created_at')
-    
-    # Apply filters
-    if status_filter != 'all':
-        donations = donations.filter(status=status_filter)
-    
-    if payment_method_filter != 'all':
-        donations = donations.filter(payment_method=payment_method_filter)
+    form = DonationSearchForm(request.GET)
+    donations = DonationSearchService.filter(**form.get_filters())
     
-    # Get statistics
-    total_donations = donations.count()
-    total_amount = donations.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or 0
-    pending_count = donations.filter(status='pending').count()
+    # Statistics of the whole filtered set, then one page of it
+    stats = DonationSearchService.get_stats(donations)
+    page, next_cursor = DonationSearchService.get_page(
+        donations, sort=form.get_sort(), cursor=request.GET.get('cursor')
+    )
     
     context = {
-        'donations': donations[:50],  # Limit to 50 for performance
-        'status_filter': status_filter,
-        'payment_method_filter': payment_method_filter,
-        'total_donations': total_donations,
-        'total_amount': total_amount,
-        'pending_count': pending_count,
-        'status_choices': Donation.STATUS_CHOICES,
-        'payment_method_choices': Donation.PAYMENT_METHOD_CHOICES,
+        'donations': page,
+        'form': form,
+        'total_donations': stats['total_donations'],
+        'total_amount': stats['total_amount'],
+        'pending_count': stats['pending_count'],
+        'next_query': _page_query(request, cursor=next_cursor) if next_cursor else None,
+        'first_query': _page_query(request) if request.GET.get('cursor') else None,
     }
     
     return render(request, 'admin/donations_list.html', context)
@@ -307,9 +342,6 @@ def refund_donation(request, donation_id:UUID):
                     donation.admin_notes = f"Refunded ${refund_amount}. Reason: {reason}"
                     donation.save()
                     
-                    # Update campaign amount
-                    donation.update_campaign_amount()
-                    
                     messages.success(request, f"Refund of ${refund_amount} processed successfully.")
                 else:
                     messages.error(request, f"Refund failed: {result['error']}")
@@ -324,9 +356,6 @@ def refund_donation(request, donation_id:UUID):
                     donation.admin_notes = f"Refunded R{refund_amount}. Reason: {reason}"
                     donation.save()
                     
-                    # Update campaign amount
-                    donation.update_campaign_amount()
-                    
                     messages.success(request, f"PayPal refund of R{refund_amount} processed successfully.")
                 else:
                     messages.error(request, f"PayPal refund failed: {result['error']}")
@@ -337,9 +366,6 @@ def refund_donation(request, donation_id:UUID):
                 donation.admin_notes = f"Manual refund of R{refund_amount}. Reason: {reason}"
                 donation.save()
                 
-                # Update campaign amount
-                donation.update_campaign_amount()
-                
                 messages.success(request, f"Manual refund of R{refund_amount} recorded. Please process the actual refund manually.")
             
         except Exception as e:
@@ -357,26 +383,17 @@ def student_dashboard(request):
     # Get all campaigns created by the student
     campaigns = Campaign.objects.filter(student=request.user).order_by('-created_at')
     
-    # Calculate detailed stats
-    approved_campaigns = campaigns.filter(approved=True)
-    pending_campaigns = campaigns.filter(approved=False)
-    total_raised = campaigns.aggregate(Sum('current_amount'))['current_amount__sum'] or 0
-    total_goal = campaigns.aggregate(Sum('goal'))['goal__sum'] or 0
-    
-    # Calculate total supporters (unique donors across all campaigns)
-    total_supporters = Donation.objects.filter(
-        campaign__in=campaigns,
-        status='completed'
-    ).values('donor').distinct().count()
+    # Campaign statistics, cached until a campaign or completed donation changes
+    summary = StudentSummaryService.get_summary(request.user.pk)
     
     context = {
         'campaigns': campaigns,
-        'approved_campaigns_count': approved_campaigns.count(),
-        'pending_campaigns_count': pending_campaigns.count(),
-        'total_raised': total_raised,
-        'total_goal': total_goal,
-        'total_supporters': total_supporters,
-        'has_campaigns': campaigns.exists(),
+        'approved_campaigns_count': summary['approved_campaigns_count'],
+        'pending_campaigns_count': summary['pending_campaigns_count'],
+        'total_raised': summary['total_raised'],
+        'total_goal': summary['total_goal'],
+        'total_supporters': summary['total_supporters'],
+        'has_campaigns': summary['campaign_count'] > 0,
     }
     return render(request, 'dashboards/student.html', context)
 
@@ -384,45 +401,34 @@ def student_dashboard(request):
 @login_required
 @donor_required
 def donor_dashboard(request):
-    # Get all donations made by the donor
-    donations = Donation.objects.filter(donor=request.user).order_by('-created_at')
-    completed_donations = donations.filter(status='completed')
-    
-    # Calculate comprehensive stats
-    total_donated = completed_donations.aggregate(Sum('amount'))['amount__sum'] or 0
-    campaigns_supported = completed_donations.values('campaign').distinct().count()
-    
-    # Calculate students helped (unique students from campaigns donated to)
-    students_helped = completed_donations.values('campaign__student').distinct().count()
+    # Giving statistics, cached until one of the donor's donations changes state
+    summary = DonorSummaryService.get_summary(request.user.pk)
     
-    # Calculate impact score (percentage of campaigns that reached their goal after donation)
-    campaigns_with_donations = completed_donations.values_list('campaign', flat=True).distinct()
-    successful_campaigns = Campaign.objects.filter(
-        id__in=campaigns_with_donations,
-        current_amount__gte=F('goal')
-    ).count()
-    impact_score = int((successful_campaigns / campaigns_supported * 100)) if campaigns_supported > 0 else 0
-    
-    # Get recent donations (last 5 completed donations)
-    recent_donations = completed_donations.select_related('campaign', 'campaign__student')[:5]
+    # One page of the donation history, newest first
+    history, next_cursor = keyset_page(
+        Donation.objects.filter(donor=request.user).select_related('campaign', 'campaign__student'),
+        '-created_at',
+        request.GET.get('cursor'),
+        getattr(settings, 'DONOR_HISTORY_PAGE_SIZE', 10),
+    )
     
     # Get recommended campaigns (approved campaigns the donor hasn't donated to)
-    donated_campaign_ids = donations.values_list('campaign', flat=True)
     recommended_campaigns = Campaign.objects.filter(
         approved=True
     ).exclude(
-        id__in=donated_campaign_ids
+        id__in=summary['donated_campaign_ids']
     ).select_related('student').order_by('-created_at')[:6]
     
     context = {
-        'donations': donations,
-        'recent_donations': recent_donations,
-        'total_donated': total_donated,
-        'campaigns_supported': campaigns_supported,
-        'students_helped': students_helped,
-        'impact_score': impact_score,
+        'donations': history,
+        'total_donated': summary['total_donated'],
+        'campaigns_supported': summary['campaigns_supported'],
+        'students_helped': summary['students_helped'],
+        'impact_score': summary['impact_score'],
         'recommended_campaigns': recommended_campaigns,
-        'has_donations': completed_donations.exists(),
+        'has_donations': summary['donation_count'] > 0,
+        'next_query': _page_query(request, cursor=next_cursor) if next_cursor else None,
+        'first_query': _page_query(request) if request.GET.get('cursor') else None,
     }
     return render(request, 'dashboards/donor.html', context)
 
@@ -459,6 +465,9 @@ def make_donation(request, campaign_id):
                         "You will receive an email confirmation once it's processed."
                     )
                 
+                donation.fraud_score = validation['fraud_analysis']['risk_score']
+                donation.fraud_flags = validation['fraud_analysis']['flags']
+                
                 metadata = validation['metadata']
                 donation.ip_address = metadata.get('ip_address')
                 donation.user_agent = metadata.get('user_agent')
@@ -474,6 +483,15 @@ def make_donation(request, campaign_id):
         'campaign': campaign,
     })
 
+def _payment_metadata(donation):
+    """Metadata sent to the payment provider with a donation's payment"""
+    return {
+        'donation_id': str(donation.id),
+        'campaign_id': str(donation.campaign_id),
+        'donor_id': str(donation.donor_id),
+        'campaign_title': donation.campaign.title
+    }
+
 @login_required
 @donor_required
 @secure_payment_view
@@ -489,12 +507,7 @@ def process_payment(request, donation_id: UUID):
             total_amount = donation.amount + (donation.processing_fee or 0)
             
             # Prepare payment metadata
-            metadata = {
-                'donation_id': str(donation.id),
-                'campaign_id': str(donation.campaign.id),
-                'donor_id': str(donation.donor.id),
-                'campaign_title': donation.campaign.title
-            }
+            metadata = _payment_metadata(donation)
             
             if payment_method in ['stripe', 'credit_card']:
                 # Process Stripe payment
@@ -589,9 +602,6 @@ def paypal_return(request, donation_id):
                 donation.completed_at = timezone.now()
                 donation.save()
                 
-                # Update campaign amount
-                donation.update_campaign_amount()
-                
                 messages.success(
                     request, 
                     f"Thank you for your donation of ${donation.amount} to {donation.campaign.title}!"
@@ -631,6 +641,23 @@ def donation_success(request, donation_id):
     
     return render(request, 'donations/success.html', {'donation': donation})
 
+def gateway_metrics(request):
+    """Payment gateway latency histograms and circuit states for scraping
+    
+    Metrics are kept in process, so each worker reports its own calls.
+    """
+    token = getattr(settings, 'GATEWAY_METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    is_admin = request.user.is_authenticated and request.user.role == 'admin'
+    
+    if not is_admin and not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        return HttpResponseForbidden("You don't have permission to view this page.")
+    
+    return HttpResponse(
+        PaymentGatewayFactory.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
 # Custom Error Views
 def custom_404(request, exception):
     return render(request, 'errors/404.html', status=404)
@@ -650,8 +677,10 @@ def stripe_webhook(request):
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
     
-    # Added webhook security validation
-    if not WebhookSecurityValidator.validate_stripe_webhook(payload, sig_header, endpoint_secret):
+    # Verify the signature once and reuse the parsed event
+    validation = WebhookSecurityValidator.validate_stripe_webhook(payload, sig_header, endpoint_secret)
+    if not validation:
+        logger.error(f"Stripe webhook rejected: {validation.error}")
         WebhookSecurityValidator.log_webhook_attempt(
             'stripe', 
             request.META.get('REMOTE_ADDR', 'unknown'), 
@@ -659,85 +688,18 @@ def stripe_webhook(request):
         )
         return HttpResponse(status=400)
     
-    try:
-        # Verify webhook signature
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, endpoint_secret
-        )
-    except ValueError:
-        logger.error("Invalid payload in Stripe webhook")
-        return HttpResponse(status=400)
-    except stripe.error.SignatureVerificationError:
-        logger.error("Invalid signature in Stripe webhook")
-        return HttpResponse(status=400)
+    event = validation.event
     
-    # Handle the event
+    # Record the event; the webhook worker applies it to the donation
     try:
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            donation_id = payment_intent.get('metadata', {}).get('donation_id')
-            
-            if donation_id:
-                try:
-                    donation = Donation.objects.get(id=donation_id)
-                    
-                    # Update donation status to completed
-                    donation.status = 'completed'
-                    donation.completed_at = timezone.now()
-                    donation.payment_id = payment_intent['id']
-                    donation.save()
-                    
-                    # Update campaign amount
-                    donation.update_campaign_amount()
-                    
-                    # Send confirmation emails
-                    EmailNotificationService.send_donation_confirmation(donation)
-                    EmailNotificationService.send_donation_received_notification(donation)
-                    
-                    logger.info(f"Stripe payment succeeded for donation {donation_id}")
-                    
-                except Donation.DoesNotExist:
-                    logger.error(f"Donation {donation_id} not found for Stripe webhook")
-            
-        elif event['type'] == 'payment_intent.payment_failed':
-            payment_intent = event['data']['object']
-            donation_id = payment_intent.get('metadata', {}).get('donation_id')
-            
-            if donation_id:
-                try:
-                    donation = Donation.objects.get(id=donation_id)
-                    
-                    # Update donation status to failed
-                    donation.status = 'failed'
-                    donation.save()
-                    
-                    # Send failure notification
-                    EmailNotificationService.send_payment_failed_notification(donation)
-                    
-                    logger.info(f"Stripe payment failed for donation {donation_id}")
-                    
-                except Donation.DoesNotExist:
-                    logger.error(f"Donation {donation_id} not found for Stripe webhook")
-        
-        elif event['type'] == 'payment_intent.canceled':
-            payment_intent = event['data']['object']
-            donation_id = payment_intent.get('metadata', {}).get('donation_id')
-            
-            if donation_id:
-                try:
-                    donation = Donation.objects.get(id=donation_id)
-                    
-                    # Update donation status to cancelled
-                    donation.status = 'cancelled'
-                    donation.save()
-                    
-                    logger.info(f"Stripe payment cancelled for donation {donation_id}")
-                    
-                except Donation.DoesNotExist:
-                    logger.error(f"Donation {donation_id} not found for Stripe webhook")
-        
-        else:
-            logger.info(f"Unhandled Stripe webhook event type: {event['type']}")
+        payment_object = event['data']['object']
+        WebhookInboxService.record(
+            provider='stripe',
+            event_id=event['id'],
+            event_type=event['type'],
+            donation_ref=payment_object.get('metadata', {}).get('donation_id'),
+            payload=event,
+        )
         
         # Log successful webhook processing
         WebhookSecurityValidator.log_webhook_attempt(
@@ -747,7 +709,7 @@ def stripe_webhook(request):
         )
     
     except Exception as e:
-        logger.error(f"Error processing Stripe webhook: {str(e)}")
+        logger.error(f"Error recording Stripe webhook: {str(e)}")
         WebhookSecurityValidator.log_webhook_attempt(
             'stripe', 
             request.META.get('REMOTE_ADDR', 'unknown'), 
@@ -767,68 +729,27 @@ def paypal_webhook(request):
         raw_data = request.body.decode('utf-8')
         
         # Added webhook security validation
-        if not WebhookSecurityValidator.validate_paypal_webhook(raw_data, request.META):
+        validation = WebhookSecurityValidator.validate_paypal_webhook(raw_data, request.META)
+        if not validation:
             WebhookSecurityValidator.log_webhook_attempt(
                 'paypal', 
                 request.META.get('REMOTE_ADDR', 'unknown'), 
                 success=False
             )
-            logger.error("PayPal webhook verification failed")
+            logger.error(f"PayPal webhook verification failed: {validation.error}")
             return HttpResponse(status=400)
         
-        # Parse the data
-        data = {}
-        for line in raw_data.split('&'):
-            if '=' in line:
-                key, value = line.split('=', 1)
-                data[key] = value
-        
+        data = validation.event
         payment_status = data.get('payment_status', '').lower()
-        custom_data = data.get('custom', '')  # This should contain our donation ID
-        txn_id = data.get('txn_id', '')
         
-        if custom_data:
-            try:
-                donation = Donation.objects.get(id=custom_data)
-                
-                if payment_status == 'completed':
-                    # Update donation status to completed
-                    donation.status = 'completed'
-                    donation.completed_at = timezone.now()
-                    donation.payment_id = txn_id
-                    donation.save()
-                    
-                    # Update campaign amount
-                    donation.update_campaign_amount()
-                    
-                    # Send confirmation emails
-                    DonationReceiptEmailService.send_donation_confirmation(donation)
-                    DonationReceiptEmailService.send_donation_received_notification(donation)
-                    
-                    logger.info(f"PayPal payment completed for donation {custom_data}")
-                
-                elif payment_status in ['failed', 'denied', 'expired']:
-                    # Update donation status to failed
-                    donation.status = 'failed'
-                    donation.save()
-                    
-                    # Send failure notification
-                    DonationReceiptEmailService.send_payment_failed_notification(donation)
-                    
-                    logger.info(f"PayPal payment failed for donation {custom_data}")
-                
-                elif payment_status == 'refunded':
-                    # Update donation status to refunded
-                    donation.status = 'refunded'
-                    donation.save()
-                    
-                    # Update campaign amount (subtract the refunded amount)
-                    donation.update_campaign_amount()
-                    
-                    logger.info(f"PayPal payment refunded for donation {custom_data}")
-                
-            except Donation.DoesNotExist:
-                logger.error(f"Donation {custom_data} not found for PayPal webhook")
+        # Record the event; the webhook worker applies it to the donation
+        WebhookInboxService.record(
+            provider='paypal',
+            event_id=_paypal_event_id(data, raw_data),
+            event_type=payment_status,
+            donation_ref=data.get('custom', ''),  # This should contain our donation ID
+            payload=data,
+        )
         
         # Log successful webhook processing
         WebhookSecurityValidator.log_webhook_attempt(
@@ -838,7 +759,7 @@ def paypal_webhook(request):
         )
         
     except Exception as e:
-        logger.error(f"Error processing PayPal webhook: {str(e)}")
+        logger.error(f"Error recording PayPal webhook: {str(e)}")
         WebhookSecurityValidator.log_webhook_attempt(
             'paypal', 
             request.META.get('REMOTE_ADDR', 'unknown'), 
@@ -847,3 +768,218 @@ def paypal_webhook(request):
         return HttpResponse(status=500)
     
     return HttpResponse(status=200)
+
+def _paypal_event_id(data, raw_data):
+    """Inbox key of a PayPal IPN"""
+    payment_status = data.get('payment_status', '').lower()
+    txn_id = data.get('txn_id', '')
+    
+    # Redelivered IPNs keep their ipn_track_id; fall back to the transaction state
+    return data.get('ipn_track_id') or (
+        f"{txn_id}:{payment_status}" if txn_id else hashlib.sha256(raw_data.encode()).hexdigest()
+    )
+
+# Async payment views, routed instead of the sync ones when ASYNC_PAYMENT_VIEWS is on.
+# Under ASGI they await the provider round-trip, so one worker can hold many
+# payments in flight; database and session work still runs in Django's sync threads.
+
+async def _aget_donation(donation_id, donor):
+    try:
+        return await Donation.objects.select_related('campaign').aget(pk=donation_id, donor=donor)
+    except Donation.DoesNotExist:
+        raise Http404("No Donation matches the given query.")
+
+@donor_required
+@secure_payment_view
+async def aprocess_payment(request, donation_id: UUID):
+    """Async process_payment"""
+    donation = await _aget_donation(donation_id, request.user)
+    
+    if donation.status == 'completed':
+        return redirect('donation_success', donation_id=donation.id)
+    
+    if request.method == 'POST':
+        try:
+            payment_method = donation.payment_method
+            total_amount = donation.amount + (donation.processing_fee or 0)
+            
+            if payment_method in ['stripe', 'credit_card']:
+                result = await PaymentGatewayFactory.acreate_payment_intent(
+                    amount=total_amount,
+                    metadata=_payment_metadata(donation)
+                )
+                
+                if result['success']:
+                    donation.payment_id = result['payment_intent_id']
+                    donation.status = 'processing'
+                    await donation.asave()
+                    
+                    # Return JSON for frontend to handle Stripe confirmation
+                    return JsonResponse({
+                        'success': True,
+                        'client_secret': result['client_secret'],
+                        'payment_method': 'stripe'
+                    })
+                else:
+                    messages.error(request, f"Payment failed: {result['error']}")
+                    
+            elif payment_method == 'paypal':
+                return_url = request.build_absolute_uri(
+                    reverse('paypal_return', args=[donation.id])
+                )
+                cancel_url = request.build_absolute_uri(
+                    reverse('paypal_cancel', args=[donation.id])
+                )
+                
+                result = await PaymentGatewayFactory.acreate_payment(
+                    amount=total_amount,
+                    return_url=return_url,
+                    cancel_url=cancel_url,
+                    description=f"Donation to {donation.campaign.title}"
+                )
+                
+                if result['success']:
+                    donation.payment_id = result['payment_id']
+                    donation.status = 'processing'
+                    await donation.asave()
+                    
+                    return redirect(result['approval_url'])
+                else:
+                    messages.error(request, f"PayPal payment failed: {result['error']}")
+            
+            else:
+                # For now, mark as pending and require manual verification
+                donation.status = 'pending'
+                await donation.asave()
+                
+                messages.info(
+                    request, 
+                    f"Payment method {donation.get_payment_method_display()} requires manual processing. "
+                    "You will receive instructions via email."
+                )
+                return redirect('donation_success', donation_id=donation.id)
+                
+        except PaymentGatewayError as e:
+            logger.error(f"Payment gateway error: {str(e)}")
+            messages.error(request, f"Payment processing error: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected payment error: {str(e)}")
+            messages.error(request, "An unexpected error occurred. Please try again.")
+    
+    context = {
+        'donation': donation,
+        'stripe_publishable_key': getattr(settings, 'STRIPE_PUBLISHABLE_KEY', ''),
+        'total_amount': donation.amount + (donation.processing_fee or 0)
+    }
+    return await sync_to_async(render)(request, 'donations/process_payment.html', context)
+
+@async_login_required
+async def apaypal_return(request, donation_id):
+    """Async paypal_return"""
+    donation = await _aget_donation(donation_id, request.user)
+    
+    payment_id = request.GET.get('paymentId')
+    payer_id = request.GET.get('PayerID')
+    
+    if payment_id and payer_id:
+        try:
+            result = await PaymentGatewayFactory.aexecute_payment(payment_id, payer_id)
+            
+            if result['success']:
+                donation.status = 'completed'
+                donation.completed_at = timezone.now()
+                await donation.asave()
+                
+                messages.success(
+                    request, 
+                    f"Thank you for your donation of ${donation.amount} to {donation.campaign.title}!"
+                )
+                return redirect('donation_success', donation_id=donation.id)
+            else:
+                messages.error(request, f"Payment execution failed: {result['error']}")
+                donation.status = 'failed'
+                await donation.asave()
+                
+        except Exception as e:
+            logger.error(f"PayPal return error: {str(e)}")
+            messages.error(request, "Payment processing failed. Please contact support.")
+            donation.status = 'failed'
+            await donation.asave()
+    
+    return redirect('process_payment', donation_id=donation.id)
+
+@log_payment_activity("stripe_webhook")
+async def astripe_webhook(request):
+    """Async stripe_webhook"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    remote_addr = request.META.get('REMOTE_ADDR', 'unknown')
+    log_attempt = sync_to_async(WebhookSecurityValidator.log_webhook_attempt)
+    
+    validation = WebhookSecurityValidator.validate_stripe_webhook(
+        request.body, request.META.get('HTTP_STRIPE_SIGNATURE'), settings.STRIPE_WEBHOOK_SECRET
+    )
+    if not validation:
+        logger.error(f"Stripe webhook rejected: {validation.error}")
+        await log_attempt('stripe', remote_addr, success=False)
+        return HttpResponse(status=400)
+    
+    event = validation.event
+    
+    try:
+        payment_object = event['data']['object']
+        await sync_to_async(WebhookInboxService.record)(
+            provider='stripe',
+            event_id=event['id'],
+            event_type=event['type'],
+            donation_ref=payment_object.get('metadata', {}).get('donation_id'),
+            payload=event,
+        )
+        await log_attempt('stripe', remote_addr, success=True)
+    
+    except Exception as e:
+        logger.error(f"Error recording Stripe webhook: {str(e)}")
+        await log_attempt('stripe', remote_addr, success=False)
+        return HttpResponse(status=500)
+    
+    return HttpResponse(status=200)
+
+@log_payment_activity("paypal_webhook")
+async def apaypal_webhook(request):
+    """Async paypal_webhook"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    remote_addr = request.META.get('REMOTE_ADDR', 'unknown')
+    log_attempt = sync_to_async(WebhookSecurityValidator.log_webhook_attempt)
+    
+    try:
+        raw_data = request.body.decode('utf-8')
+        
+        validation = WebhookSecurityValidator.validate_paypal_webhook(raw_data, request.META)
+        if not validation:
+            await log_attempt('paypal', remote_addr, success=False)
+            logger.error(f"PayPal webhook verification failed: {validation.error}")
+            return HttpResponse(status=400)
+        
+        data = validation.event
+        await sync_to_async(WebhookInboxService.record)(
+            provider='paypal',
+            event_id=_paypal_event_id(data, raw_data),
+            event_type=data.get('payment_status', '').lower(),
+            donation_ref=data.get('custom', ''),
+            payload=data,
+        )
+        await log_attempt('paypal', remote_addr, success=True)
+        
+    except Exception as e:
+        logger.error(f"Error recording PayPal webhook: {str(e)}")
+        await log_attempt('paypal', remote_addr, success=False)
+        return HttpResponse(status=500)
+    
+    return HttpResponse(status=200)
+
+# csrf_exempt only wraps sync views in this Django version
+astripe_webhook.csrf_exempt = True
+apaypal_webhook.csrf_exempt = True
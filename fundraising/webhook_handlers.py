@@ -0,0 +1,125 @@
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .models import Donation
+from .email_service import EmailOutboxService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WebhookEventRouter:
+    """Registry mapping (provider, event_type) to a webhook handler
+    
+    Handlers take a WebhookEvent and return the status to record for it:
+    'processed' or 'ignored'. Exceptions are left to the caller, which
+    retries the event.
+    """
+    
+    def __init__(self):
+        self._handlers = {}
+    
+    def register(self, provider, *event_types):
+        """Decorator registering a handler for one or more event types"""
+        def decorator(handler):
+            for event_type in event_types:
+                key = (provider, event_type)
+                if key in self._handlers:
+                    raise ValueError(f"Handler already registered for {provider} {event_type}")
+                self._handlers[key] = handler
+            return handler
+        return decorator
+    
+    def get_handler(self, provider, event_type):
+        return self._handlers.get((provider, event_type))
+    
+    def handled_events(self):
+        """Registered (provider, event_type) pairs"""
+        return sorted(self._handlers)
+    
+    def dispatch(self, event):
+        handler = self.get_handler(event.provider, event.event_type)
+        if handler is None:
+            logger.info(f"Unhandled {event.provider} webhook event type: {event.event_type}")
+            return 'ignored'
+        return handler(event)
+
+router = WebhookEventRouter()
+
+# Donation status each PayPal payment_status moves to
+PAYPAL_STATUSES = {
+    'completed': 'completed',
+    'failed': 'failed',
+    'denied': 'failed',
+    'expired': 'failed',
+    'refunded': 'refunded',
+}
+
+# Fields save() and the status signal need; the campaign is only used for its ledger counters
+DONATION_FIELDS = (
+    'id', 'status', 'amount', 'processing_fee', 'net_amount', 'payment_id', 'completed_at',
+    'campaign', 'donor', 'parent_donation', 'is_recurring', 'recurring_frequency', 'created_at',
+    'campaign__id', 'campaign__current_amount', 'campaign__donation_count',
+    'campaign__donations_total', 'campaign__unique_donor_count',
+)
+
+def get_event_donation(event):
+    """Load the donation an event refers to, or None if there is none"""
+    if not event.donation_ref:
+        return None
+    
+    try:
+        return Donation.objects.select_related('campaign').only(*DONATION_FIELDS).get(id=event.donation_ref)
+    except (Donation.DoesNotExist, ValidationError):
+        logger.error(f"Donation {event.donation_ref} not found for {event.provider} webhook")
+        return None
+
+def set_donation_status(event, status, payment_id=None):
+    """Move the event's donation to status, saving only the changed fields"""
+    donation = get_event_donation(event)
+    if donation is None:
+        return 'ignored'
+    
+    # Replayed status changes leave the donation alone
+    if donation.status == status:
+        return 'processed'
+    
+    donation.status = status
+    update_fields = ['status', 'updated_at']
+    
+    if status == 'completed':
+        donation.completed_at = timezone.now()
+        update_fields.append('completed_at')
+        if payment_id:
+            donation.payment_id = payment_id
+            update_fields.append('payment_id')
+    
+    donation.save(update_fields=update_fields)
+    
+    if status == 'completed':
+        # Queue confirmation emails for the outbox worker
+        EmailOutboxService.enqueue_donation_emails(donation)
+    
+    logger.info(f"{event.provider} webhook set donation {donation.id} to {status}")
+    return 'processed'
+
+def _payment_intent_id(event):
+    return event.payload.get('data', {}).get('object', {}).get('id')
+
+@router.register('stripe', 'payment_intent.succeeded')
+def stripe_payment_succeeded(event):
+    return set_donation_status(event, 'completed', payment_id=_payment_intent_id(event))
+
+@router.register('stripe', 'payment_intent.payment_failed')
+def stripe_payment_failed(event):
+    return set_donation_status(event, 'failed')
+
+@router.register('stripe', 'payment_intent.canceled')
+def stripe_payment_canceled(event):
+    return set_donation_status(event, 'cancelled')
+
+@router.register('paypal', 'completed')
+def paypal_payment_completed(event):
+    return set_donation_status(event, 'completed', payment_id=event.payload.get('txn_id'))
+
+@router.register('paypal', 'failed', 'denied', 'expired', 'refunded')
+def paypal_payment_status(event):
+    return set_donation_status(event, PAYPAL_STATUSES[event.event_type])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Campaign browse page latency against catalog size
+
+Fills a throwaway database with approved campaigns and times one page of
+the browse listing:
+  - keyset: CampaignBrowseService.browse, first page and a page half way in,
+    unfiltered and within one category
+  - offset: the same page fetched with LIMIT/OFFSET, for comparison
+  - full list: every approved campaign, as the page used to load
+plus the grouped category facet query, cold and cached.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import timedelta
+from decimal import Decimal
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edufund_backend.settings')
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from authentication.models import User
+from fundraising.models import Campaign
+from fundraising.pagination import encode_cursor
+from fundraising.services import CampaignBrowseService
+
+CATEGORIES = [category for category, _ in Campaign._meta.get_field('category').choices]
+
+def grow_catalog(student, total):
+    """Add campaigns until there are `total`, oldest first"""
+    existing = Campaign.objects.count()
+    start = timezone.now() - timedelta(days=3650)
+    Campaign.objects.bulk_create([
+        Campaign(
+            title=f'Campaign {index}', description='Benchmark campaign', goal=Decimal('1000.00'),
+            student=student, approved=True, category=CATEGORIES[index % len(CATEGORIES)],
+            is_featured=index % 10 == 0,
+        )
+        for index in range(existing, total)
+    ], batch_size=5000)
+    # auto_now_add stamps every row with now; spread them out like a real catalog
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE fundraising_campaign SET created_at = datetime(%s, '+' || id || ' seconds') WHERE id > %s",
+            [start.strftime('%Y-%m-%d %H:%M:%S'), existing],
+        )
+
+def timed(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+def cursor_at(position, **filters):
+    """The cursor a reader paging from the start would hold at this position"""
+    campaign = Campaign.objects.filter(approved=True, **filters).order_by('-created_at', '-id')[position - 1]
+    return encode_cursor(campaign, '-created_at')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Catalog sizes to time')
+    parser.add_argument('--page-size', type=int, default=12, help='Campaigns per page')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per measurement (median shown)')
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        student = User.objects.create_user(username='bench_student', password='pass', role='student')
+        page_size = args.page_size
+        listing = Campaign.objects.filter(approved=True).order_by('-created_at')
+
+        print(f"Campaign browse page, {page_size} per page, median of {args.repeat} runs (ms)")
+        print(f"{'campaigns':>10} {'keyset p1':>10} {'keyset mid':>11} {'category mid':>13} {'offset mid':>11} {'full list':>10} {'facets':>8} {'cached':>8}")
+        for size in sorted(args.sizes):
+            grow_catalog(student, size)
+            middle = (size // 2) // page_size * page_size
+            cursor = cursor_at(middle)
+            category_middle = middle // len(CATEGORIES) // page_size * page_size
+            category_cursor = cursor_at(category_middle, category='books')
+
+            first = timed(lambda: CampaignBrowseService.browse(page_size=page_size), args.repeat)
+            keyset = timed(lambda: CampaignBrowseService.browse(cursor=cursor, page_size=page_size), args.repeat)
+            category = timed(
+                lambda: CampaignBrowseService.browse(category='books', cursor=category_cursor, page_size=page_size),
+                args.repeat,
+            )
+            offset = timed(lambda: list(listing.all()[middle:middle + page_size]), args.repeat)
+            full = timed(lambda: list(listing.all()), max(1, args.repeat // 10))
+
+            def cold_facets():
+                cache.clear()
+                CampaignBrowseService.get_category_facets()
+            facets = timed(cold_facets, args.repeat)
+            cached = timed(CampaignBrowseService.get_category_facets, args.repeat)
+
+            print(f"{size:>10} {first:>10.2f} {keyset:>11.2f} {category:>13.2f} {offset:>11.2f} {full:>10.1f} {facets:>8.2f} {cached:>8.3f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+if __name__ == "__main__":
+    main()
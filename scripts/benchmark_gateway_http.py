@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Per-call latency benchmark of the PayPal gateway HTTP client
+
+Starts a local stub of the PayPal REST API and looks up payments through:
+  - a new paypalrestsdk.Api per call (new OAuth token and connection each time)
+  - one shared paypalrestsdk.Api (cached token, new connection each time)
+  - the pooled client from fundraising.payment_gateways (cached token, keep-alive)
+
+The stub speaks plain HTTP, so TLS handshakes are not part of the numbers; a
+real gateway adds one per new connection on top of what is shown here.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edufund_backend.settings')
+django.setup()
+
+import paypalrestsdk
+import requests
+from requests.adapters import HTTPAdapter
+from fundraising.payment_gateways import PooledPayPalApi
+
+class StubPayPalHandler(BaseHTTPRequestHandler):
+    """Minimal PayPal REST API: OAuth token and payment lookup"""
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment so keep-alive is not held up by delayed ACKs
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    token_delay = 0.0
+    counts = {'tokens': 0, 'connections': 0, 'requests': 0}
+    
+    def setup(self):
+        super().setup()
+        StubPayPalHandler.counts['connections'] += 1
+    
+    def do_POST(self):
+        self._read_body()
+        if self.path == '/v1/oauth2/token':
+            StubPayPalHandler.counts['tokens'] += 1
+            time.sleep(self.token_delay)
+            self._reply({'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 32400})
+        else:
+            self._reply({'error': 'not found'}, status=404)
+    
+    def do_GET(self):
+        # paypalrestsdk sends a JSON "null" body with GET requests
+        self._read_body()
+        StubPayPalHandler.counts['requests'] += 1
+        payment_id = self.path.rsplit('/', 1)[-1]
+        self._reply({'id': payment_id, 'state': 'approved', 'transactions': [{'amount': {'total': '25.00'}}]})
+    
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    
+    def _reply(self, body, status=200):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+    
+    def log_message(self, *args):
+        pass
+
+def run(label, get_api, calls):
+    StubPayPalHandler.counts.update(tokens=0, connections=0, requests=0)
+    latencies = []
+    
+    for index in range(calls):
+        started = time.perf_counter()
+        payment = paypalrestsdk.Payment.find(f'PAY-{index}', api=get_api())
+        latencies.append(time.perf_counter() - started)
+        assert payment.state == 'approved'
+    
+    counts = StubPayPalHandler.counts
+    mean = statistics.mean(latencies) * 1000
+    print(
+        f"{label:<26} mean {mean:6.2f} ms  p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+        f"{counts['tokens']:>5} tokens  {counts['connections']:>5} connections"
+    )
+    return mean
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=300, help='Payment lookups per client')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Seconds the stub takes to issue a token')
+    args = parser.parse_args()
+    
+    StubPayPalHandler.token_delay = args.token_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPayPalHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f'http://127.0.0.1:{server.server_address[1]}'
+    options = {'mode': 'sandbox', 'client_id': 'id', 'client_secret': 'secret', 'endpoint': endpoint}
+    
+    shared_api = paypalrestsdk.Api(options)
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=4))
+    pooled_api = PooledPayPalApi(options, session=session)
+    
+    print(f"PayPal payment lookups against a local stub, {args.calls} calls each")
+    try:
+        fresh = run('new Api per call', lambda: paypalrestsdk.Api(options), args.calls)
+        shared = run('shared Api, no pooling', lambda: shared_api, args.calls)
+        pooled = run('pooled keep-alive client', lambda: pooled_api, args.calls)
+    finally:
+        server.shutdown()
+    
+    print(f"Per-call latency: {fresh / pooled:.1f}x lower than a new Api per call, "
+          f"{shared / pooled:.1f}x lower than the shared unpooled Api")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Per-event-type latency benchmark of the webhook handlers
+
+Runs every handler registered on the webhook router against a throwaway test
+database and reports latency percentiles and queries per event.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from decimal import Decimal
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edufund_backend.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from authentication.models import User
+from fundraising.models import Campaign, Donation, WebhookEvent
+from fundraising.webhook_handlers import router
+
+def create_donations(count):
+    student = User.objects.create_user(username='bench_student', password='pass', role='student')
+    campaign = Campaign.objects.create(
+        title='Benchmark campaign', description='Benchmark', goal=Decimal('1000000.00'),
+        student=student, approved=True, category='tuition',
+    )
+    donors = [
+        User.objects.create_user(username=f'bench_donor_{index}', password='pass', role='donor')
+        for index in range(10)
+    ]
+
+    return [
+        Donation.objects.create(
+            amount=Decimal('25.00'), campaign=campaign, donor=donors[index % len(donors)],
+            payment_method='stripe', status='pending',
+        )
+        for index in range(count)
+    ]
+
+def build_event(provider, event_type, donation):
+    """Unsaved WebhookEvent as the inbox worker would load it"""
+    if provider == 'stripe':
+        payload = {
+            'id': f'evt_{donation.pk}',
+            'type': event_type,
+            'data': {'object': {'id': f'pi_{donation.pk}', 'metadata': {'donation_id': str(donation.pk)}}},
+        }
+    else:
+        payload = {'payment_status': event_type, 'txn_id': f'txn_{donation.pk}', 'custom': str(donation.pk)}
+
+    return WebhookEvent(
+        provider=provider, event_id=payload.get('id', payload.get('txn_id')),
+        event_type=event_type, donation_ref=str(donation.pk), payload=payload,
+    )
+
+def benchmark(provider, event_type, donations):
+    # Every event starts from a pending donation so the handler does real work
+    Donation.objects.filter(pk__in=[donation.pk for donation in donations]).update(status='pending')
+    handler = router.get_handler(provider, event_type)
+
+    latencies = []
+    queries = 0
+    for donation in donations:
+        event = build_event(provider, event_type, donation)
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            handler(event)
+            latencies.append(time.perf_counter() - started)
+        queries += len(context.captured_queries)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{provider:<7} {event_type:<30} p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+        f"p95 {p95 * 1000:6.2f} ms  {queries / len(donations):5.1f} queries/event"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200, help='Events per event type')
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        donations = create_donations(args.events)
+        print(f"Webhook handler latency, {args.events} events per type ({connection.vendor})")
+        for provider, event_type in router.handled_events():
+            benchmark(provider, event_type, donations)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of Stripe webhook verification throughput
+
+Compares the previous flow (validate, then construct_event again in the view)
+with WebhookSecurityValidator.validate_stripe_webhook used on its own.
+"""
+import os
+import sys
+import json
+import time
+import hmac
+import hashlib
+import argparse
+import uuid
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edufund_backend.settings')
+django.setup()
+
+import stripe
+from fundraising.security import WebhookSecurityValidator
+
+SECRET = 'whsec_benchmark'
+
+def build_signed_events(count):
+    """Build signed payment_intent.succeeded payloads like Stripe sends them"""
+    timestamp = int(time.time())
+    events = []
+    
+    for index in range(count):
+        payload = json.dumps({
+            'id': f'evt_{index}',
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'data': {
+                'object': {
+                    'id': f'pi_{index}',
+                    'object': 'payment_intent',
+                    'amount': 5000,
+                    'currency': 'usd',
+                    'metadata': {'donation_id': str(uuid.uuid4())},
+                }
+            },
+        })
+        signature = hmac.new(
+            SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+        events.append((payload.encode(), f't={timestamp},v1={signature}'))
+    
+    return events
+
+def verify_twice(payload, signature):
+    """Previous flow: validator constructs the event, then the view does it again"""
+    stripe.Webhook.construct_event(payload, signature, SECRET)
+    return stripe.Webhook.construct_event(payload, signature, SECRET)
+
+def verify_once(payload, signature):
+    """Current flow: one signature check and one JSON parse"""
+    return WebhookSecurityValidator.validate_stripe_webhook(payload, signature, SECRET).event
+
+def run(label, verify, events, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for payload, signature in events:
+            verify(payload, signature)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    
+    rate = len(events) / best
+    print(f"{label:<28} {rate:>12,.0f} events/s  ({best * 1e6 / len(events):.1f} us/event)")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=5000, help='Signed events per run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per flow; the best is reported')
+    args = parser.parse_args()
+    
+    events = build_signed_events(args.events)
+    
+    # Sanity check before timing
+    assert verify_once(*events[0])['id'] == 'evt_0'
+    
+    print(f"Stripe webhook verification, {args.events} events, best of {args.repeat}")
+    before = run('validate + construct_event', verify_twice, events, args.repeat)
+    after = run('validate once', verify_once, events, args.repeat)
+    print(f"Speedup: {after / before:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+WSGI vs ASGI throughput of the payment view against a local fake gateway
+
+Starts a stub of the PayPal REST API that takes --gateway-delay seconds to
+create a payment, then drives the process_payment view through Django's
+request handlers:
+  - WSGI: process_payment on --wsgi-threads worker threads, each held for the
+    whole provider round-trip
+  - ASGI: aprocess_payment on one event loop with --asgi-concurrency requests
+    in flight, provider calls awaited on the gateway thread pool
+
+Both runs use the same throwaway SQLite database and the pooled PayPal client.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edufund_backend.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import AsyncClient, Client
+from django.urls import clear_url_caches, include, path
+from authentication.models import User
+from fundraising import payment_gateways, views
+from fundraising.models import Campaign, Donation
+from fundraising.payment_gateways import PooledPayPalApi, get_http_session
+
+# Both variants side by side; the project routes are kept for reverse()
+urlpatterns = [
+    path('loadtest/wsgi/<uuid:donation_id>/', views.process_payment),
+    path('loadtest/asgi/<uuid:donation_id>/', views.aprocess_payment),
+    path('', include(settings.ROOT_URLCONF)),
+]
+
+class StubPayPalHandler(BaseHTTPRequestHandler):
+    """Minimal PayPal REST API: OAuth token and payment creation"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    payment_delay = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/v1/oauth2/token':
+            self._reply({'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 32400})
+        elif self.path == '/v1/payments/payment':
+            time.sleep(self.payment_delay)
+            self._reply({
+                'id': f'PAY-{time.monotonic_ns()}',
+                'state': 'created',
+                'links': [{'rel': 'approval_url', 'href': 'https://paypal.test/approve'}],
+            }, status=201)
+        else:
+            self._reply({'error': 'not found'}, status=404)
+
+    def _reply(self, body, status=200):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+def create_donations(count):
+    """One donor per donation, so the per-donor payment rate limit never kicks in"""
+    student = User.objects.create_user(username='load_student', password='pass', role='student')
+    campaign = Campaign.objects.create(
+        title='Load test campaign', description='Load test', goal=Decimal('1000000.00'),
+        student=student, approved=True, category='tuition',
+    )
+    donors = User.objects.bulk_create([
+        User(username=f'load_donor_{index}', role='donor') for index in range(count)
+    ])
+    return Donation.objects.bulk_create([
+        Donation(
+            amount=Decimal('25.00'), campaign=campaign, donor=donor,
+            payment_method='paypal', status='pending',
+        )
+        for donor in donors
+    ])
+
+def logged_in_clients(client_class, donations):
+    clients = []
+    for donation in donations:
+        client = client_class()
+        client.force_login(donation.donor)
+        clients.append(client)
+    return clients
+
+def client_ip(index):
+    # One address per request, so the per-IP rate limit never kicks in either
+    return f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}'
+
+def report(label, latencies, elapsed, failures):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    rate = len(latencies) / elapsed
+    print(
+        f"{label:<36} {rate:8.1f} req/s  p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {p95 * 1000:7.1f} ms  {failures} failed"
+    )
+    return rate
+
+def run_wsgi(donations, threads):
+    clients = logged_in_clients(Client, donations)
+    latencies = []
+    failures = []
+    next_request = iter(range(len(donations)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                index = next(next_request, None)
+            if index is None:
+                break
+            started = time.perf_counter()
+            response = clients[index].post(f'/loadtest/wsgi/{donations[index].pk}/', headers={'X-Forwarded-For': client_ip(index)})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 302:
+                    failures.append(response.status_code)
+        connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return report(f'WSGI, {threads} worker threads', latencies, time.perf_counter() - started, len(failures))
+
+def run_asgi(donations, concurrency):
+    clients = logged_in_clients(AsyncClient, donations)
+    latencies = []
+    failures = []
+
+    async def one(index, limit):
+        async with limit:
+            started = time.perf_counter()
+            response = await clients[index].post(f'/loadtest/asgi/{donations[index].pk}/', headers={'X-Forwarded-For': client_ip(index)})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                failures.append(response.status_code)
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(one(index, limit) for index in range(len(donations))))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+
+    return report(f'ASGI, {concurrency} requests in flight', latencies, time.perf_counter() - started, len(failures))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='Payment requests per run')
+    parser.add_argument('--gateway-delay', type=float, default=0.2, help='Seconds the fake gateway takes per payment')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='WSGI worker threads')
+    parser.add_argument('--asgi-concurrency', type=int, default=200, help='Concurrent requests on the ASGI event loop')
+    args = parser.parse_args()
+
+    StubPayPalHandler.payment_delay = args.gateway_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPayPalHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f'http://127.0.0.1:{server.server_address[1]}'
+
+    # Point the pooled PayPal client at the stub, sized for the ASGI run
+    settings.PAYMENT_HTTP_POOL_MAXSIZE = args.asgi_concurrency
+    settings.PAYMENT_ASYNC_MAX_CONCURRENCY = args.asgi_concurrency
+    payment_gateways._clients[('paypal', 'api')] = PooledPayPalApi(
+        {'mode': 'sandbox', 'client_id': 'id', 'client_secret': 'secret', 'endpoint': endpoint},
+        session=get_http_session('paypal'),
+    )
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.ROOT_URLCONF = __name__
+    clear_url_caches()
+
+    # A file database so the WSGI threads can write concurrently. Transactions take the
+    # write lock up front and wait for it, the way row locks queue on other backends,
+    # instead of failing with "database is locked" when two threads upgrade at once.
+    directory = tempfile.mkdtemp()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+    connection.settings_dict['OPTIONS']['timeout'] = 60
+    DatabaseWrapper._start_transaction_under_autocommit = lambda self: self.cursor().execute('BEGIN IMMEDIATE')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        donations = list(Donation.objects.select_related('donor').filter(pk__in=[
+            donation.pk for donation in create_donations(args.requests)
+        ]))
+        print(
+            f"Payment view throughput, {args.requests} requests per run, "
+            f"fake gateway delay {args.gateway_delay * 1000:.0f} ms"
+        )
+        wsgi = run_wsgi(donations, args.wsgi_threads)
+        asgi = run_asgi(donations, args.asgi_concurrency)
+        print(f"ASGI throughput: {asgi / wsgi:.1f}x WSGI")
+    finally:
+        server.shutdown()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()